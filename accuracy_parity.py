@@ -0,0 +1,170 @@
+"""
+Accuracy-parity gate for the speed modes of ``DictationEngine.transcribe``.
+
+Every mode is run over a labeled Dhivehi set (see evaluation.py). Its CER and WER
+are compared with the fp32 baseline, the engine's defaults, and reported next to its
+real-time factor. A mode fails the gate when its CER or WER is worse than the
+baseline's by more than the tolerance (absolute, e.g. 0.01 = one point). The exit
+status is 1 if any mode fails, so the gate can run in CI.
+
+A mode is one or more options joined by ``+``, e.g. ``int8+window:10``:
+
+- ``fp32``: the defaults (the baseline; always run first)
+- ``int8``: dynamic int8 quantization of the Linear layers (``torch.quantization``)
+- ``window:SECONDS``: the window of ``transcribe`` (``chunk_samples``)
+- ``local:SECONDS``: block-local attention with that much context (local_attention.py);
+  use it with a long window, e.g. ``local:2+window:30``
+- ``exit:N``: the early-exit drafts from transformer layer N (early_exit.py)
+- ``model:DIR``: another model directory, e.g. one written by prune_model.py
+- ``decode:NAME=VALUE``: a keyword argument for ``processor.decode``
+
+The table is printed as Markdown and can also be written with ``--table`` (Markdown)
+and ``--json``, so runs can be compared over time.
+
+Usage: python accuracy_parity.py --data labeled_dir_or.tsv --mode int8 --mode local:2+window:30
+                                 [--max-cer-increase 0.01] [--max-wer-increase 0.02] [--table parity.md]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import torch
+
+from dictation_engine import MODEL_SAMPLING_RATE, DictationEngine, load_model_files
+from evaluation import character_error_rate, load_labeled_set, word_error_rate
+from transcript_cache import parse_option
+
+BASELINE = "fp32"
+DEFAULT_MODES = ["int8", "window:10", "local:2+window:30"]
+DEFAULT_MAX_CER_INCREASE = 0.01
+DEFAULT_MAX_WER_INCREASE = 0.02
+
+logger = logging.getLogger(__name__)
+
+
+def build_mode(spec: str, model_dir: str) -> Callable[[np.ndarray], str]:
+    """Loads a model configured as ``spec`` and returns its transcribe function."""
+    options = [option.partition(":") for option in spec.split("+")]
+    engine = DictationEngine(model_dir)
+    quantize, exit_layer = False, None
+    for name, _, value in options:
+        if name == "fp32":
+            pass
+        elif name == "int8":
+            quantize = True
+        elif name == "window":
+            engine.chunk_samples = int(float(value) * MODEL_SAMPLING_RATE)
+        elif name == "local":
+            engine.attention_context_seconds = float(value)
+        elif name == "exit":
+            exit_layer = int(value)
+        elif name == "model":
+            engine.model_dir = value
+        elif name == "decode":
+            key, option = parse_option(value)
+            engine.decode_options[key] = option
+        else:
+            raise ValueError(f"Unknown option '{name}' in mode '{spec}'.")
+
+    processor, model = load_model_files(engine.model_dir)
+    if quantize:
+        # Before attach_model, which patches the attention modules for block-local attention
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    engine.draft_exit_layer = exit_layer
+    engine.attach_model(processor, model, engine.model_dir)
+    if exit_layer is None:
+        return engine.transcribe
+
+    def transcribe_drafts(audio: np.ndarray) -> str:
+        # Drafts are decoded window by window, as while dictating
+        drafts = (engine.two_pass_decoder.draft(audio[i:i + engine.chunk_samples])
+                  for i in range(0, len(audio), engine.chunk_samples))
+        return " ".join(text for text in drafts if text)
+
+    return transcribe_drafts
+
+
+def run_mode(spec: str, model_dir: str, items: List[Tuple[str, np.ndarray, str]]) -> Dict[str, float]:
+    """Transcribes the set in mode ``spec``; returns its CER, WER and real-time factor."""
+    transcribe = build_mode(spec, model_dir)
+    transcribe(items[0][1])  # Warm up
+    hypotheses = []
+    started = time.perf_counter()
+    for _, audio, _ in items:
+        hypotheses.append(transcribe(audio))
+    elapsed = time.perf_counter() - started
+    references = [reference for _, _, reference in items]
+    audio_seconds = sum(len(audio) for _, audio, _ in items) / MODEL_SAMPLING_RATE
+    return {"cer": character_error_rate(references, hypotheses), "wer": word_error_rate(references, hypotheses),
+            "rtf": elapsed / audio_seconds}
+
+
+def gate(results: Dict[str, Dict[str, float]], max_cer_increase: float, max_wer_increase: float) -> None:
+    """Adds the deltas against the baseline, the speedup and ``passed`` to each mode's result."""
+    baseline = results[BASELINE]
+    for result in results.values():
+        result["cer_delta"] = result["cer"] - baseline["cer"]
+        result["wer_delta"] = result["wer"] - baseline["wer"]
+        result["speedup"] = baseline["rtf"] / result["rtf"]
+        result["passed"] = result["cer_delta"] <= max_cer_increase and result["wer_delta"] <= max_wer_increase
+
+
+def format_table(results: Dict[str, Dict[str, float]]) -> str:
+    lines = ["| mode | CER | ΔCER | WER | ΔWER | RTF | speedup | gate |",
+             "|---|---:|---:|---:|---:|---:|---:|---|"]
+    for spec, r in results.items():
+        lines.append(f"| {spec} | {r['cer']:.2%} | {r['cer_delta']:+.2%} | {r['wer']:.2%} | {r['wer_delta']:+.2%} "
+                     f"| {r['rtf']:.3f} | {r['speedup']:.2f}x | {'pass' if r['passed'] else 'FAIL'} |")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check CER/WER of each inference mode against the fp32 baseline.")
+    parser.add_argument("--data", required=True, help="Labeled set: directory of .wav + .txt pairs, or a TSV")
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--mode", action="append", default=None, metavar="SPEC",
+                        help=f"Mode to check, repeatable (default: {' '.join(DEFAULT_MODES)})")
+    parser.add_argument("--max-cer-increase", type=float, default=DEFAULT_MAX_CER_INCREASE,
+                        help="Largest allowed CER increase over the baseline, absolute")
+    parser.add_argument("--max-wer-increase", type=float, default=DEFAULT_MAX_WER_INCREASE,
+                        help="Largest allowed WER increase over the baseline, absolute")
+    parser.add_argument("--max-utterances", type=int, default=0, help="Use at most N recordings (0 = all)")
+    parser.add_argument("--table", help="Also write the Markdown table to this file")
+    parser.add_argument("--json", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    items = load_labeled_set(args.data, args.max_utterances)
+    modes = [BASELINE] + [spec for spec in (args.mode or DEFAULT_MODES) if spec != BASELINE]
+    results = {}
+    for spec in modes:
+        logger.info(f"Evaluating mode '{spec}' on {len(items)} recordings...")
+        results[spec] = run_mode(spec, args.model_dir, items)
+    gate(results, args.max_cer_increase, args.max_wer_increase)
+
+    table = format_table(results)
+    print(table)
+    if args.table:
+        with open(args.table, "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+    if args.json:
+        report = {"data": args.data, "model_dir": args.model_dir, "recordings": len(items),
+                  "max_cer_increase": args.max_cer_increase, "max_wer_increase": args.max_wer_increase,
+                  "modes": results}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+    failed = [spec for spec, result in results.items() if not result["passed"]]
+    if failed:
+        print(f"Accuracy parity FAILED for: {', '.join(failed)} (tolerance CER +{args.max_cer_increase:.2%}, "
+              f"WER +{args.max_wer_increase:.2%})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Runtime controller for the inference window and batch size.
+
+While dictation runs, the engine reports two measurements every
+``CONTROL_INTERVAL_SECONDS``:
+
+- the backlog: seconds of captured audio not yet decoded;
+- the real-time factor (RTF): compute seconds per second of audio captured in the
+  interval, counting the bottleneck pipeline stage.
+
+When the engine falls behind (large backlog or RTF near 1), the controller first
+raises the batch size. Batches only fill when windows are already waiting, so this
+costs no latency. It then grows the window, because longer windows amortize
+per-call overhead. When there is headroom it shrinks the window first, since that
+is what lowers latency, and then the batch. Everything stays within
+``ControlLimits``. ``max_window_seconds`` is the latency bound, because text cannot
+appear sooner than one window after the speech.
+
+Every observation and decision is appended as one JSON line to ``log_path``.
+"""
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+DEFAULT_DECISION_LOG = "logs/adaptive_decisions.jsonl"
+CONTROL_INTERVAL_SECONDS = 2.0
+BEHIND_RTF = 0.9          # Above this the decoder cannot keep up with capture
+HEADROOM_RTF = 0.5        # Below this there is room for smaller windows
+WINDOW_GROWTH = 1.5
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ControlLimits:
+    min_window_seconds: float = 0.5
+    max_window_seconds: float = 3.0
+    max_batch: int = 4
+
+
+@dataclass
+class Decision:
+    action: str              # grow_batch, grow_window, shrink_window, shrink_batch or hold
+    window_seconds: float
+    batch_size: int
+    backlog_seconds: float
+    rtf: float
+
+
+class AdaptiveController:
+    def __init__(self, limits: ControlLimits, window_seconds: float, batch_size: int = 1,
+                 log_path: Optional[str] = DEFAULT_DECISION_LOG) -> None:
+        self.limits = limits
+        self.window_seconds = min(max(window_seconds, limits.min_window_seconds), limits.max_window_seconds)
+        self.batch_size = min(max(batch_size, 1), limits.max_batch)
+        self.log_path = log_path
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    def update(self, backlog_seconds: float, rtf: float) -> Decision:
+        """Takes one interval's measurements and returns the (possibly unchanged) settings."""
+        limits = self.limits
+        behind = rtf > BEHIND_RTF or backlog_seconds > self.window_seconds * self.batch_size
+        headroom = rtf < HEADROOM_RTF and backlog_seconds < self.window_seconds / 4
+        action = "hold"
+        if behind:
+            if self.batch_size < limits.max_batch:
+                self.batch_size = min(self.batch_size * 2, limits.max_batch)
+                action = "grow_batch"
+            elif self.window_seconds < limits.max_window_seconds:
+                self.window_seconds = min(self.window_seconds * WINDOW_GROWTH, limits.max_window_seconds)
+                action = "grow_window"
+        elif headroom:
+            if self.window_seconds > limits.min_window_seconds:
+                self.window_seconds = max(self.window_seconds / WINDOW_GROWTH, limits.min_window_seconds)
+                action = "shrink_window"
+            elif self.batch_size > 1:
+                self.batch_size = max(self.batch_size // 2, 1)
+                action = "shrink_batch"
+
+        decision = Decision(action, round(self.window_seconds, 3), self.batch_size,
+                            round(backlog_seconds, 3), round(rtf, 3))
+        if action != "hold":
+            logger.info(f"Adaptive control: {action} -> window {decision.window_seconds}s, "
+                        f"batch {decision.batch_size} (backlog {decision.backlog_seconds}s, RTF {decision.rtf})")
+        self._log(decision)
+        return decision
+
+    def _log(self, decision: Decision) -> None:
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"time": round(time.time(), 3), **asdict(decision)}) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write adaptive control log '{self.log_path}': {e}")
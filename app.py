@@ -1,25 +1,98 @@
-import streamlit as st
-import sounddevice as sd
-import numpy as np
-import soundfile as sf
-import tempfile
-import os
-from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
-import torch
-import webrtcvad
-import queue
 import threading
+import time
+import weakref
+
+import streamlit as st
+from dictation_engine import DictationEngine, TranscriptResult, DEFAULT_MODEL_DIR
+from model_registry import ModelRegistry
+
+REFRESH_SECONDS = 0.5  # How often the page polls the session's engine for new text
+TEARDOWN_STOP_SECONDS = 0.5  # Stop timeout when a browser session goes away
+
+
+@st.cache_resource
+def model_registry():
+    """One registry per server process, so every session shares the loaded models."""
+    return ModelRegistry()
+
+
+def _weak_listener(method):
+    """Calls a bound method without keeping its object alive."""
+    ref = weakref.WeakMethod(method)
+
+    def listener(*args):
+        target = ref()
+        if target is not None:
+            target(*args)
+    return listener
+
+
+def _end_session(engine: DictationEngine, registry: ModelRegistry, pinned: list) -> None:
+    engine.stop(timeout=TEARDOWN_STOP_SECONDS)
+    for model_dir in pinned:
+        registry.release(model_dir)
+
+
+class DictationSession:
+    """
+    One browser session's engine and transcript, kept in st.session_state across reruns.
+    The engine's worker thread captures and transcribes in the background; the page
+    only collects what it has produced since the last poll.
+
+    The session pins its model in the shared registry. When Streamlit drops the
+    session's state, a finalizer stops the engine and releases the model. The engine's
+    listeners only hold a weak reference to the session, so they do not keep it alive.
+    """
+
+    def __init__(self, registry: ModelRegistry):
+        self.engine = DictationEngine()
+        self.registry = registry
+        self.status = "Ready"
+        self.draft = ""
+        self._new_text = []
+        self._lock = threading.Lock()
+        self._pinned = []  # Model directories acquired from the registry
+        self.engine.add_listener(_weak_listener(self._on_result))
+        self.engine.add_status_listener(_weak_listener(self._on_status))
+        weakref.finalize(self, _end_session, self.engine, registry, self._pinned)
+
+    def switch_model(self, model_dir: str):
+        """Loads (or reuses) ``model_dir`` from the registry, pinned while this session uses it."""
+        processor, model = self.registry.acquire(model_dir)
+        self.engine.switch_model(processor, model, model_dir)
+        for previous in self._pinned:
+            self.registry.release(previous)
+        self._pinned[:] = [model_dir]
+
+    def _on_result(self, result: TranscriptResult):
+        # Runs on the engine's worker thread
+        if result.session != self.engine.session:
+            return  # Delivered while the session was being stopped
+        with self._lock:
+            if result.is_final:
+                self.draft = ""
+                if result.text:
+                    self._new_text.append(result.text)
+            else:
+                self.draft = f"{self.draft} {result.text}".strip()
+
+    def _on_status(self, text):
+        self.status = text
+
+    def take_new_text(self):
+        with self._lock:
+            new_text, self._new_text = self._new_text, []
+        return new_text
+
 
 class DhivehiDictation:
     def __init__(self):
-        self.processor = None
-        self.model = None
-        self.audio_queue = queue.Queue()
-        self.text_output = ""
-        self.is_recording = False
-        self.vad = webrtcvad.Vad()
-        self.vad.set_mode(3)  # Aggressive mode
-        
+        if "dictation" not in st.session_state:
+            st.session_state.dictation = DictationSession(model_registry())
+            st.session_state.transcript = ""
+        self.session = st.session_state.dictation
+        self.engine = self.session.engine
+
         # Initialize Streamlit interface
         self.setup_ui()
 
@@ -29,7 +102,7 @@ class DhivehiDictation:
             layout="wide",
             initial_sidebar_state="expanded"
         )
-        
+
         # Dark theme
         st.markdown("""
         <style>
@@ -45,69 +118,34 @@ class DhivehiDictation:
         """, unsafe_allow_html=True)
 
     def start_recording(self):
-        self.is_recording = True
-        self.audio_queue.queue.clear()
-        
-        def audio_callback(indata, frames, time, status):
-            if status:
-                print(status)
-            self.audio_queue.put(indata.copy())
-
-        stream = sd.InputStream(
-            channels=1,
-            samplerate=16000,
-            callback=audio_callback
-        )
-        
-        with stream:
-            while self.is_recording:
-                try:
-                    audio_data = self.audio_queue.get()
-                    self.process_audio(audio_data)
-                except KeyboardInterrupt:
-                    break
-
-    def process_audio(self, audio_data):
-        # Convert to mono if needed
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
-            
-        # Convert to 16kHz if needed
-        if audio_data.shape[0] > 0:
-            # Process audio in chunks
-            chunk_size = 16000  # 1 second chunks
-            for i in range(0, len(audio_data), chunk_size):
-                chunk = audio_data[i:i+chunk_size]
-                if len(chunk) > 0:
-                    self.transcribe_chunk(chunk)
-
-    def transcribe_chunk(self, audio_chunk):
-        if self.processor is None or self.model is None:
+        if not self.engine.is_loaded:
+            st.warning("Please load a model first!")
             return
-            
-        # Preprocess audio
-        input_values = self.processor(audio_chunk, sampling_rate=16000, return_tensors="pt").input_values
-        
-        # Get logits from model
-        logits = self.model(input_values).logits
-        
-        # Take argmax and decode
-        predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = self.processor.decode(predicted_ids[0])
-        
-        # Update text output
-        self.text_output += transcription + " "
-        st.text_area("Transcription", value=self.text_output, height=400)
+        try:
+            self.engine.start()
+        except Exception as e:
+            st.error(f"Could not start dictation: {str(e)}")
+
+    def show_transcription(self):
+        # Append only what arrived since the last poll, so edits in the text area are kept
+        new_text = self.session.take_new_text()
+        if new_text:
+            st.session_state.transcript += " ".join(new_text) + " "
+        st.text_area("Transcription", key="transcript", height=400)
+        st.caption(f"{self.session.status} {self.session.draft}".strip())
 
     def run(self):
         st.title("Dhivehi Dictation System")
-        
-        # Model loading
-        model_name = st.text_input("Model Name", "wav2vec2-dhivehi")
+
+        # Model loading; switching while dictating takes effect between utterances
+        registry = model_registry()
+        available_models = registry.scan()
+        choice = st.selectbox("Model", list(available_models) + ["Other..."])
+        model_name = available_models.get(choice) or st.text_input("Model Name", DEFAULT_MODEL_DIR)
         if st.button("Load Model"):
             try:
-                self.processor = Wav2Vec2Processor.from_pretrained(model_name)
-                self.model = Wav2Vec2ForCTC.from_pretrained(model_name)
+                with st.spinner("Loading model..."):
+                    self.session.switch_model(model_name)
                 st.success("Model loaded successfully!")
             except Exception as e:
                 st.error(f"Error loading model: {str(e)}")
@@ -115,9 +153,19 @@ class DhivehiDictation:
         # Start/Stop recording
         if st.button("Start Dictation"):
             self.start_recording()
-        
+
         if st.button("Stop Dictation"):
-            self.is_recording = False
+            self.engine.stop()
+
+        fragment = getattr(st, "fragment", None)
+        if fragment is not None:
+            # Only the transcript area reruns at the refresh rate while dictating
+            fragment(run_every=REFRESH_SECONDS if self.engine.is_running else None)(self.show_transcription)()
+        else:
+            self.show_transcription()
+            if self.engine.is_running:
+                time.sleep(REFRESH_SECONDS)
+                st.rerun()
 
 if __name__ == "__main__":
     app = DhivehiDictation()
@@ -0,0 +1,166 @@
+"""
+asyncio streaming transcription on top of DictationEngine.
+
+``AsyncTranscriber.stream`` takes an async iterator of audio blocks (mono float32 at
+16 kHz, any block size) and is an async generator of ``TranscriptResult``s: drafts
+(``is_final=False``) when the engine runs two-pass decoding, and final text.
+
+- Inference runs in a bounded thread pool (``max_workers``), never on the event loop.
+- Scheduling is fair across streams. Each stream has at most one job in flight and
+  waits for a worker slot in FIFO order, so streams with a backlog take turns.
+- Cancelling the consuming task cancels the stream's in-flight job. It stops at the
+  next one-second segment boundary, and its worker slot is released once it has
+  actually stopped.
+
+Usage: python async_transcription.py --streams 4 recording.wav
+"""
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Optional
+
+import numpy as np
+
+from dictation_engine import (DictationEngine, CancellationToken, TranscriptionCancelled,
+                              TranscriptResult, MODEL_SAMPLING_RATE)
+from early_exit import TwoPassDecoder
+
+DEFAULT_MAX_WORKERS = 2
+
+
+class AsyncTranscriber:
+    def __init__(self, engine: DictationEngine, max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+        if not engine.is_loaded:
+            raise RuntimeError("Load the engine's model before creating an AsyncTranscriber.")
+        self.engine = engine
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="AsyncTranscriber")
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _run(self, job: Callable[[], object], token: CancellationToken):
+        """Runs ``job`` on the pool once a worker slot is free (FIFO across streams)."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        loop = asyncio.get_running_loop()
+        await self._slots.acquire()
+        try:
+            future = loop.run_in_executor(self._executor, job)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        def on_done(done_future: asyncio.Future) -> None:
+            if not done_future.cancelled():
+                done_future.exception()  # Consumed here in case the awaiting task was cancelled
+            self._slots.release()
+
+        # Release the slot when the thread is really done, not when the awaiting task is cancelled
+        future.add_done_callback(on_done)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+
+    async def stream(self, frames: AsyncIterator[np.ndarray]) -> AsyncIterator[TranscriptResult]:
+        """Transcribes one audio stream; see the module docstring."""
+        engine = self.engine
+        token = CancellationToken()
+        two_pass = None
+        if engine.draft_exit_layer is not None:
+            # Per-stream decoder: it tracks the drafts of the stream's current utterance
+            two_pass = TwoPassDecoder(engine.processor, engine.model, engine.draft_exit_layer,
+                                      lambda audio: engine.transcribe(audio, token))
+        segmenter = engine._new_segmenter()
+        utterance_id = 0
+
+        async def decode(kind: str, audio: np.ndarray) -> Optional[TranscriptResult]:
+            nonlocal utterance_id
+            if kind == "draft":
+                text = await self._run(lambda: two_pass.draft(audio), token)
+                return TranscriptResult(text, is_final=False, utterance_id=utterance_id) if text else None
+            if two_pass:
+                text = await self._run(lambda: two_pass.final(audio), token)
+            else:
+                text = await self._run(lambda: engine.transcribe(audio, token), token)
+            utterance_id += 1
+            if text or two_pass:
+                return TranscriptResult(text, utterance_id=utterance_id - 1)
+            return None
+
+        try:
+            async for block in frames:
+                for kind, audio, _ in segmenter.push(block):
+                    result = await decode(kind, audio)
+                    if result is not None:
+                        yield result
+            for kind, audio, _ in segmenter.flush():
+                result = await decode(kind, audio)
+                if result is not None:
+                    yield result
+        except TranscriptionCancelled:
+            return
+        finally:
+            token.cancel()
+
+    def close(self) -> None:
+        """Stops the worker pool; in-flight jobs finish (or stop at their next cancellation check)."""
+        self._executor.shutdown(wait=False)
+
+
+# --- Demo: several concurrent streams from one recording ---
+
+async def _frames_from_audio(audio: np.ndarray, block_samples: int, realtime: bool) -> AsyncIterator[np.ndarray]:
+    for start in range(0, len(audio), block_samples):
+        if realtime:
+            await asyncio.sleep(block_samples / MODEL_SAMPLING_RATE)
+        yield audio[start:start + block_samples]
+
+
+async def _run_demo(transcriber: AsyncTranscriber, audio: np.ndarray, streams: int, realtime: bool) -> None:
+    started = time.perf_counter()
+
+    async def consume(stream_id: int) -> None:
+        async for result in transcriber.stream(_frames_from_audio(audio, 1600, realtime)):
+            kind = "final" if result.is_final else "draft"
+            print(f"[{time.perf_counter() - started:7.2f}s] stream {stream_id} {kind}: {result.text}")
+
+    await asyncio.gather(*(consume(i) for i in range(streams)))
+
+
+def main() -> int:
+    import soundfile as sf
+    from profiling import DEFAULT_PROFILE_SECONDS, add_profile_argument, profile_run
+
+    parser = argparse.ArgumentParser(description="Run concurrent async transcription streams over a recording.")
+    parser.add_argument("audio", help="16 kHz mono recording")
+    parser.add_argument("--streams", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--draft-exit-layer", type=int, default=None)
+    parser.add_argument("--realtime", action="store_true", help="Pace frames at capture speed")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    audio, rate = sf.read(args.audio, dtype="float32")
+    if rate != MODEL_SAMPLING_RATE:
+        print(f"Expected {MODEL_SAMPLING_RATE} Hz audio, got {rate} Hz", file=sys.stderr)
+        return 1
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    engine = DictationEngine(args.model_dir, draft_exit_layer=args.draft_exit_layer)
+    engine.load_model()
+    transcriber = AsyncTranscriber(engine, max_workers=args.workers)
+    try:
+        with profile_run(args.profile is not None, args.profile or DEFAULT_PROFILE_SECONDS):
+            asyncio.run(_run_demo(transcriber, audio, args.streams, args.realtime))
+    finally:
+        transcriber.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
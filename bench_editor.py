@@ -0,0 +1,135 @@
+"""
+Benchmarks the Tk editor at large document sizes.
+
+Times a keystroke (insert + event handling + redraw), a transcript fragment insert
+and a direction toggle at 10k, 100k and 1M characters, once with the original
+whole-document code paths ("legacy") and once with DocumentEditor.
+
+Usage: python bench_editor.py [--sizes 10000 100000 1000000] [--samples 50]
+Needs a display (on a headless Linux box run it under xvfb-run).
+"""
+import argparse
+import statistics
+import sys
+import time
+import tkinter as tk
+
+from document_editor import DocumentEditor
+from latency import percentile
+
+SAMPLE_LINE = "ދިވެހި ބަހުން ލިޔެފައިވާ ޖުމްލައެއް. "  # ~40 chars of Thaana per sentence
+SENTENCES_PER_PARAGRAPH = 8
+
+
+def build_document(char_count: int) -> str:
+    paragraph = SAMPLE_LINE * SENTENCES_PER_PARAGRAPH + "\n"
+    repeats = char_count // len(paragraph) + 1
+    return (paragraph * repeats)[:char_count]
+
+
+class LegacyEditor:
+    """The editor behaviour from before DocumentEditor, kept here for comparison."""
+
+    def __init__(self, root: tk.Tk, text_area: tk.Text, cursor_label: tk.Label) -> None:
+        self.root = root
+        self.text_area = text_area
+        self.cursor_label = cursor_label
+        text_area.tag_configure("rtl_align", justify=tk.RIGHT)
+        text_area.tag_configure("ltr_align", justify=tk.LEFT)
+        text_area.tag_add("rtl_align", "1.0", tk.END)
+        self.direction = "RTL"
+
+    def update_cursor_position(self) -> None:
+        row, col = self.text_area.index(tk.INSERT).split('.')
+        self.cursor_label.config(text=f"Cursor: {int(row)}:{col}")
+
+    def type_key(self, char: str) -> None:
+        self.text_area.insert(tk.INSERT, char)
+        self.update_cursor_position()
+
+    def insert_fragment(self, text: str) -> None:
+        self.text_area.insert(tk.INSERT, text)
+        self.update_cursor_position()
+
+    def toggle_direction(self) -> None:
+        self.direction = "LTR" if self.direction == "RTL" else "RTL"
+        self.text_area.tag_remove("rtl_align", "1.0", tk.END)
+        self.text_area.tag_remove("ltr_align", "1.0", tk.END)
+        tag = "rtl_align" if self.direction == "RTL" else "ltr_align"
+        self.text_area.tag_add(tag, "1.0", tk.END)
+
+
+class LargeDocumentEditor:
+    """Drives DocumentEditor the way the GUI does."""
+
+    def __init__(self, root: tk.Tk, text_area: tk.Text, cursor_label: tk.Label) -> None:
+        self.editor = DocumentEditor(root, text_area,
+                                     on_cursor_moved=lambda r, c: cursor_label.config(text=f"Cursor: {r}:{c}"))
+        self.text_area = text_area
+
+    def type_key(self, char: str) -> None:
+        self.text_area.insert(tk.INSERT, char)
+        self.editor._on_edit_event()
+
+    def insert_fragment(self, text: str) -> None:
+        self.editor.queue_insert(text)
+        self.editor.flush()
+
+    def toggle_direction(self) -> None:
+        self.editor.set_direction("LTR" if self.editor.direction == "RTL" else "RTL")
+
+
+def time_operation(root: tk.Tk, operation, samples: int) -> list:
+    timings_ms = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        operation()
+        root.update_idletasks()  # Include the redraw the user would wait for
+        timings_ms.append((time.perf_counter() - start) * 1000)
+    return timings_ms
+
+
+def run_case(editor_cls, char_count: int, samples: int) -> dict:
+    root = tk.Tk()
+    root.geometry("1000x700")
+    text_area = tk.Text(root, wrap=tk.WORD, font=("Faruma", 16))
+    text_area.pack(fill=tk.BOTH, expand=True)
+    cursor_label = tk.Label(root)
+    cursor_label.pack()
+    text_area.insert("1.0", build_document(char_count))
+    text_area.mark_set(tk.INSERT, tk.END)
+    editor = editor_cls(root, text_area, cursor_label)
+    root.update()
+
+    results = {
+        "typing": time_operation(root, lambda: editor.type_key("ށ"), samples),
+        "insert": time_operation(root, lambda: editor.insert_fragment(SAMPLE_LINE), samples),
+        "toggle": time_operation(root, editor.toggle_direction, max(2, samples // 10)),
+    }
+    root.destroy()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        print(f"Cannot open a Tk window ({e}). Run under a display or xvfb-run.", file=sys.stderr)
+        return 1
+
+    print(f"{'chars':>10} {'mode':>8} {'op':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for size in args.sizes:
+        for name, editor_cls in (("legacy", LegacyEditor), ("large", LargeDocumentEditor)):
+            for op, timings in run_case(editor_cls, size, args.samples).items():
+                print(f"{size:>10} {name:>8} {op:>7} {statistics.median(timings):>9.2f} "
+                      f"{percentile(timings, 99):>9.2f} {max(timings):>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+CPU placement of the capture, inference and UI threads.
+
+The PortAudio callback, the inference threads (with torch's intra-op pool) and the
+Tk main loop otherwise share every core. When inference saturates the cores, the
+callback can be scheduled too late and PortAudio drops input (an ``input_overflow``
+status). A ``CpuPlacement`` gives each role its own cores:
+
+- ``capture``: the PortAudio callback thread. It is pinned before the stream starts:
+  the starting thread switches to the capture cores while it starts the stream, so
+  the callback thread PortAudio creates inherits them. The callback itself does no
+  pinning or logging.
+- ``ui``: the app's main (Tk) thread, pinned just before the main loop so the helper
+  threads started during setup do not inherit it. Helpers it starts later (exports,
+  model loads) are started on the inference cores.
+- ``inference``: the engine's worker and pipeline threads. On Linux, threads inherit
+  their creator's affinity, so the pipeline's stage threads and the OpenMP teams that
+  torch starts from them stay on these cores. torch's intra-op pool is sized to them.
+
+``auto`` reserves the last core for capture and the one before it for the UI, and
+leaves the rest to inference. With fewer than ``MIN_AUTO_CPUS`` cores there is not
+enough to split, so nothing is pinned. Pinning uses ``sched_setaffinity`` on Linux
+and ``SetThreadAffinityMask`` on Windows. Windows threads do not inherit affinity,
+so there only the worker and UI threads are pinned. Elsewhere placement is a no-op.
+The engine counts input overflows per session (``capture_stats``), so the effect of
+a placement can be measured.
+
+A placement is given as ``auto``, ``off`` or e.g. ``capture=7:ui=6:inference=0-5``.
+"""
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+MIN_AUTO_CPUS = 4
+ROLES = ("capture", "ui", "inference")
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> List[int]:
+    """The CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pin_current_thread(cpus: Tuple[int, ...]) -> bool:
+    """Restricts the calling thread to ``cpus``; returns False where that is not supported."""
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)  # 0 is the calling thread on Linux
+            return True
+        if sys.platform == "win32":
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadAffinityMask.restype = ctypes.c_size_t
+            kernel32.SetThreadAffinityMask.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+            mask = sum(1 << cpu for cpu in cpus)
+            return kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), mask) != 0
+    except (OSError, ValueError) as e:
+        logger.warning("Could not pin thread '%s' to CPUs %s: %s", threading.current_thread().name, list(cpus), e)
+    return False
+
+
+def _parse_cpus(text: str) -> Tuple[int, ...]:
+    cpus = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return tuple(cpus)
+
+
+@dataclass(frozen=True)
+class CpuPlacement:
+    capture: Tuple[int, ...]
+    ui: Tuple[int, ...]
+    inference: Tuple[int, ...]
+
+    @classmethod
+    def auto(cls, cpus: Optional[List[int]] = None) -> Optional["CpuPlacement"]:
+        """Capture on the last core, the UI on the one before, inference on the rest; None if too few cores."""
+        cpus = sorted(cpus if cpus is not None else available_cpus())
+        if len(cpus) < MIN_AUTO_CPUS:
+            logger.info(f"{len(cpus)} CPUs available; threads are not pinned (needs {MIN_AUTO_CPUS}).")
+            return None
+        return cls(capture=(cpus[-1],), ui=(cpus[-2],), inference=tuple(cpus[:-2]))
+
+    @classmethod
+    def parse(cls, spec: str) -> Optional["CpuPlacement"]:
+        """``auto``, ``off`` or ``capture=CPUS:ui=CPUS:inference=CPUS`` with CPUS like ``0-5,7``."""
+        if spec == "auto":
+            return cls.auto()
+        if spec == "off":
+            return None
+        roles: Dict[str, Tuple[int, ...]] = {}
+        for part in spec.split(":"):
+            role, _, cpus = part.partition("=")
+            if role not in ROLES or not cpus:
+                raise ValueError(f"Invalid CPU placement '{spec}'; expected auto, off or "
+                                 f"capture=CPUS:ui=CPUS:inference=CPUS.")
+            roles[role] = _parse_cpus(cpus)
+        missing = [role for role in ROLES if role not in roles]
+        if missing:
+            raise ValueError(f"CPU placement '{spec}' is missing {', '.join(missing)}.")
+        return cls(**roles)
+
+    def pin(self, role: str) -> bool:
+        """Pins the calling thread to ``role``'s CPUs."""
+        pinned = pin_current_thread(getattr(self, role))
+        if pinned:
+            logger.info("Thread '%s' pinned to %s CPUs %s.", threading.current_thread().name, role, getattr(self, role))
+        return pinned
+
+    @contextmanager
+    def inherited_by_new_threads(self, role: str):
+        """
+        Threads started inside the block (e.g. PortAudio's callback thread) start on
+        ``role``'s CPUs; the calling thread gets its own CPUs back afterwards. Linux only.
+        """
+        if not hasattr(os, "sched_getaffinity"):
+            logger.info("%s threads are not pinned: threads do not inherit affinity on this platform.", role)
+            yield
+            return
+        previous = tuple(os.sched_getaffinity(0))
+        pinned = pin_current_thread(getattr(self, role))
+        if pinned:
+            logger.info("Threads started for %s are pinned to CPUs %s.", role, list(getattr(self, role)))
+        try:
+            yield
+        finally:
+            if pinned:
+                pin_current_thread(previous)
+
+    def size_torch_pools(self) -> None:
+        """Sizes torch's intra-op pool to the inference cores."""
+        import torch
+        torch.set_num_threads(len(self.inference))
+
+    def describe(self) -> str:
+        return ", ".join(f"{role} {list(getattr(self, role))}" for role in ROLES)
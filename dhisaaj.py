@@ -1,141 +1,173 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import threading
-from threading import Thread
+import argparse
+import contextlib
 from typing import Optional # Added for type hinting
-import time
-import sounddevice as sd
-from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
-import torch
-import numpy as np
-from queue import Queue
 import logging
 import os
 import sys # Added for sys.exit and sys.stdout
-from docx import Document
+import threading
+import time
+from document_editor import DocumentEditor
+from transcript_journal import TranscriptJournal, read_segments, export_in_background, write_docx, write_txt
+from dictation_engine import DictationEngine, TranscriptResult, DEFAULT_MODEL_DIR
+from timestamps import WORD_FILE_EXTENSIONS, open_word_writer
+from latency import LatencyStats
+from model_registry import ModelRegistry, model_name
+from adaptive_control import ControlLimits
+from profiling import SessionProfiler, add_profile_argument
+from ui_lag import EventLoopLagMonitor, format_lag
+from transcript_index import TranscriptIndex, format_hit
+from cpu_placement import CpuPlacement
+from logging_setup import configure_logging, format_overhead, overhead
 
 # --- Global Variables ---
 # These will be initialized in the main block after checks.
-processor: Optional[Wav2Vec2Processor] = None
-model: Optional[Wav2Vec2ForCTC] = None
+engine: Optional[DictationEngine] = None # Owns the model, audio capture and decoding
 logger: Optional[logging.Logger] = None # Will be initialized by main
 
-# Initialize audio queue
-q = Queue()
-# Global reference to the audio stream object
-audio_stream = None
 
+# --- GUI Related Functions ---
 
-# --- Constants ---
-MODEL_SAMPLING_RATE = 16000  # Hz
-AUDIO_CHANNELS = 1           # Mono audio
-# MODEL_PROCESS_CHUNK_SIZE_SECONDS = 1 # This was an idea, but processor handles chunking.
-MODEL_PROCESS_CHUNK_SIZE_SAMPLES = 16000 # Process this many samples at a time by the model (e.g., 1 second)
-MIN_AUDIO_CHUNK_SAMPLES_FOR_TRANSCRIPTION = 1000 # Min samples for a chunk to be transcribed (e.g., ~60ms)
+def _ask_save_filename(title: str) -> str:
+    return filedialog.asksaveasfilename(
+        title=title,
+        defaultextension=".docx",
+        filetypes=[("Word Document", "*.docx"), ("Text Document", "*.txt"), ("All Files", "*.*")]
+    )
 
+def _report_export_result(widget: tk.Misc, filename: str, what: str) -> tuple:
+    """Returns (on_done, on_error) callbacks that show the export result on the Tk thread."""
+    def on_done() -> None:
+        if logger: logger.info(f"{what} saved to {filename}")
+        widget.after(0, lambda: messagebox.showinfo("Success", f"{what} saved successfully to {filename}"))
 
-# --- Audio Handling ---
+    def on_error(e: Exception) -> None:
+        widget.after(0, lambda: messagebox.showerror("Save Error", f"An error occurred while saving: {e}"))
 
-def audio_callback(indata: np.ndarray, frames: int, time_info, status: sd.CallbackFlags) -> None:
-    """
-    This callback is invoked by sounddevice from a separate thread for each block of incoming audio data.
-    """
-    global logger # Ensure logger is accessible
-    if status:
-        if logger: logger.warning(f"Audio Callback Status: {status}")
-        else: print(f"Audio Callback Status (logger not init): {status}")
-    q.put(indata.copy())
+    return on_done, on_error
 
-def transcribe(audio_chunk: np.ndarray) -> str:
+def _off_ui_core():
     """
-    Transcribes a given audio chunk using the pre-loaded Wav2Vec2 model.
-    The audio_chunk is expected to be a numpy array of raw audio samples.
+    Threads started inside this run on the inference cores rather than inheriting the
+    Tk thread's UI core (see cpu_placement.py). Use it when the Tk thread starts helpers.
     """
-    global processor, model, logger # Ensure access to global model/processor and logger
-    if not processor or not model:
-        if logger: logger.error("Transcription called but model or processor not loaded.")
-        else: print("Transcription called but model or processor not loaded.")
-        return ""
-
+    if engine is not None and engine.placement:
+        return engine.placement.inherited_by_new_threads("inference")
+    return contextlib.nullcontext()
+
+def _index_saved_file(index: Optional[TranscriptIndex], filename: str, paragraphs: Optional[list] = None) -> None:
+    """Adds a just-written transcript to the search index; a failure here never fails the save."""
+    if index is None:
+        return
     try:
-        audio_chunk = np.squeeze(audio_chunk)
-        if len(audio_chunk.shape) > 1:
-            audio_chunk = audio_chunk.mean(axis=1)
-        
-        model_input_chunks = [
-            audio_chunk[i:i + MODEL_PROCESS_CHUNK_SIZE_SAMPLES]
-            for i in range(0, len(audio_chunk), MODEL_PROCESS_CHUNK_SIZE_SAMPLES)
-        ]
-        
-        full_text_parts = []
-        for chunk_segment in model_input_chunks:
-            if len(chunk_segment) < MIN_AUDIO_CHUNK_SAMPLES_FOR_TRANSCRIPTION:
-                if logger: logger.debug(f"Skipping very short audio chunk segment: {len(chunk_segment)} samples")
-                continue
-
-            input_values = processor(chunk_segment, return_tensors="pt", sampling_rate=MODEL_SAMPLING_RATE).input_values
-            logits = model(input_values).logits
-            predicted_ids = torch.argmax(logits, dim=-1)
-            text_segment = processor.decode(predicted_ids[0])
-            
-            if text_segment and len(text_segment.strip()) > 0:
-                full_text_parts.append(text_segment.strip())
-                
-        return " ".join(full_text_parts)
-        
+        index.add_file(filename, paragraphs)
     except Exception as e:
-        if logger: logger.error(f"Error during transcription: {str(e)}", exc_info=True)
-        else: print(f"Error during transcription (logger not init): {str(e)}")
-        return ""
-
+        if logger: logger.warning(f"Could not index '{filename}' for search: {e}")
+
+def _write_snapshot(text_area: tk.Text, journal: TranscriptJournal, index: Optional[TranscriptIndex],
+                    title: str, what: str) -> None:
+    """Writes the whole document as shown in ``text_area`` to a file chosen by the user."""
+    content = text_area.get("1.0", tk.END + "-1c") # Correct way to get all text except trailing newline
+    if not content.strip():
+        messagebox.showwarning("Empty Document", "The document is empty. Nothing to save.")
+        return
+
+    filename = _ask_save_filename(title)
+    if filename:
+        # Only the snapshot above touches the widget; writing happens off the UI thread.
+        paragraphs = content.split("\n")
+        saved = journal.mark() # Dictation in the snapshot needs no crash recovery once it is written
+
+        def export() -> None:
+            if filename.endswith(".docx"):
+                write_docx(paragraphs, filename)
+            else: # Save as plain text
+                write_txt(paragraphs, filename, separator="\n")
+            journal.discard_through(saved) # Trims only the crash-recovery journal
+            _index_saved_file(index, filename, paragraphs)
 
-# --- GUI Related Functions ---
+        on_done, on_error = _report_export_result(text_area, filename, what)
+        with _off_ui_core():
+            export_in_background(export, on_done, on_error)
 
-def save_document(text_area: tk.Text) -> None:
+def save_document(text_area: tk.Text, journal: TranscriptJournal, index: Optional[TranscriptIndex] = None) -> None:
     global logger
     try:
-        content = text_area.get("1.0", tk.END + "-1c") # Correct way to get all text except trailing newline
-        if not content.strip():
-            messagebox.showwarning("Empty Document", "The document is empty. Nothing to save.")
-            return
-            
-        filename = filedialog.asksaveasfilename(
-            defaultextension=".docx",
-            filetypes=[("Word Document", "*.docx"), ("Text Document", "*.txt"), ("All Files", "*.*")]
-        )
-        
-        if filename:
-            if filename.endswith(".docx"):
-                doc = Document()
-                doc.add_paragraph(content)
-                doc.save(filename)
-            else: # Save as plain text
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(content)
-            messagebox.showinfo("Success", f"Document saved successfully to {filename}")
-            if logger: logger.info(f"Document saved to {filename}")
+        _write_snapshot(text_area, journal, index, "Save Document", "Document")
     except Exception as e:
         if logger: logger.error(f"Error saving document: {str(e)}", exc_info=True)
         messagebox.showerror("Save Error", f"An error occurred while saving the document: {str(e)}")
 
-def new_document(text_area: tk.Text) -> None:
+def export_transcript(text_area: tk.Text, journal: TranscriptJournal,
+                      index: Optional[TranscriptIndex] = None) -> None:
+    """
+    Exports the full transcript. The journal only holds dictation since the last save,
+    so the text area is the source; the file is written on a worker thread.
+    """
+    try:
+        _write_snapshot(text_area, journal, index, "Export Dictated Transcript", "Transcript")
+    except Exception as e:
+        if logger: logger.error(f"Error exporting transcript: {str(e)}", exc_info=True)
+        messagebox.showerror("Save Error", f"An error occurred while exporting the transcript: {str(e)}")
+
+def show_search_results(root: tk.Tk, index: TranscriptIndex, query: str) -> None:
+    """Lists the saved transcripts containing ``query``; double-click opens the file."""
+    if not query.strip():
+        return
+    started = time.perf_counter()
+    try:
+        hits = index.search(query)
+    except Exception as e:
+        if logger: logger.error(f"Search failed: {e}", exc_info=True)
+        messagebox.showerror("Search Error", f"An error occurred while searching: {e}")
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    window = tk.Toplevel(root)
+    window.title(f"Search: {query}")
+    window.geometry("800x400")
+    tk.Label(window, text=f"{len(hits)} hits in {elapsed_ms:.1f} ms", anchor=tk.W).pack(fill=tk.X, padx=5, pady=5)
+    listbox = tk.Listbox(window, font=("Faruma", 12))
+    listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+    for hit in hits:
+        listbox.insert(tk.END, format_hit(hit))
+
+    def open_selected(event=None) -> None:
+        selection = listbox.curselection()
+        if not selection:
+            return
+        path = hits[selection[0]].path
+        try:
+            os.startfile(path) # Windows only, like the rest of the app's packaging
+        except Exception as e:
+            messagebox.showerror("Open Error", f"Could not open {path}: {e}", parent=window)
+
+    listbox.bind("<Double-Button-1>", open_selected)
+
+def new_document(editor: DocumentEditor, journal: TranscriptJournal) -> None:
     global logger
+    text_area = editor.text_area
     try:
         if text_area.get("1.0", tk.END + "-1c").strip(): # Check if there's content
             if messagebox.askyesno("New Document",
                                    "Are you sure you want to create a new document?\n"
                                    "All unsaved changes in the current document will be lost."):
-                text_area.delete("1.0", tk.END)
+                editor.clear()
+                journal.reset()
                 if logger: logger.info("New document created, text area cleared.")
         else: # If no content, just clear (though it should be empty)
-            text_area.delete("1.0", tk.END)
+            editor.clear()
+            journal.reset()
             if logger: logger.info("Text area already empty or cleared for new document.")
     except Exception as e:
         if logger: logger.error(f"Error creating new document: {str(e)}", exc_info=True)
         messagebox.showerror("New Document Error", f"An error occurred: {str(e)}")
 
 # --- Main GUI Setup ---
-def start_gui() -> None:
+def start_gui(registry: ModelRegistry, subtitles_path: Optional[str] = None,
+              profile_seconds: Optional[float] = None, debug: bool = False,
+              stop_timeout: float = 1.5) -> None:
     global logger # Ensure logger is accessible
     root = tk.Tk()
     root.title("Dhisaaj - Dhivehi Dictation Tool")
@@ -171,21 +203,54 @@ def start_gui() -> None:
                         bg=text_bg, fg=fg_color, insertbackground=fg_color,
                         spacing1=5, spacing2=2, spacing3=5, relief=tk.FLAT, borderwidth=0)
     
-    save_button = create_styled_button(control_panel, "Save", lambda: save_document(text_area))
+    save_button = create_styled_button(control_panel, "Save", lambda: save_document(text_area, journal, search_index))
     save_button.pack(side=tk.LEFT, padx=5)
     
-    new_button = create_styled_button(control_panel, "New", lambda: new_document(text_area))
+    new_button = create_styled_button(control_panel, "New", lambda: new_document(editor, journal))
     new_button.pack(side=tk.LEFT, padx=5)
     
+    export_button = create_styled_button(control_panel, "Export", lambda: export_transcript(text_area, journal, search_index))
+    export_button.pack(side=tk.LEFT, padx=5)
+
+    # Full-text search over saved transcripts; saves and exports are indexed as they are written
+    search_index = TranscriptIndex()
+
+    def refresh_index() -> None:
+        try:
+            updated, removed = search_index.refresh()
+            if logger and (updated or removed):
+                logger.info(f"Search index: {updated} transcripts re-indexed, {removed} removed.")
+        except Exception as e:
+            if logger: logger.warning(f"Could not refresh the search index: {e}")
+
+    threading.Thread(target=refresh_index, name="SearchIndexRefresh", daemon=True).start()
+
+    search_frame = tk.Frame(control_panel, bg=bg_color)
+    search_frame.pack(side=tk.LEFT, padx=10)
+    search_var = tk.StringVar()
+    search_entry = tk.Entry(search_frame, textvariable=search_var, width=18, font=("Faruma", 11),
+                            bg=text_bg, fg=fg_color, insertbackground=fg_color, relief=tk.FLAT)
+    search_entry.pack(side=tk.LEFT, padx=(0, 5))
+    run_search = lambda event=None: show_search_results(root, search_index, search_var.get())
+    search_entry.bind("<Return>", run_search)
+    create_styled_button(search_frame, "Search", run_search, width=6).pack(side=tk.LEFT)
+    
     dictation_var = tk.StringVar(value="Start")
     
     status_bar = tk.Label(main_frame, text="Status: Initializing...", bd=1, relief=tk.SUNKEN, anchor=tk.W,
                                     bg=bg_color, fg=fg_color, font=("Arial", 10))
 
-    def update_status(text: str) -> None:
+    status_text, lag_text = "", ""
+
+    def refresh_status_bar() -> None:
         if status_bar.winfo_exists():
-            status_bar.config(text=f"Status: {text}")
-        if logger: logger.info(f"Status updated: {text}")
+            status_bar.config(text=f"Status: {status_text}" + (f"    |    {lag_text}" if debug and lag_text else ""))
+
+    def update_status(text: str) -> None:
+        nonlocal status_text
+        status_text = text
+        refresh_status_bar()
+        if logger: logger.debug("Status updated: %s", text) # Several times per chunk
         else: print(f"Status updated (logger not init): {text}")
 
     dictation_button = create_styled_button(control_panel, dictation_var.get(),
@@ -205,15 +270,54 @@ def start_gui() -> None:
         new_direction = "LTR" if current_direction == "RTL" else "RTL"
         direction_var.set(new_direction)
         direction_toggle_button.config(text=new_direction)
-        text_area.tag_remove("rtl_align", "1.0", tk.END)
-        text_area.tag_remove("ltr_align", "1.0", tk.END)
-        if new_direction == "RTL": text_area.tag_add("rtl_align", "1.0", tk.END)
-        else: text_area.tag_add("ltr_align", "1.0", tk.END)
+        editor.set_direction(new_direction)
     
     direction_toggle_button = create_styled_button(direction_frame, direction_var.get(),
                                                  toggle_text_direction, width=5)
     direction_toggle_button.pack(side=tk.LEFT)
     
+    # Model switching: loads in the background, then swaps between utterances
+    available_models = registry.scan()
+    model_var = tk.StringVar(value=model_name(engine.model_dir))
+    model_frame = tk.Frame(control_panel, bg=bg_color)
+    model_frame.pack(side=tk.LEFT, padx=10)
+    tk.Label(model_frame, text="Model:", bg=bg_color, fg=fg_color, font=("Arial", 10)).pack(side=tk.LEFT)
+    model_combobox = ttk.Combobox(model_frame, textvariable=model_var, values=list(available_models),
+                                  state="readonly", width=18)
+    model_combobox.pack(side=tk.LEFT, padx=5)
+
+    pinned_model_dir = engine.model_dir # Pinned in the registry while the engine uses it
+    registry.acquire(pinned_model_dir)
+
+    def on_model_loaded(future, model_dir: str) -> None:
+        nonlocal pinned_model_dir
+        try:
+            future.result() # Raises if the load failed
+            processor, model = registry.acquire(model_dir) # Resident after the preload, so this does not block
+            try:
+                engine.switch_model(processor, model, model_dir)
+            except Exception:
+                registry.release(model_dir)
+                raise
+            registry.release(pinned_model_dir)
+            pinned_model_dir = model_dir
+        except Exception as e:
+            if logger: logger.error(f"Could not switch to model '{model_dir}': {e}", exc_info=True)
+            messagebox.showerror("Model Error", f"Could not switch to model '{model_name(model_dir)}': {e}")
+            model_var.set(model_name(engine.model_dir))
+            update_status("Ready")
+
+    def on_model_selected(event=None) -> None:
+        model_dir = available_models[model_var.get()]
+        if os.path.abspath(model_dir) == os.path.abspath(engine.model_dir):
+            return
+        update_status(f"Loading model {model_var.get()}...")
+        with _off_ui_core(): # The registry's loader thread is created on first use
+            future = registry.preload(model_dir)
+        future.add_done_callback(lambda f: app_root.after(0, lambda: on_model_loaded(f, model_dir)))
+
+    model_combobox.bind("<<ComboboxSelected>>", on_model_selected)
+
     cursor_label = tk.Label(control_panel, text="Cursor: 1.0", bg=bg_color, fg=fg_color, font=("Arial", 10))
     cursor_label.pack(side=tk.RIGHT, padx=10)
     
@@ -227,143 +331,173 @@ def start_gui() -> None:
     scrollbar.config(command=text_area.yview)
     text_area.config(yscrollcommand=scrollbar.set) # Ensure this is set
     
-    text_area.tag_configure("rtl_align", justify=tk.RIGHT)
-    text_area.tag_configure("ltr_align", justify=tk.LEFT)
-    text_area.tag_add("rtl_align", "1.0", tk.END)
+    def update_cursor_label(row: int, col: int) -> None:
+        cursor_label.config(text=f"Cursor: {row}:{col}")
     
-    def update_cursor_position(event=None) -> None:
-        if text_area.winfo_exists():
-            row, col = text_area.index(tk.INSERT).split('.')
-            cursor_label.config(text=f"Cursor: {int(row)}:{col}")
+    # Mic-to-screen latency, from the audio's capture time to its text being inserted
+    screen_latency = LatencyStats("Mic-to-screen latency")
+    decode_latency = LatencyStats("Mic-to-text latency")
+
+    def on_text_displayed(captured_at: float) -> None:
+        screen_latency.record((time.perf_counter() - captured_at) * 1000)
+
+    logging_baseline = overhead()
+
+    def reset_latency() -> None:
+        # The summaries are logged per Stop, so each covers one session
+        nonlocal logging_baseline
+        decode_latency.reset()
+        screen_latency.reset()
+        logging_baseline = overhead()
+
+    def log_latency() -> None:
+        if logger:
+            logger.info(decode_latency.format_summary())
+            logger.info(screen_latency.format_summary())
+            logger.info(lag_monitor.session.format_summary())
+            logger.info(engine.stop_latency.format_summary())
+            logger.info(format_overhead(overhead(since=logging_baseline)))
+
+    # Direction tagging, cursor updates and transcript inserts stay proportional to what changed
+    editor = DocumentEditor(root, text_area, on_cursor_moved=update_cursor_label,
+                            direction=direction_var.get(), on_displayed=on_text_displayed)
+    editor.schedule_cursor_update()
     
-    text_area.bind('<KeyRelease>', update_cursor_position)
-    text_area.bind('<ButtonRelease>', update_cursor_position)
-    update_cursor_position()
+    # Committed segments are journaled to disk so a crash loses at most ~1s of dictation
+    previous_segments = list(read_segments())
+    journal = TranscriptJournal()
+    if previous_segments:
+        if messagebox.askyesno("Restore Dictation",
+                               "Unsaved dictation from a previous session was found.\n"
+                               "Do you want to restore it?"):
+            editor.queue_insert(" ".join(previous_segments) + " ")
+            if logger: logger.info(f"Restored {len(previous_segments)} journaled segments.")
+        else:
+            journal.reset()
     
-    dictation_thread: Optional[Thread] = None
     dictation_running: bool = False
-    audio_stream_active: bool = False
     app_root: tk.Tk = root
 
     status_bar.pack(side=tk.BOTTOM, fill=tk.X) # pady removed, handled by text_frame_outer
     update_status("Ready")
 
-    def start_audio_stream_gui_cb() -> None:
-        nonlocal audio_stream, audio_stream_active, dictation_running, dictation_var
-        if audio_stream_active: return
-        try:
-            while not q.empty():
-                try: q.get_nowait()
-                except Queue.Empty: break
-            audio_stream = sd.InputStream(samplerate=MODEL_SAMPLING_RATE, channels=AUDIO_CHANNELS,
-                                          callback=audio_callback, dtype='float32')
-            audio_stream.start()
-            audio_stream_active = True
-            if logger: logger.info("Audio stream started.")
-            update_status("Listening...")
-        except Exception as e:
-            if logger: logger.error(f"Fatal error starting audio stream: {e}", exc_info=True)
-            messagebox.showerror("Audio Error", f"Could not start audio input: {e}")
-            dictation_running = False
-            if dictation_var.get() == "Stop": dictation_var.set("Start")
-            audio_stream_active = False
-            update_status("Error: Audio stream failed.")
-
-    def stop_audio_stream_gui_cb() -> None:
-        nonlocal audio_stream, audio_stream_active
-        if not audio_stream_active or not audio_stream:
-            if audio_stream_active and not audio_stream:
-                 if logger: logger.warning("stop_audio_stream_gui_cb: audio_stream_active is True but audio_stream is None.")
-            audio_stream_active = False
+    word_writer = open_word_writer(subtitles_path) if subtitles_path else None
+    word_writer_lock = threading.Lock()  # Written on engine threads, closed on the Tk thread
+
+    def on_transcript(result: TranscriptResult) -> None:
+        # Runs on an engine thread; the editor queues are thread-safe
+        if result.session != engine.session:
+            return  # Delivered while the session was being stopped
+        if result.captured_at is not None and result.decoded_at is not None:
+            decode_latency.record((result.decoded_at - result.captured_at) * 1000)
+        if not result.is_final:
+            editor.queue_draft(result.text + " ", result.utterance_id, result.captured_at)
             return
-        try:
-            if logger: logger.info("Attempting to stop audio stream...")
-            audio_stream.stop(); audio_stream.close()
-            if logger: logger.info("Audio stream stopped/closed.")
-        except Exception as e:
-            if logger: logger.error(f"Error stopping audio stream: {e}", exc_info=True)
-        finally:
-            audio_stream = None; audio_stream_active = False
-            if not dictation_running: update_status("Ready")
+        if result.text:
+            journal.append(result.text)
+        if result.words:
+            with word_writer_lock:
+                if word_writer:
+                    word_writer.add(result.words)
+        if engine.two_pass_decoder:
+            editor.queue_final(result.text + " " if result.text else "", result.utterance_id, result.captured_at)
+        else:
+            editor.queue_insert(result.text + " ", result.captured_at)
+
+    engine_status = ""
+
+    def on_engine_status(text: str) -> None:
+        # Runs on an engine thread
+        nonlocal engine_status
+        engine_status = text
+        app_root.after(0, lambda: update_status(text))
+
+    engine.add_listener(on_transcript)
+    engine.add_status_listener(on_engine_status)
+
+    # Event-loop lag heartbeat, tagged with what the engine is doing; shown in the status bar with --debug
+    def current_activity() -> str:
+        if not dictation_running:
+            return "idle"
+        return "processing" if engine_status == "Processing..." else "listening"
+
+    def on_lag_report(summary: dict) -> None:
+        nonlocal lag_text
+        lag_text = format_lag(summary)
+        refresh_status_bar()
+
+    lag_monitor = EventLoopLagMonitor(root, activity=current_activity, on_report=on_lag_report,
+                                      report_seconds=1.0 if debug else 5.0)
+    lag_monitor.start()
+
+    # --profile: each dictation session is profiled for its first profile_seconds
+    profiler = SessionProfiler(max_seconds=profile_seconds) if profile_seconds else None
+    profile_timer: Optional[str] = None # after() id of the pending auto-stop
+
+    def stop_profile() -> None:
+        # Runs on the Tk thread, which started the profiler, so its own profile is closed too
+        nonlocal profile_timer
+        if profile_timer is not None:
+            app_root.after_cancel(profile_timer) # Otherwise it would cut the next session's profile short
+            profile_timer = None
+        if profiler and profiler.active:
+            session_dir = profiler.stop()
+            if session_dir: update_status(f"Profile written to {session_dir}")
 
     def toggle_dictation(button_tk_var: tk.StringVar) -> None:
-        nonlocal dictation_thread, dictation_running, audio_stream_active
+        nonlocal dictation_running, profile_timer
         if not dictation_running:
             update_status("Starting dictation...")
+            if profiler:
+                profiler.start(auto_stop=False)
+                profile_timer = app_root.after(int(profiler.max_seconds * 1000), stop_profile)
+            reset_latency()
+            try:
+                engine.start()
+            except Exception as e:
+                if logger: logger.error(f"Fatal error starting audio stream: {e}", exc_info=True)
+                messagebox.showerror("Audio Error", f"Could not start audio input: {e}")
+                update_status("Error: Audio stream failed.")
+                stop_profile()
+                return
             dictation_running = True
             button_tk_var.set("Stop")
-            start_audio_stream_gui_cb()
-            if audio_stream_active:
-                if logger: logger.info("Audio stream active, starting dictation thread.")
-                dictation_thread = Thread(target=dictation_thread_func,
-                                          args=(app_root, text_area, update_cursor_position, update_status),
-                                          daemon=True)
-                dictation_thread.start()
-            else:
-                if logger: logger.warning("Dictation start aborted: audio stream not active.")
-                dictation_running = False; button_tk_var.set("Start")
         else:
             update_status("Stopping dictation...")
             dictation_running = False
             button_tk_var.set("Start")
-            stop_audio_stream_gui_cb()
-            if dictation_thread and dictation_thread.is_alive():
-                if logger: logger.info("Waiting for dictation thread...")
-                try:
-                    dictation_thread.join(timeout=1.5)
-                    if dictation_thread.is_alive():
-                        if logger: logger.warning("Dictation thread join timeout.")
-                except Exception as e:
-                    if logger: logger.error(f"Error joining dictation thread: {e}", exc_info=True)
-            if logger: logger.info("Dictation process stopped.")
+            engine.stop(timeout=stop_timeout)
+            log_latency()
+            stop_profile()
 
     def on_app_closing() -> None:
-        nonlocal dictation_running, dictation_thread
+        nonlocal dictation_running, word_writer
+        if journal.has_unsaved and not messagebox.askyesno(
+                "Unsaved Dictation", "Dictated text has not been saved or exported.\n"
+                                     "Close anyway and discard it?"):
+            return
         if logger: logger.info("Application closing...")
         if dictation_running:
             dictation_running = False
-            if dictation_thread and dictation_thread.is_alive():
-                dictation_thread.join(timeout=0.75)
-        stop_audio_stream_gui_cb()
+            engine.stop(timeout=stop_timeout / 2) # Closing should feel immediate
+            log_latency()
+            stop_profile()
+        lag_monitor.stop()
+        journal.reset() # A clean exit; only a crash leaves the journal for the restore prompt
+        journal.close()
+        search_index.close()
+        with word_writer_lock:
+            # A cancelled session's worker may still be delivering; it finds no writer
+            if word_writer: word_writer.close()
+            word_writer = None
+        registry.close()
         if app_root.winfo_exists(): app_root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", on_app_closing)
-
-    def schedule_text_insertion(target_text_area: tk.Text, text_to_insert: str, cursor_update_cb: callable) -> None:
-        if target_text_area.winfo_exists():
-            target_text_area.insert(tk.INSERT, text_to_insert + " ")
-            cursor_update_cb()
-
-    def dictation_thread_func(ui_root: tk.Tk, target_text_area: tk.Text,
-                              cursor_update_cb: callable, status_updater_cb: callable) -> None:
-        nonlocal dictation_running
-        is_processing: bool = False
-        if logger: logger.info("Dictation thread started.")
-        while dictation_running:
-            try:
-                audio_chunk_data = q.get(timeout=0.2)
-                if not is_processing:
-                    ui_root.after(0, lambda: status_updater_cb("Processing..."))
-                    is_processing = True
-                transcribed_text = transcribe(audio_chunk_data)
-                if transcribed_text:
-                    ui_root.after(0, lambda text=transcribed_text: schedule_text_insertion(target_text_area, text, cursor_update_cb))
-                if dictation_running and is_processing:
-                    ui_root.after(0, lambda: status_updater_cb("Listening..."))
-                    is_processing = False
-            except Queue.Empty:
-                if dictation_running and is_processing:
-                    ui_root.after(0, lambda: status_updater_cb("Listening..."))
-                    is_processing = False
-                continue
-            except Exception as e:
-                if logger: logger.error(f"Error in dictation thread: {str(e)}", exc_info=True)
-                ui_root.after(0, lambda: status_updater_cb(f"Error. Check logs."))
-                is_processing = False; time.sleep(0.1)
-                continue
-        if logger: logger.info("Dictation thread finished.")
-        if not audio_stream_active: ui_root.after(0, lambda: status_updater_cb("Ready"))
     
+    if engine.placement:
+        # Last, so the helper threads started above do not inherit the UI core on Linux
+        engine.placement.pin("ui")
     if logger: logger.info("Starting Tkinter main loop.")
     root.mainloop()
     if logger: logger.info("Tkinter main loop finished.")
@@ -388,8 +522,54 @@ def _display_startup_error_and_exit(error_message: str, is_unexpected: bool = Fa
         print(f"CRITICAL ERROR (Tkinter popup failed):\n{error_message}", file=sys.stderr)
     sys.exit(1)
 
+def _latency_setting(value: str):
+    return value if value in ("low", "high") else float(value)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Dhisaaj - Dhivehi Dictation Tool")
+    parser.add_argument("--shared-weights", metavar="DIR", default=None,
+                        help="Memory-map the model weights from DIR (exported on first use) so that "
+                             "several dictation/batch processes share one copy")
+    parser.add_argument("--draft-exit-layer", type=int, metavar="N", default=None,
+                        help="Show quick draft text from transformer layer N, replaced by the "
+                             "full-model text when each utterance ends")
+    parser.add_argument("--subtitles", metavar="FILE", default=None,
+                        help="Also write word timestamps of the dictated text to FILE (.srt, .vtt or .json)")
+    parser.add_argument("--blocksize", type=int, metavar="FRAMES", default=0,
+                        help="Audio frames per capture callback (default: chosen by PortAudio)")
+    parser.add_argument("--latency", type=_latency_setting, metavar="low|high|SECONDS", default=None,
+                        help="Requested input latency of the audio stream (default: sounddevice's)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Retune the inference window and batch size while dictating, from the backlog "
+                             "and real-time factor (decisions go to logs/adaptive_decisions.jsonl)")
+    parser.add_argument("--max-window-seconds", type=float, metavar="SECONDS", default=ControlLimits.max_window_seconds,
+                        help="With --adaptive: longest inference window, which bounds the latency")
+    parser.add_argument("--cpu-placement", metavar="auto|off|SPEC", default="off",
+                        help="Give the audio capture, UI and inference threads their own cores, e.g. "
+                             "capture=7:ui=6:inference=0-5, or auto: last core for capture, the one "
+                             "before for the UI, the rest for inference; off below 4 cores (default: off)")
+    parser.add_argument("--stop-timeout", type=float, metavar="SECONDS", default=1.5,
+                        help="Longest Stop may take to decode audio already captured; the rest is "
+                             "cancelled and dropped (half of it on close)")
+    parser.add_argument("--models-dir", metavar="DIR", default="./models",
+                        help="Directory of additional model directories to switch between")
+    parser.add_argument("--max-models", type=int, metavar="N", default=2,
+                        help="Keep at most N models loaded in memory")
+    parser.add_argument("--model-memory-mb", type=float, metavar="MB", default=None,
+                        help="Keep loaded models' weights within MB (least recently used are dropped)")
+    parser.add_argument("--debug", action="store_true",
+                        help="Show UI event-loop lag (p50/p99/max) in the status bar; it is always written "
+                             "to logs/ui_metrics.jsonl")
+    add_profile_argument(parser, "each dictation session's first SECONDS")
+    args = parser.parse_args()
+    if args.subtitles and not args.subtitles.lower().endswith(WORD_FILE_EXTENSIONS):
+        parser.error(f"--subtitles must end in {', '.join(WORD_FILE_EXTENSIONS)}")
+    return args
+
 if __name__ == "__main__":
-    logging.basicConfig(
+    args = parse_args()
+    # Records are queued and written by a background thread, rate-limited per message
+    configure_logging(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(name)s - %(funcName)s - %(message)s',
         handlers=[logging.StreamHandler(sys.stdout)]
@@ -404,42 +584,48 @@ if __name__ == "__main__":
             _display_startup_error_and_exit("Python 3.7 or higher is required.")
         logger.info(f"Python version check passed ({sys.version.split()[0]}).")
 
-        required_pkgs = ['sounddevice', 'torch', 'transformers', 'numpy', 'python-docx']
+        required_pkgs = ['sounddevice', 'torch', 'transformers', 'numpy', 'docx'] # Import names (python-docx is 'docx')
         logger.info(f"Checking required packages: {required_pkgs}")
-        import importlib
+        import importlib.util
         missing_pkgs = [pkg for pkg in required_pkgs if not importlib.util.find_spec(pkg)]
         if missing_pkgs:
             _display_startup_error_and_exit(f"Missing required packages: {', '.join(missing_pkgs)}. Please install them.")
         logger.info("All required packages found.")
             
-        model_dir_path = "./model"
+        model_dir_path = DEFAULT_MODEL_DIR
         logger.info(f"Checking model directory: '{model_dir_path}'...")
         if not os.path.exists(model_dir_path) or not os.path.isdir(model_dir_path):
             _display_startup_error_and_exit(f"Model directory '{model_dir_path}' not found or is not a directory.")
         logger.info(f"Model directory '{model_dir_path}' found.")
             
-        model_files = ["config.json", "pytorch_model.bin", "preprocessor_config.json"]
-        logger.info(f"Checking model files in '{model_dir_path}': {model_files}")
-        missing_model_fs = [mf for mf in model_files if not os.path.exists(os.path.join(model_dir_path, mf))]
-        if missing_model_fs:
-            _display_startup_error_and_exit(f"Missing model files in '{model_dir_path}': {', '.join(missing_model_fs)}.")
-        logger.info("All required model files found.")
-            
-        logger.info("Loading Wav2Vec2 model and processor...")
         try:
-            processor = Wav2Vec2Processor.from_pretrained(model_dir_path, local_files_only=True)
-            if hasattr(processor, 'feature_extractor'): # Ensure sampling rate consistency
-                 processor.feature_extractor.sampling_rate = MODEL_SAMPLING_RATE
-            else: # Fallback for older transformers or different processor structure
-                processor.sampling_rate = MODEL_SAMPLING_RATE
-
-            model = Wav2Vec2ForCTC.from_pretrained(model_dir_path, local_files_only=True)
-            logger.info("Model and processor loaded successfully.")
+            placement = CpuPlacement.parse(args.cpu_placement)
+        except ValueError as e_placement:
+            _display_startup_error_and_exit(str(e_placement))
+        if placement: logger.info(f"CPU placement: {placement.describe()}")
+
+        engine = DictationEngine(model_dir_path, shared_weights_dir=args.shared_weights,
+                                 draft_exit_layer=args.draft_exit_layer,
+                                 word_timestamps=bool(args.subtitles),
+                                 blocksize=args.blocksize, latency=args.latency,
+                                 adaptive_limits=ControlLimits(max_window_seconds=args.max_window_seconds)
+                                                 if args.adaptive else None,
+                                 placement=placement)
+        try:
+            engine.load_model()
+        except FileNotFoundError as e_files:
+            _display_startup_error_and_exit(str(e_files))
         except Exception as e_model:
             _display_startup_error_and_exit(f"Failed to load model/processor from '{model_dir_path}'. Error: {e_model}", is_unexpected=True)
 
+        memory_budget = int(args.model_memory_mb * 1024 * 1024) if args.model_memory_mb else None
+        registry = ModelRegistry(args.models_dir, model_dir_path, max_models=args.max_models,
+                                 memory_budget_bytes=memory_budget)
+        registry.add(model_dir_path, engine.processor, engine.model)
+
         logger.info("Pre-flight checks and model loading complete. Starting GUI...")
-        start_gui()
+        start_gui(registry, subtitles_path=args.subtitles, profile_seconds=args.profile,
+                  debug=args.debug, stop_timeout=args.stop_timeout)
         logger.info("Application finished gracefully.")
         
     except SystemExit: # Allow sys.exit to propagate for clean termination
@@ -0,0 +1,833 @@
+"""
+Shared capture-and-transcribe engine used by every front-end.
+
+``DictationEngine`` owns the Wav2Vec2 model and processor, microphone capture,
+segmentation of the captured audio and decoding. The Tk (``dhisaaj.py``), PyQt
+(``main.py``) and Streamlit (``app.py``) apps are thin clients of it, so a change to
+the pipeline reaches all of them.
+
+Results are ``TranscriptResult`` objects, delivered two ways:
+
+- ``add_listener(callback)``: ``callback(result)`` runs on one of the engine's threads;
+  GUI clients marshal it to their UI thread (Tk ``after``, Qt signals).
+- ``results()``: returns a ``ResultSubscription``, a thread-safe queue you can iterate,
+  ``get`` from, or ``drain`` without blocking.
+
+Audio can come from the microphone (``start``) or be pushed in by the caller
+(``feed``) for headless use. Options such as decoding pipelines, caching, word
+timestamps, adaptive tuning and CPU placement are described on ``DictationEngine``.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from queue import Queue, Empty
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+
+from early_exit import TwoPassDecoder, format_report
+from local_attention import enable_local_attention
+from cpu_placement import CpuPlacement
+from latency import LatencyStats
+from adaptive_control import (AdaptiveController, ControlLimits, CONTROL_INTERVAL_SECONDS,
+                              DEFAULT_DECISION_LOG)
+from pipeline import Pipeline, Stage, format_stats
+from segmentation import FixedWindowSegmenter, UtteranceSegmenter
+from timestamps import Word, frame_seconds, words_from_ids
+from transcript_cache import TranscriptCache
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):  # Headless use (feed/transcribe) works without PortAudio
+    sd = None
+
+# --- Constants ---
+MODEL_SAMPLING_RATE = 16000  # Hz
+AUDIO_CHANNELS = 1           # Mono audio
+MODEL_PROCESS_CHUNK_SIZE_SAMPLES = 16000 # Process this many samples at a time by the model (e.g., 1 second)
+MIN_AUDIO_CHUNK_SAMPLES_FOR_TRANSCRIPTION = 1000 # Min samples for a chunk to be transcribed (e.g., ~60ms)
+DEFAULT_MODEL_DIR = "./model"
+REQUIRED_MODEL_FILES = ["config.json", "preprocessor_config.json"]
+MODEL_WEIGHT_FILES = ["pytorch_model.bin", "model.safetensors"]
+WORKER_POLL_SECONDS = 0.2
+PIPELINE_STAGE_WORKERS = {"features": 1, "forward": 1, "decode": 1}
+PIPELINE_QUEUE_SIZE = 2
+CAPTURE_TIME_HISTORY_SECONDS = 30  # Longer than any utterance, so every window's capture time is known
+RESTART_WAIT_SECONDS = 2.0  # How long start() waits for a cancelled session's worker
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionCancelled(Exception):
+    """Raised inside a transcription when its CancellationToken has been cancelled."""
+
+
+class CancellationToken:
+    """Cooperative cancellation, checked between model segments and stages."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise TranscriptionCancelled()
+
+
+@dataclass
+class TranscriptResult:
+    text: str
+    is_final: bool = True   # False for two-pass drafts, which the next final replaces
+    utterance_id: int = 0
+    words: Optional[List[Word]] = None  # Final results only, when the engine has word_timestamps on
+    captured_at: Optional[float] = None  # perf_counter time the window's last sample was captured
+    decoded_at: Optional[float] = None   # perf_counter time the text was decoded
+    session: int = 0  # Engine session that produced it; compare with ``DictationEngine.session``
+
+
+class _WindowInfo(NamedTuple):
+    """What travels through the decoding pipeline with each window's audio."""
+    utterance_id: int
+    start_seconds: float
+    captured_at: Optional[float]
+    samples: int
+
+
+class ResultSubscription:
+    """Thread-safe stream of results from one ``DictationEngine.results()`` call."""
+
+    def __init__(self, engine: "DictationEngine") -> None:
+        self._engine = engine
+        self._queue: Queue = Queue()
+
+    def _put(self, result: TranscriptResult) -> None:
+        self._queue.put(result)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[TranscriptResult]:
+        """Waits up to ``timeout`` seconds for the next result; returns None on timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def drain(self) -> List[TranscriptResult]:
+        """Returns every result received so far without blocking."""
+        drained = []
+        while True:
+            try:
+                drained.append(self._queue.get_nowait())
+            except Empty:
+                return drained
+
+    def __iter__(self) -> Iterator[TranscriptResult]:
+        """Yields results until the engine stops and everything received has been consumed."""
+        while True:
+            result = self.get(timeout=WORKER_POLL_SECONDS)
+            if result is not None:
+                yield result
+            elif not self._engine.is_running:
+                return
+
+    def close(self) -> None:
+        self._engine._remove_subscription(self)
+
+
+def load_model_files(model_dir: str, shared_weights_dir: Optional[str] = None
+                     ) -> Tuple[Wav2Vec2Processor, Wav2Vec2ForCTC]:
+    """
+    Loads a processor and model from a local directory (or a Hugging Face model id).
+    Raises FileNotFoundError for an incomplete local model directory.
+    """
+    is_local = os.path.isdir(model_dir)
+    if is_local:
+        missing = [f for f in REQUIRED_MODEL_FILES if not os.path.exists(os.path.join(model_dir, f))]
+        if not any(os.path.exists(os.path.join(model_dir, f)) for f in MODEL_WEIGHT_FILES):
+            missing.append(" or ".join(MODEL_WEIGHT_FILES))
+        if missing:
+            raise FileNotFoundError(f"Missing model files in '{model_dir}': {', '.join(missing)}.")
+    elif os.path.isabs(model_dir) or model_dir.startswith("."):
+        raise FileNotFoundError(f"Model directory '{model_dir}' not found or is not a directory.")
+
+    logger.info(f"Loading Wav2Vec2 model and processor from '{model_dir}'...")
+    processor = Wav2Vec2Processor.from_pretrained(model_dir, local_files_only=is_local)
+    if hasattr(processor, 'feature_extractor'): # Ensure sampling rate consistency
+        processor.feature_extractor.sampling_rate = MODEL_SAMPLING_RATE
+    else: # Fallback for older transformers or different processor structure
+        processor.sampling_rate = MODEL_SAMPLING_RATE
+
+    if shared_weights_dir and is_local:
+        from shared_weights import load_shared_model
+        model = load_shared_model(model_dir, shared_weights_dir)
+        logger.info(f"Model weights memory-mapped from '{shared_weights_dir}'.")
+    else:
+        model = Wav2Vec2ForCTC.from_pretrained(model_dir, local_files_only=is_local)
+    model.eval()
+    return processor, model
+
+
+class DictationEngine:
+    """
+    Capture, segmentation and decoding for one front-end.
+
+    - Single-pass windows are decoded by a three-stage ``Pipeline`` (features, forward,
+      decode), so one window's features and decoding overlap the next one's forward
+      pass; ``pipeline_stats()`` reports per-stage utilization.
+    - ``cache``: ``transcribe`` reuses cached text and logits (see transcript_cache.py);
+      ``decode_options`` go to ``processor.decode`` and are part of the text's key.
+    - ``word_timestamps``: final results carry ``words`` timed in seconds of audio
+      captured since the engine was created (see timestamps.py).
+    - ``blocksize``/``latency`` are passed to ``sd.InputStream``.
+    - ``adaptive_limits``: an ``AdaptiveController`` retunes the window length and batch
+      size from the backlog and real-time factor (see adaptive_control.py). Batches only
+      hold windows that are already waiting, so they cost no latency when decoding keeps up.
+    - ``chunk_samples`` and ``attention_context_seconds``: long offline windows with
+      block-local attention (see local_attention.py).
+    - ``placement``: capture and inference threads on their own cores (see cpu_placement.py).
+    """
+
+    def __init__(self, model_dir: str = DEFAULT_MODEL_DIR,
+                 shared_weights_dir: Optional[str] = None,
+                 draft_exit_layer: Optional[int] = None,
+                 cache: Optional[TranscriptCache] = None,
+                 word_timestamps: bool = False,
+                 blocksize: int = 0,
+                 latency: Union[str, float, None] = None,
+                 adaptive_limits: Optional[ControlLimits] = None,
+                 adaptive_log_path: Optional[str] = DEFAULT_DECISION_LOG,
+                 attention_context_seconds: Optional[float] = None,
+                 placement: Optional[CpuPlacement] = None) -> None:
+        self.model_dir = model_dir
+        self.shared_weights_dir = shared_weights_dir
+        self.draft_exit_layer = draft_exit_layer
+        self.cache = cache
+        self.word_timestamps = word_timestamps
+        self.blocksize = blocksize  # 0 lets PortAudio choose
+        self.latency = latency      # "low", "high" or seconds; None keeps the sounddevice default
+        self.adaptive_limits = adaptive_limits
+        self.adaptive_log_path = adaptive_log_path
+        self.attention_context_seconds = attention_context_seconds  # Block-local attention span; None = full
+        self.placement = placement
+        self.chunk_samples = MODEL_PROCESS_CHUNK_SIZE_SAMPLES  # Window of transcribe(); raise for offline use
+        self.batch_size = 1  # Windows per forward pass in the pipeline; retuned by the adaptive controller
+        self.decode_options: dict = {}
+        self._model_key: Optional[str] = None
+        self.processor: Optional[Wav2Vec2Processor] = None
+        self.model: Optional[Wav2Vec2ForCTC] = None
+        self.two_pass_decoder: Optional[TwoPassDecoder] = None
+
+        self._audio_queue: Queue = Queue()
+        self._audio_stream = None
+        self._worker: Optional[threading.Thread] = None
+        self._running = False
+        self._listeners: List[Callable[[TranscriptResult], None]] = []
+        self._status_listeners: List[Callable[[str], None]] = []
+        self._subscriptions: List[ResultSubscription] = []
+        self._listeners_lock = threading.Lock()
+        self._utterance_id = 0
+        self._timeline_samples = 0  # Audio decoded in earlier sessions, for word timestamps
+        self._capture_times: deque = deque()  # (segmenter sample index, capture time) per recent block
+        self._pending_model: Optional[tuple] = None  # (processor, model, model_dir) to switch to
+        self._batch: List[Tuple[_WindowInfo, np.ndarray]] = []
+        self._decode_busy_seconds = 0.0    # Decoding time outside the pipeline (two-pass mode)
+        self._pipeline: Optional[Pipeline] = None
+        self._last_pipeline_stats: dict = {}
+        self._capture_callbacks = 0
+        self._input_overflows = 0
+        self._input_underflows = 0
+        self._session_started = self._session_ended = 0.0
+        self._session = 0  # Generation of the current session; results of older ones are dropped
+        self._session_lock = threading.Lock()  # Guards the generation only; never held while delivering
+        self._cancel_token: Optional[CancellationToken] = None
+        self._late_results = 0
+        self.stop_latency = LatencyStats("Stop latency")
+
+    # --- Model ---
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.processor is not None and self.model is not None
+
+    def load_model(self, model_dir: Optional[str] = None) -> None:
+        """
+        Loads the processor and model from a local directory (or a Hugging Face model id).
+        Raises FileNotFoundError for an incomplete local model directory.
+        """
+        model_dir = model_dir or self.model_dir
+        processor, model = load_model_files(model_dir, self.shared_weights_dir)
+        self.attach_model(processor, model, model_dir)
+        logger.info("Model and processor loaded successfully.")
+
+    def attach_model(self, processor: Wav2Vec2Processor, model: Wav2Vec2ForCTC, model_dir: str) -> None:
+        """Uses an already loaded processor and model, e.g. one shared by several engines."""
+        self.processor, self.model, self.model_dir = processor, model, model_dir
+        self._model_key = None
+        if self.attention_context_seconds is not None:
+            enable_local_attention(model, context_seconds=self.attention_context_seconds)
+            logger.info(f"Block-local attention with {self.attention_context_seconds}s of context.")
+        self.two_pass_decoder = None
+        if self.draft_exit_layer is not None:
+            self.two_pass_decoder = TwoPassDecoder(processor, model, self.draft_exit_layer, self.transcribe)
+            logger.info(f"Two-pass decoding enabled with drafts from layer {self.draft_exit_layer}.")
+
+    def switch_model(self, processor: Wav2Vec2Processor, model: Wav2Vec2ForCTC, model_dir: str) -> None:
+        """
+        Makes another loaded model the active one. While dictating, the switch happens
+        on the worker between utterances, without stopping capture; otherwise at once.
+        """
+        if self.draft_exit_layer is not None and self.draft_exit_layer > model.config.num_hidden_layers:
+            raise ValueError(f"Model '{model_dir}' has {model.config.num_hidden_layers} layers, fewer than "
+                             f"the draft exit layer {self.draft_exit_layer}.")
+        with self._listeners_lock:
+            if self._running:
+                self._pending_model = (processor, model, model_dir)
+                return
+        self.attach_model(processor, model, model_dir)
+        self._emit_status(f"Model: {os.path.basename(os.path.normpath(model_dir))}")
+
+    def _apply_pending_model(self) -> None:
+        with self._listeners_lock:
+            pending, self._pending_model = self._pending_model, None
+        if pending is None:
+            return
+        if self._pipeline:
+            self._flush_batch()  # Windows queued under the old model are decoded by it too
+            self._pipeline.join()  # Windows already in flight finish on the model they started with
+        self.attach_model(*pending)
+        logger.info(f"Switched to model '{pending[2]}'.")
+        self._emit_status(f"Model: {os.path.basename(os.path.normpath(pending[2]))}")
+
+    def transcribe(self, audio_chunk: np.ndarray, cancel_token: Optional[CancellationToken] = None) -> str:
+        """
+        Transcribes a given audio chunk using the loaded Wav2Vec2 model.
+        The audio_chunk is expected to be a numpy array of raw audio samples.
+        If ``cancel_token`` is cancelled, raises TranscriptionCancelled at the next segment boundary.
+        """
+        return self._transcribe(audio_chunk, cancel_token)[0]
+
+    def transcribe_words(self, audio_chunk: np.ndarray, start_seconds: float = 0.0,
+                         cancel_token: Optional[CancellationToken] = None) -> Tuple[str, List[Word]]:
+        """Like ``transcribe``, also returning word timestamps offset by the chunk's ``start_seconds``."""
+        return self._transcribe(audio_chunk, cancel_token, start_seconds)
+
+    def _transcribe(self, audio_chunk: np.ndarray, cancel_token: Optional[CancellationToken],
+                    start_seconds: Optional[float] = None) -> Tuple[str, List[Word]]:
+        if not self.is_loaded:
+            logger.error("Transcription called but model or processor not loaded.")
+            return "", []
+
+        try:
+            audio_chunk = np.squeeze(audio_chunk)
+            if len(audio_chunk.shape) > 1:
+                audio_chunk = audio_chunk.mean(axis=1)
+
+            full_text_parts = []
+            words: List[Word] = []
+            for i in range(0, len(audio_chunk), self.chunk_samples):
+                if cancel_token: cancel_token.raise_if_cancelled()
+                chunk_segment = audio_chunk[i:i + self.chunk_samples]
+                if len(chunk_segment) < MIN_AUDIO_CHUNK_SAMPLES_FOR_TRANSCRIPTION:
+                    logger.debug("Skipping very short audio chunk segment: %d samples", len(chunk_segment))
+                    continue
+
+                if start_seconds is None:
+                    text_segment = self._transcribe_segment(chunk_segment)
+                else:
+                    text_segment, segment_words = self._decode_words(
+                        self._segment_logits(chunk_segment), start_seconds + i / MODEL_SAMPLING_RATE)
+                    words.extend(segment_words)
+                if text_segment:
+                    full_text_parts.append(text_segment)
+
+            return " ".join(full_text_parts), words
+
+        except TranscriptionCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error during transcription: {str(e)}", exc_info=True)
+            return "", []
+
+    def _features(self, audio: np.ndarray) -> torch.Tensor:
+        return self.processor(audio, return_tensors="pt", sampling_rate=MODEL_SAMPLING_RATE).input_values
+
+    def _forward(self, input_values: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(input_values).logits
+
+    def _decode_logits(self, logits: torch.Tensor) -> str:
+        return self.processor.decode(torch.argmax(logits, dim=-1)[0], **self.decode_options).strip()
+
+    def _decode_words(self, logits: torch.Tensor, start_seconds: float) -> Tuple[str, List[Word]]:
+        return words_from_ids(self.processor, torch.argmax(logits, dim=-1)[0], start_seconds,
+                              frame_seconds(self.model, MODEL_SAMPLING_RATE), **self.decode_options)
+
+    def _cache_key(self, segment: np.ndarray) -> str:
+        if self._model_key is None:
+            self._model_key = self.cache.model_key(self.model_dir, self.model)
+            if self.attention_context_seconds is not None:
+                self._model_key += f":local{self.attention_context_seconds}"
+        return self.cache.key(segment, self._model_key, MODEL_SAMPLING_RATE)
+
+    def _segment_logits(self, segment: np.ndarray, key: Optional[str] = None) -> torch.Tensor:
+        """Logits for one segment, read from or added to the cache when there is one."""
+        if self.cache is None:
+            return self._forward(self._features(segment))
+        key = key or self._cache_key(segment)
+        cached_logits = self.cache.get_logits(key)
+        if cached_logits is not None:
+            return torch.from_numpy(cached_logits)
+        logits = self._forward(self._features(segment))
+        self.cache.put_logits(key, logits.numpy())
+        return logits
+
+    def _transcribe_segment(self, segment: np.ndarray) -> str:
+        if self.cache is None:
+            return self._decode_logits(self._segment_logits(segment))
+        key = self._cache_key(segment)
+        decoder_key = json.dumps(self.decode_options, sort_keys=True)
+        text = self.cache.get_text(key, decoder_key)
+        if text is None:
+            text = self._decode_logits(self._segment_logits(segment, key))
+            self.cache.put_text(key, decoder_key, text)
+        return text
+
+    # --- Results ---
+
+    def add_listener(self, callback: Callable[[TranscriptResult], None]) -> None:
+        """
+        Registers ``callback(result)``. It runs on one of the engine's threads, never under
+        a lock that ``stop`` takes, so a GUI thread can stop the engine while a listener
+        marshals to it. A result being delivered as ``stop`` runs can therefore arrive just
+        after it; drop results whose ``session`` differs from ``engine.session``.
+        """
+        with self._listeners_lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[TranscriptResult], None]) -> None:
+        with self._listeners_lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def add_status_listener(self, callback: Callable[[str], None]) -> None:
+        """Registers ``callback(status_text)`` for "Listening...", "Processing..." etc."""
+        with self._listeners_lock:
+            self._status_listeners.append(callback)
+
+    def results(self) -> ResultSubscription:
+        """Subscribes to results from now on; see ``ResultSubscription``."""
+        subscription = ResultSubscription(self)
+        with self._listeners_lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def _remove_subscription(self, subscription: ResultSubscription) -> None:
+        with self._listeners_lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    @property
+    def session(self) -> int:
+        """Generation of the running (or next) session; results of other sessions are stale."""
+        return self._session
+
+    def _emit(self, result: TranscriptResult, session: int) -> None:
+        with self._session_lock:
+            if session != self._session:
+                self._late_results += 1
+                return
+        result.session = session
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription._put(result)
+        for listener in listeners:
+            if session != self._session:
+                self._late_results += 1  # Stopped during delivery
+                return
+            try:
+                listener(result)
+            except Exception as e:
+                logger.error(f"Error in transcript listener: {e}", exc_info=True)
+
+    def _emit_status(self, text: str, session: Optional[int] = None) -> None:
+        """Statuses from a worker pass its ``session`` and are dropped once that session has stopped."""
+        with self._session_lock:
+            if session is not None and session != self._session:
+                return
+        with self._listeners_lock:
+            listeners = list(self._status_listeners)
+        for listener in listeners:
+            if session is not None and session != self._session:
+                return
+            listener(text)
+
+    # --- Capture ---
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def _audio_callback(self, indata: np.ndarray, frames: int, time_info, status) -> None:
+        """
+        This callback is invoked by sounddevice from a separate thread for each block of incoming audio data.
+        It runs on PortAudio's real-time thread, so it only counts overflows; the worker logs them.
+        Each block is tagged with its ADC capture time, converted to ``time.perf_counter`` seconds.
+        """
+        self._capture_callbacks += 1
+        if status:  # Counted only; no logging or formatting on the real-time thread
+            if status.input_overflow: self._input_overflows += 1
+            if status.input_underflow: self._input_underflows += 1
+        now = time.perf_counter()
+        captured_at = now - frames / MODEL_SAMPLING_RATE
+        adc_time = getattr(time_info, "inputBufferAdcTime", 0.0)
+        if adc_time:  # Some host APIs report 0; then assume the block ended just now
+            captured_at = now - (time_info.currentTime - adc_time)
+        self._audio_queue.put((indata.copy(), captured_at))
+
+    def feed(self, block: np.ndarray, captured_at: Optional[float] = None) -> None:
+        """
+        Pushes audio captured elsewhere (mono float32 at MODEL_SAMPLING_RATE).
+        ``captured_at`` is the perf_counter time of its first sample (default: now minus its duration).
+        """
+        if captured_at is None:
+            captured_at = time.perf_counter() - len(block) / MODEL_SAMPLING_RATE
+        self._audio_queue.put((block, captured_at))
+
+    def start(self, capture: bool = True) -> None:
+        """
+        Starts the worker and, if ``capture`` is True, the microphone stream. Raises if
+        the model is not loaded, the audio stream cannot be opened, or a cancelled
+        session's worker is still busy after ``RESTART_WAIT_SECONDS``.
+        """
+        if self._running:
+            return
+        if not self.is_loaded:
+            raise RuntimeError("Load a model before starting dictation.")
+        if self._worker and self._worker.is_alive():
+            # A cancelled session's worker finishing its last forward pass; it shares the queue and pipeline
+            logger.info("Waiting for the previous session's worker to finish...")
+            self._worker.join(timeout=RESTART_WAIT_SECONDS)
+            if self._worker.is_alive():
+                raise RuntimeError("The previous dictation session is still finishing; try again shortly.")
+        while not self._audio_queue.empty():
+            try: self._audio_queue.get_nowait()
+            except Empty: break
+        if self.placement:
+            self.placement.size_torch_pools()
+        self._capture_callbacks = self._input_overflows = self._input_underflows = 0
+        self._session_started = time.perf_counter()
+
+        if capture:
+            if sd is None:
+                raise RuntimeError("Audio capture needs the sounddevice package and PortAudio.")
+            stream_options = {"blocksize": self.blocksize}
+            if self.latency is not None:
+                stream_options["latency"] = self.latency
+            self._audio_stream = sd.InputStream(samplerate=MODEL_SAMPLING_RATE, channels=AUDIO_CHANNELS,
+                                                callback=self._audio_callback, dtype='float32',
+                                                **stream_options)
+            if self.placement:
+                # PortAudio's callback thread inherits the capture cores; it never pins or logs itself
+                with self.placement.inherited_by_new_threads("capture"):
+                    self._audio_stream.start()
+            else:
+                self._audio_stream.start()
+            logger.info(f"Audio stream started (blocksize {self.blocksize or 'auto'}, "
+                        f"input latency {self._audio_stream.latency * 1000:.0f}ms).")
+
+        with self._session_lock:
+            self._session += 1
+            session = self._session
+        self._cancel_token = CancellationToken()
+        self._late_results = 0
+        self._running = True
+        self._worker = threading.Thread(target=self._worker_loop, args=(session, self._cancel_token),
+                                        name="DictationEngine", daemon=True)
+        self._worker.start()
+        self._emit_status("Listening...")
+
+    def stop(self, timeout: float = 1.5) -> None:
+        """
+        Stops capture and decodes what was already captured, returning within ``timeout``
+        seconds. What is not decoded by then is cancelled and its results are dropped.
+
+        Cancelling makes pipeline stages skip their remaining windows and ``transcribe``
+        stop at the next segment. A forward pass already running finishes on the worker,
+        but its results belong to a stopped session and are dropped. Each stop's duration
+        is recorded in ``stop_latency``.
+        """
+        if not self._running:
+            return
+        started = time.perf_counter()
+        self._running = False
+        self._stop_audio_stream()
+        self._session_ended = time.perf_counter()
+        cancelled = False
+        if self._worker and self._worker.is_alive():
+            logger.info("Waiting for dictation thread...")
+            self._worker.join(timeout=max(0.0, timeout - (time.perf_counter() - started)))
+            cancelled = self._worker.is_alive()
+        with self._session_lock:
+            self._session += 1  # From here on, nothing from the stopped session is delivered
+        if cancelled:
+            self._cancel_token.cancel()
+            logger.warning(f"Dictation thread still busy after {timeout}s; the rest of the session is cancelled.")
+        else:
+            self._worker = None
+        stop_ms = (time.perf_counter() - started) * 1000
+        self.stop_latency.record(stop_ms)
+        logger.info(f"Stopped in {stop_ms:.0f} ms{' (cancelled)' if cancelled else ''}.")
+        stats = self.capture_stats()
+        if stats["callbacks"]:
+            logger.info(f"Capture: {stats['input_overflows']} input overflows in {stats['callbacks']} callbacks "
+                        f"over {stats['seconds']:.0f}s (CPU placement: "
+                        f"{self.placement.describe() if self.placement else 'none'}).")
+        logger.info("Dictation process stopped.")
+        self._emit_status("Ready")
+
+    def capture_stats(self) -> dict:
+        """Capture callbacks and PortAudio input overflows of the running (or last) session."""
+        ended = time.perf_counter() if self._running else self._session_ended
+        return {"callbacks": self._capture_callbacks, "input_overflows": self._input_overflows,
+                "input_underflows": self._input_underflows, "seconds": max(0.0, ended - self._session_started)}
+
+    def _stop_audio_stream(self) -> None:
+        if self._audio_stream is None:
+            return
+        try:
+            logger.info("Attempting to stop audio stream...")
+            self._audio_stream.stop(); self._audio_stream.close()
+            logger.info("Audio stream stopped/closed.")
+        except Exception as e:
+            logger.error(f"Error stopping audio stream: {e}", exc_info=True)
+        finally:
+            self._audio_stream = None
+
+    # --- Decoding ---
+
+    def pipeline_stats(self) -> dict:
+        """Per-stage utilization of the running (or last) session's pipeline; see pipeline.py."""
+        return self._pipeline.stats() if self._pipeline else self._last_pipeline_stats
+
+    def queue_depth(self) -> int:
+        """Audio blocks waiting for the worker plus batches waiting in the pipeline's queues."""
+        pipeline = self._pipeline
+        queued = sum(stage["queue_depth"] for stage in pipeline.stats().values()) if pipeline else 0
+        return self._audio_queue.qsize() + queued
+
+    def _new_pipeline(self, session: int, token: CancellationToken) -> Pipeline:
+        def stage(name: str, func: Callable) -> Stage:
+            # Items are (infos, payload): a batch of equal-length windows and their _WindowInfos.
+            # Once cancelled, a stage returns None, which the later stages pass through untouched.
+            return Stage(name, lambda item: None if token.cancelled else (item[0], func(item[1], item[0])),
+                         workers=PIPELINE_STAGE_WORKERS[name], queue_size=PIPELINE_QUEUE_SIZE)
+
+        def features(audios: List[np.ndarray], _) -> torch.Tensor:
+            return self.processor(audios, return_tensors="pt", sampling_rate=MODEL_SAMPLING_RATE).input_values
+
+        def decode(logits: torch.Tensor, infos: List[_WindowInfo]) -> list:
+            if self.word_timestamps:
+                return [self._decode_words(logits[i:i + 1], info.start_seconds) for i, info in enumerate(infos)]
+            return [(self._decode_logits(logits[i:i + 1]), None) for i in range(len(infos))]
+
+        def on_result(seq: int, item) -> None:
+            if item is None:
+                return
+            decoded_at = time.perf_counter()
+            for info, (text, words) in zip(*item):
+                if text:
+                    self._emit(TranscriptResult(text, utterance_id=info.utterance_id, words=words,
+                                                captured_at=info.captured_at, decoded_at=decoded_at), session)
+
+        return Pipeline([stage("features", features),
+                         stage("forward", lambda input_values, _: self._forward(input_values)),
+                         stage("decode", decode)], on_result)
+
+    def _queue_window(self, info: _WindowInfo, audio: np.ndarray) -> None:
+        """Adds a window to the current batch; a batch only holds windows of one length."""
+        if self._batch and len(audio) != len(self._batch[0][1]):
+            self._flush_batch()
+        self._batch.append((info, audio))
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+
+    def _flush_batch(self) -> None:
+        if not self._batch:
+            return
+        infos, audios = zip(*self._batch)
+        self._batch = []
+        self._pipeline.submit((list(infos), list(audios)), weight=sum(info.samples for info in infos))
+
+    def _new_segmenter(self):
+        if self.two_pass_decoder:
+            return UtteranceSegmenter(MODEL_SAMPLING_RATE, draft_step_samples=MODEL_PROCESS_CHUNK_SIZE_SAMPLES)
+        return FixedWindowSegmenter(MODEL_PROCESS_CHUNK_SIZE_SAMPLES,
+                                    min_samples=MIN_AUDIO_CHUNK_SAMPLES_FOR_TRANSCRIPTION)
+
+    def _decode_events(self, events: list, session: int, token: CancellationToken) -> None:
+        for kind, audio, start_sample in events:
+            token.raise_if_cancelled()
+            captured_at = self._capture_time(start_sample + len(audio))
+            if kind == "draft":
+                text = self.two_pass_decoder.draft(audio)
+                if text:
+                    self._emit(TranscriptResult(text, is_final=False, utterance_id=self._utterance_id,
+                                                captured_at=captured_at, decoded_at=time.perf_counter()), session)
+                continue
+            start_seconds = (self._timeline_samples + start_sample) / MODEL_SAMPLING_RATE
+            words: Optional[List[Word]] = [] if self.word_timestamps else None
+
+            def transcribe_final(utterance_audio: np.ndarray) -> str:
+                if words is None:
+                    return self.transcribe(utterance_audio, token)
+                text, found = self.transcribe_words(utterance_audio, start_seconds, token)
+                words.extend(found)
+                return text
+
+            if self.two_pass_decoder:
+                # Always emit a two-pass final, even when empty, so clients drop the drafts
+                text = self.two_pass_decoder.final(audio, transcribe_final)
+                self._emit(TranscriptResult(text, utterance_id=self._utterance_id, words=words,
+                                            captured_at=captured_at, decoded_at=time.perf_counter()), session)
+            elif self._pipeline:
+                self._queue_window(_WindowInfo(self._utterance_id, start_seconds, captured_at, len(audio)), audio)
+            else:
+                text = transcribe_final(audio)
+                if text:
+                    self._emit(TranscriptResult(text, utterance_id=self._utterance_id, words=words,
+                                                captured_at=captured_at, decoded_at=time.perf_counter()), session)
+            self._utterance_id += 1
+
+    def _push_block(self, segmenter, entry: tuple) -> list:
+        block, captured_at = entry
+        self._capture_times.append((segmenter.position, captured_at))
+        oldest_needed = segmenter.position - CAPTURE_TIME_HISTORY_SECONDS * MODEL_SAMPLING_RATE
+        while len(self._capture_times) > 1 and self._capture_times[1][0] <= oldest_needed:
+            self._capture_times.popleft()
+        return segmenter.push(block)
+
+    def _capture_time(self, end_sample: int) -> Optional[float]:
+        """Capture time of the end of sample ``end_sample - 1`` (segmenter sample index)."""
+        for block_start, captured_at in reversed(self._capture_times):
+            if block_start < end_sample:
+                return captured_at + (end_sample - block_start) / MODEL_SAMPLING_RATE
+        return None
+
+    def _new_controller(self, segmenter) -> AdaptiveController:
+        limits = self.adaptive_limits
+        if self.two_pass_decoder:
+            limits = replace(limits, max_batch=1)  # Drafts and finals are decoded one at a time
+        window = segmenter.draft_step_samples if self.two_pass_decoder else segmenter.window_samples
+        return AdaptiveController(limits, window / MODEL_SAMPLING_RATE, self.batch_size, self.adaptive_log_path)
+
+    def _busy_seconds(self) -> float:
+        """Decoding time so far; for the pipeline, that of its busiest stage."""
+        if self._pipeline:
+            return max(stage["busy_seconds"] for stage in self._pipeline.stats().values())
+        return self._decode_busy_seconds
+
+    def _backlog_seconds(self, last_block_samples: int) -> float:
+        queued = self._audio_queue.qsize() * last_block_samples
+        batched = sum(info.samples for info, _ in self._batch)
+        in_flight = self._pipeline.pending_weight() if self._pipeline else 0
+        return (queued + batched + in_flight) / MODEL_SAMPLING_RATE
+
+    def _adapt(self, controller: AdaptiveController, segmenter, busy_seconds: float,
+               audio_seconds: float, last_block_samples: int) -> None:
+        rtf = busy_seconds / audio_seconds if audio_seconds > 0 else 0.0
+        decision = controller.update(self._backlog_seconds(last_block_samples), rtf)
+        window_samples = int(decision.window_seconds * MODEL_SAMPLING_RATE)
+        if self.two_pass_decoder:
+            segmenter.draft_step_samples = window_samples
+        else:
+            segmenter.window_samples = window_samples
+        self.batch_size = decision.batch_size
+
+    def _worker_loop(self, session: int, token: CancellationToken) -> None:
+        if self.placement:
+            self.placement.pin("inference")  # Before the pipeline's threads, which inherit it
+        segmenter = self._new_segmenter()
+        self._capture_times.clear()
+        if not self.two_pass_decoder:
+            self._pipeline = self._new_pipeline(session, token)
+        controller = self._new_controller(segmenter) if self.adaptive_limits else None
+        control_at = time.perf_counter() + CONTROL_INTERVAL_SECONDS
+        control_busy, control_position, last_block_samples = self._busy_seconds(), 0, 0
+        is_processing = False
+        reported_flags = (0, 0)
+        logger.info("Dictation thread started.")
+        while self._running:
+            flags = (self._input_overflows, self._input_underflows)
+            if flags != reported_flags:
+                logger.warning("Audio input: %d overflows, %d underflows this session.", *flags)
+                reported_flags = flags
+            if self._pending_model is not None and segmenter.between_utterances:
+                self._apply_pending_model()
+            if controller and time.perf_counter() >= control_at:
+                busy = self._busy_seconds()
+                self._adapt(controller, segmenter, busy - control_busy,
+                            (segmenter.position - control_position) / MODEL_SAMPLING_RATE, last_block_samples)
+                control_at = time.perf_counter() + CONTROL_INTERVAL_SECONDS
+                control_busy, control_position = busy, segmenter.position
+            try:
+                entry = self._audio_queue.get(timeout=WORKER_POLL_SECONDS)
+                last_block_samples = len(entry[0])
+                events = self._push_block(segmenter, entry)
+                if events:
+                    if not is_processing:
+                        self._emit_status("Processing...", session)
+                        is_processing = True
+                    started = time.perf_counter()
+                    self._decode_events(events, session, token)
+                    self._decode_busy_seconds += time.perf_counter() - started
+                if self._batch and self._audio_queue.empty():
+                    self._flush_batch()  # Nothing else is waiting, so do not hold the batch back
+                if self._running and is_processing and self._audio_queue.empty():
+                    self._emit_status("Listening...", session)
+                    is_processing = False
+            except Empty:
+                continue
+            except TranscriptionCancelled:
+                break
+            except Exception as e:
+                logger.error(f"Error in dictation thread: {str(e)}", exc_info=True)
+                self._emit_status("Error. Check logs.", session)
+                is_processing = False
+        try:
+            # Decode audio captured before Stop so no words (or drafts) are left behind
+            while True:
+                try: events = self._push_block(segmenter, self._audio_queue.get_nowait())
+                except Empty: break
+                self._decode_events(events, session, token)
+            self._decode_events(segmenter.flush(), session, token)
+            if self._batch:
+                self._flush_batch()
+        except TranscriptionCancelled:
+            self._batch = []
+        except Exception as e:
+            logger.error(f"Error finishing dictation: {str(e)}", exc_info=True)
+        self._timeline_samples += segmenter.position
+        if self._pipeline:
+            self._pipeline.join()
+            self._pipeline.close()
+            self._last_pipeline_stats = self._pipeline.stats()
+            self._pipeline = None
+            logger.info(f"Pipeline utilization: {format_stats(self._last_pipeline_stats)}")
+        self._apply_pending_model()  # A switch requested while stopping
+        if self.two_pass_decoder:
+            logger.info(f"Two-pass decoding: {format_report(self.two_pass_decoder.report())}")
+        if self._late_results:
+            logger.info(f"Dropped {self._late_results} results decoded after Stop.")
+        logger.info("Dictation thread finished.")
@@ -0,0 +1,188 @@
+"""
+Large-document helpers for the Tk dictation editor.
+
+Operations that span the whole ``Text`` widget ("1.0" to END) get slower as the
+document grows, and over hours of dictation they make typing and transcript
+insertion lag. ``DocumentEditor`` limits each update to the text that changed:
+
+- Text direction is a single ``direction_align`` tag. Toggling RTL/LTR reconfigures
+  that tag instead of removing and re-adding tags over the whole document.
+- Only new and changed paragraphs get the tag: inserted text is tagged as it is
+  inserted, and typing re-tags the paragraph under the cursor.
+- Cursor label updates are throttled to one per ``CURSOR_UPDATE_INTERVAL_MS``.
+- Transcript fragments are queued from any thread and inserted in a single
+  ``insert`` call every ``INSERT_BATCH_INTERVAL_MS``.
+
+Draft text from two-pass decoding is shown greyed out and replaced in place when
+the final text for the utterance arrives. Each utterance's drafts carry their own
+tag, so the final replaces only that utterance's draft text, never text typed
+between or around it. Later drafts of an utterance follow its earlier ones.
+
+Queued text can carry the ``perf_counter`` capture time of its audio. After the
+text is inserted, ``on_displayed(captured_at)`` is called so the caller can record
+the mic-to-screen latency.
+"""
+import threading
+import tkinter as tk
+from typing import Callable, List, Optional, Tuple
+
+CURSOR_UPDATE_INTERVAL_MS = 100  # At most ~10 cursor label refreshes per second
+INSERT_BATCH_INTERVAL_MS = 50    # Fragments arriving within this window share one insert
+DIRECTION_TAG = "direction_align"
+DRAFT_TAG = "draft_text"          # Colour of all drafts; each utterance also has its own tag
+DRAFT_COLOR = "#8a8a8a"
+JUSTIFY_FOR_DIRECTION = {"RTL": tk.RIGHT, "LTR": tk.LEFT}
+
+
+class DocumentEditor:
+    """
+    Wraps the editor ``Text`` widget, throttling cursor updates and batching inserts.
+    ``queue_insert``, ``queue_draft`` and ``queue_final`` are safe to call from any thread;
+    every other method must be called on the Tk main thread.
+    """
+
+    def __init__(self, root: tk.Misc, text_area: tk.Text,
+                 on_cursor_moved: Optional[Callable[[int, int], None]] = None,
+                 direction: str = "RTL",
+                 on_displayed: Optional[Callable[[float], None]] = None) -> None:
+        self.root = root
+        self.text_area = text_area
+        self.on_cursor_moved = on_cursor_moved
+        self.on_displayed = on_displayed
+        self.direction = direction
+
+        self._pending_ops: List[Tuple[str, str, Optional[float], Optional[int]]] = []
+        self._pending_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._cursor_update_job: Optional[str] = None
+
+        self.text_area.tag_configure(DIRECTION_TAG, justify=JUSTIFY_FOR_DIRECTION[direction])
+        self.text_area.tag_add(DIRECTION_TAG, "1.0", tk.END)
+        self.text_area.tag_configure(DRAFT_TAG, foreground=DRAFT_COLOR)
+        self.text_area.bind('<KeyRelease>', self._on_edit_event, add="+")
+        self.text_area.bind('<ButtonRelease>', self._on_cursor_event, add="+")
+
+    # --- Direction ---
+
+    def set_direction(self, direction: str) -> None:
+        """Changes the justification of every paragraph by reconfiguring the shared tag."""
+        self.direction = direction
+        self.text_area.tag_configure(DIRECTION_TAG, justify=JUSTIFY_FOR_DIRECTION[direction])
+
+    def tag_paragraphs(self, start: str, end: str) -> None:
+        """Applies the direction tag to the paragraphs spanned by ``start``..``end``."""
+        self.text_area.tag_add(DIRECTION_TAG, f"{start} linestart", f"{end} lineend +1c")
+
+    # --- Cursor ---
+
+    def schedule_cursor_update(self) -> None:
+        """Coalesces cursor label refreshes so bursts of events cost one update."""
+        if self._cursor_update_job is None:
+            self._cursor_update_job = self.root.after(CURSOR_UPDATE_INTERVAL_MS, self._update_cursor_now)
+
+    def _update_cursor_now(self) -> None:
+        self._cursor_update_job = None
+        if not self.text_area.winfo_exists():
+            return
+        row, col = self.text_area.index(tk.INSERT).split('.')
+        if self.on_cursor_moved:
+            self.on_cursor_moved(int(row), int(col))
+
+    def _on_cursor_event(self, event=None) -> None:
+        self.schedule_cursor_update()
+
+    def _on_edit_event(self, event=None) -> None:
+        # Typing only touches the paragraph under the cursor (Return also creates the next one).
+        self.tag_paragraphs(f"{tk.INSERT} -1l", tk.INSERT)
+        self.schedule_cursor_update()
+
+    # --- Inserts ---
+
+    def queue_insert(self, text: str, captured_at: Optional[float] = None) -> None:
+        """
+        Queues ``text`` for insertion at the cursor. Safe to call from worker threads;
+        fragments queued before the next flush are inserted with one ``insert`` call.
+        """
+        self._queue_op("text", text, captured_at)
+
+    def queue_draft(self, text: str, utterance_id: int, captured_at: Optional[float] = None) -> None:
+        """Queues interim text of an utterance, which its ``queue_final`` will replace."""
+        self._queue_op("draft", text, captured_at, utterance_id)
+
+    def queue_final(self, text: str, utterance_id: int, captured_at: Optional[float] = None) -> None:
+        """Queues the final text of an utterance, replacing its drafts."""
+        self._queue_op("final", text, captured_at, utterance_id)
+
+    def _queue_op(self, kind: str, text: str, captured_at: Optional[float],
+                  utterance_id: Optional[int] = None) -> None:
+        with self._pending_lock:
+            self._pending_ops.append((kind, text, captured_at, utterance_id))
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.root.after(INSERT_BATCH_INTERVAL_MS, self.flush)
+
+    def flush(self) -> None:
+        """Applies every queued insert now. Runs on the Tk thread."""
+        with self._pending_lock:
+            ops, self._pending_ops = self._pending_ops, []
+            self._flush_scheduled = False
+        if not ops or not self.text_area.winfo_exists():
+            return
+        fragments: List[str] = []
+        for kind, text, _, utterance_id in ops:
+            if kind == "text":
+                fragments.append(text)
+                continue
+            self._insert_fragments(fragments)
+            fragments = []
+            if kind == "draft":
+                self._insert_draft(text, utterance_id)
+            else:
+                self._replace_drafts(text, utterance_id)
+        self._insert_fragments(fragments)
+        self.schedule_cursor_update()
+        if self.on_displayed:
+            for _, _, captured_at, _ in ops:
+                if captured_at is not None:
+                    self.on_displayed(captured_at)
+
+    def _insert_fragments(self, fragments: List[str]) -> None:
+        # Tagging on insert covers every new paragraph in the batch; the paragraph
+        # the cursor was already in keeps the tag it had.
+        if fragments:
+            self.text_area.insert(tk.INSERT, "".join(fragments), (DIRECTION_TAG,))
+
+    def _insert_draft(self, text: str, utterance_id: int) -> None:
+        tag = _draft_tag(utterance_id)
+        ranges = self.text_area.tag_ranges(tag)
+        self.text_area.insert(ranges[-1] if ranges else tk.INSERT, text, (DIRECTION_TAG, DRAFT_TAG, tag))
+
+    def _replace_drafts(self, text: str, utterance_id: int) -> None:
+        tag = _draft_tag(utterance_id)
+        ranges = self.text_area.tag_ranges(tag)
+        if not ranges:
+            self._insert_fragments([text])
+            return
+        start = self.text_area.index(ranges[0])
+        # Last range first, so deleting one does not shift the indices of the others
+        for i in range(len(ranges) - 2, -1, -2):
+            self.text_area.delete(ranges[i], ranges[i + 1])
+        self.text_area.tag_delete(tag)
+        if text:
+            self.text_area.insert(start, text, (DIRECTION_TAG,))
+
+    def clear(self) -> None:
+        """Empties the document and drops any fragments still waiting to be inserted."""
+        with self._pending_lock:
+            self._pending_ops.clear()
+        self.text_area.delete("1.0", tk.END)
+        for tag in self.text_area.tag_names():
+            if tag.startswith(DRAFT_TAG + "_"):
+                self.text_area.tag_delete(tag)
+        self.text_area.tag_add(DIRECTION_TAG, "1.0", tk.END)
+        self.schedule_cursor_update()
+
+
+def _draft_tag(utterance_id: int) -> str:
+    return f"{DRAFT_TAG}_{utterance_id}"
@@ -0,0 +1,163 @@
+"""
+Two-pass draft/final decoding with early exit from the Wav2Vec2 encoder.
+
+The draft pass runs only the first ``exit_layer`` transformer layers and feeds that
+hidden state into the CTC head, applying the encoder's layer norm where the full model
+does: after the layers for stable-layer-norm models (``do_stable_layer_norm``), and
+before them otherwise, in which case the draft gets no final norm either. This gives
+quick interim text. When an utterance closes, the full model transcribes the whole
+utterance and its text replaces the drafts.
+
+The CTC head was trained on the last layer only, so drafts from shallow layers are
+rougher. ``TwoPassDecoder.report`` gives the draft and final latencies and the
+character agreement between drafts and final text, to help choose ``exit_layer``.
+
+Usage: python early_exit.py --exit-layer 8 recording.wav [more.wav ...]
+"""
+import argparse
+import difflib
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+from latency import percentile
+
+MODEL_SAMPLING_RATE = 16000
+
+
+def early_exit_logits(model, input_values: torch.Tensor, exit_layer: int) -> torch.Tensor:
+    """Runs Wav2Vec2ForCTC up to transformer layer ``exit_layer`` and returns CTC logits."""
+    num_layers = model.config.num_hidden_layers
+    if not 1 <= exit_layer <= num_layers:
+        raise ValueError(f"exit_layer must be between 1 and {num_layers}, got {exit_layer}.")
+
+    wav2vec2 = model.wav2vec2
+    encoder = wav2vec2.encoder
+    features = wav2vec2.feature_extractor(input_values).transpose(1, 2)
+    hidden_states, _ = wav2vec2.feature_projection(features)
+    hidden_states = hidden_states + encoder.pos_conv_embed(hidden_states)
+
+    stable_layer_norm = model.config.do_stable_layer_norm
+    if not stable_layer_norm:
+        hidden_states = encoder.layer_norm(hidden_states)
+    for layer in encoder.layers[:exit_layer]:
+        layer_output = layer(hidden_states)
+        hidden_states = layer_output[0] if isinstance(layer_output, tuple) else layer_output
+    if stable_layer_norm:
+        hidden_states = encoder.layer_norm(hidden_states)
+    return model.lm_head(hidden_states)
+
+
+def agreement(draft: str, final: str) -> float:
+    """Character-level similarity between the draft and final text (1.0 = identical)."""
+    if not draft and not final:
+        return 1.0
+    return difflib.SequenceMatcher(None, draft, final, autojunk=False).ratio()
+
+
+class TwoPassDecoder:
+    """
+    Produces shallow drafts for audio as it arrives and a full-depth final per utterance.
+    ``transcribe_final`` is the normal full-model transcription function.
+    """
+
+    def __init__(self, processor, model, exit_layer: int,
+                 transcribe_final: Callable[[np.ndarray], str]) -> None:
+        num_layers = model.config.num_hidden_layers
+        if not 1 <= exit_layer <= num_layers:
+            raise ValueError(f"exit_layer must be between 1 and {num_layers}, got {exit_layer}.")
+        self.processor = processor
+        self.model = model
+        self.exit_layer = exit_layer
+        self.transcribe_final = transcribe_final
+        self.draft_latencies_ms: List[float] = []
+        self.final_latencies_ms: List[float] = []
+        self.agreements: List[float] = []
+        self._utterance_drafts: List[str] = []
+
+    def draft(self, audio: np.ndarray) -> str:
+        """Shallow-pass transcription of newly arrived audio."""
+        start = time.perf_counter()
+        input_values = self.processor(audio, return_tensors="pt", sampling_rate=MODEL_SAMPLING_RATE).input_values
+        with torch.no_grad():
+            logits = early_exit_logits(self.model, input_values, self.exit_layer)
+        text = self.processor.decode(torch.argmax(logits, dim=-1)[0]).strip()
+        self.draft_latencies_ms.append((time.perf_counter() - start) * 1000)
+        if text:
+            self._utterance_drafts.append(text)
+        return text
+
+    def final(self, utterance_audio: np.ndarray,
+              transcribe: Optional[Callable[[np.ndarray], str]] = None) -> str:
+        """
+        Full-depth transcription of a closed utterance; records agreement with its drafts.
+        ``transcribe`` replaces ``transcribe_final`` for this call.
+        """
+        start = time.perf_counter()
+        text = (transcribe or self.transcribe_final)(utterance_audio)
+        self.final_latencies_ms.append((time.perf_counter() - start) * 1000)
+        self.agreements.append(agreement(" ".join(self._utterance_drafts), text))
+        self._utterance_drafts = []
+        return text
+
+    def report(self) -> Dict[str, float]:
+        report: Dict[str, float] = {"exit_layer": self.exit_layer, "utterances": len(self.agreements)}
+        if self.draft_latencies_ms:
+            report["draft_p50_ms"] = statistics.median(self.draft_latencies_ms)
+            report["draft_p90_ms"] = percentile(self.draft_latencies_ms, 90)
+        if self.final_latencies_ms:
+            report["final_p50_ms"] = statistics.median(self.final_latencies_ms)
+            report["final_p90_ms"] = percentile(self.final_latencies_ms, 90)
+        if self.agreements:
+            report["agreement_mean"] = statistics.mean(self.agreements)
+        return report
+
+
+def format_report(report: Dict[str, float]) -> str:
+    return ", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                     for key, value in report.items())
+
+
+def main() -> int:
+    import soundfile as sf
+    from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+
+    parser = argparse.ArgumentParser(description="Measure draft vs final decoding on recorded audio.")
+    parser.add_argument("audio", nargs="+", help="16 kHz mono recordings; each file is one utterance")
+    parser.add_argument("--exit-layer", type=int, required=True)
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--step-seconds", type=float, default=1.0, help="Audio per draft pass")
+    args = parser.parse_args()
+
+    processor = Wav2Vec2Processor.from_pretrained(args.model_dir, local_files_only=True)
+    model = Wav2Vec2ForCTC.from_pretrained(args.model_dir, local_files_only=True)
+    model.eval()
+
+    def transcribe_full(audio: np.ndarray) -> str:
+        input_values = processor(audio, return_tensors="pt", sampling_rate=MODEL_SAMPLING_RATE).input_values
+        with torch.no_grad():
+            logits = model(input_values).logits
+        return processor.decode(torch.argmax(logits, dim=-1)[0]).strip()
+
+    decoder = TwoPassDecoder(processor, model, args.exit_layer, transcribe_full)
+    step = int(args.step_seconds * MODEL_SAMPLING_RATE)
+    for path in args.audio:
+        audio, rate = sf.read(path, dtype="float32")
+        if rate != MODEL_SAMPLING_RATE:
+            print(f"{path}: expected {MODEL_SAMPLING_RATE} Hz audio, got {rate} Hz", file=sys.stderr)
+            return 1
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        for i in range(0, len(audio), step):
+            decoder.draft(audio[i:i + step])
+        print(f"{path}: {decoder.final(audio)}")
+    print(format_report(decoder.report()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
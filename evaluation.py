@@ -0,0 +1,75 @@
+"""
+Labeled evaluation sets and character/word error rates.
+
+A labeled set is either a directory of ``name.wav`` recordings, each with its
+reference transcript in ``name.txt``, or a TSV file of ``path<TAB>transcript`` lines
+(paths relative to the TSV). Recordings must be 16 kHz; stereo is averaged to mono.
+
+Error rates are edit distance over the reference length, summed over the set, after
+collapsing whitespace.
+"""
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+MODEL_SAMPLING_RATE = 16000
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def load_labeled_set(path: str, limit: int = 0) -> List[Tuple[str, np.ndarray, str]]:
+    """Returns ``(name, audio, reference)`` per recording, at most ``limit`` of them (0 = all)."""
+    import soundfile as sf
+
+    if os.path.isdir(path):
+        pairs = []
+        for name in sorted(os.listdir(path)):
+            stem, extension = os.path.splitext(name)
+            transcript = os.path.join(path, stem + ".txt")
+            if extension.lower() == ".wav" and os.path.exists(transcript):
+                with open(transcript, encoding="utf-8") as f:
+                    pairs.append((os.path.join(path, name), f.read()))
+    else:
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, encoding="utf-8") as f:
+            rows = [line.rstrip("\n").split("\t", 1) for line in f if line.strip()]
+        pairs = [(os.path.join(base, audio_path), text) for audio_path, text in rows]
+    if limit:
+        pairs = pairs[:limit]
+    if not pairs:
+        raise FileNotFoundError(f"No labeled recordings found in '{path}'.")
+
+    items = []
+    for audio_path, text in pairs:
+        audio, rate = sf.read(audio_path, dtype="float32")
+        if rate != MODEL_SAMPLING_RATE:
+            raise ValueError(f"{audio_path}: expected {MODEL_SAMPLING_RATE} Hz audio, got {rate} Hz.")
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        items.append((os.path.basename(audio_path), audio, normalize(text)))
+    return items
+
+
+def edit_distance(reference: Sequence, hypothesis: Sequence) -> int:
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_item in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_item in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_item != hyp_item)))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(references: Sequence[str], hypotheses: Sequence[str]) -> float:
+    pairs = [(normalize(r), normalize(h)) for r, h in zip(references, hypotheses)]
+    errors = sum(edit_distance(r, h) for r, h in pairs)
+    return errors / max(sum(len(r) for r, _ in pairs), 1)
+
+
+def word_error_rate(references: Sequence[str], hypotheses: Sequence[str]) -> float:
+    pairs = [(r.split(), h.split()) for r, h in zip(references, hypotheses)]
+    errors = sum(edit_distance(r, h) for r, h in pairs)
+    return errors / max(sum(len(r) for r, _ in pairs), 1)
@@ -0,0 +1,61 @@
+"""
+Latency distributions for the dictation pipeline.
+
+Audio blocks carry their capture time from the PortAudio callback
+(``time_info.inputBufferAdcTime``, converted to ``time.perf_counter``). Each
+``TranscriptResult`` carries the capture time of the last sample of its window
+(``captured_at``) and the time its text was decoded (``decoded_at``). The editor
+records ``perf_counter() - captured_at`` when the text is inserted, which is the
+mic-to-screen latency.
+"""
+import statistics
+import threading
+from collections import deque
+from typing import Dict, Iterable
+
+MAX_SAMPLES = 10000  # Keep the most recent measurements only, so long sessions stay bounded
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Nearest-rank ``pct`` percentile of ``values``, which need not be sorted."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class LatencyStats:
+    """Thread-safe collection of latency measurements in milliseconds."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._values: deque = deque(maxlen=MAX_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, milliseconds: float) -> None:
+        with self._lock:
+            self._values.append(milliseconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return {"count": 0}
+        return {
+            "count": len(values),
+            "mean_ms": statistics.mean(values),
+            "p50_ms": percentile(values, 50),
+            "p90_ms": percentile(values, 90),
+            "p99_ms": percentile(values, 99),
+            "max_ms": values[-1],
+        }
+
+    def format_summary(self) -> str:
+        summary = self.summary()
+        if not summary["count"]:
+            return f"{self.name}: no measurements"
+        return (f"{self.name}: n={summary['count']} mean={summary['mean_ms']:.0f}ms "
+                f"p50={summary['p50_ms']:.0f}ms p90={summary['p90_ms']:.0f}ms "
+                f"p99={summary['p99_ms']:.0f}ms max={summary['max_ms']:.0f}ms")
@@ -0,0 +1,218 @@
+"""
+Block-local self-attention for long Wav2Vec2 windows.
+
+Full self-attention compares every frame with every other frame. With 20 ms
+frames, a 30 s window gives 1500 x 1500 scores per head and layer, so time and
+memory grow with the square of the window. ``enable_local_attention`` replaces the
+attention module of every transformer layer with ``LocalAttention``. The frames are
+split into blocks of ``block_seconds``, and each block attends only to itself and
+``context_seconds`` of frames on either side. Per block the scores are
+block x (block + 2 x context), so cost per second of audio stays flat as the
+window grows. Stacked layers still see further: after N layers a frame depends on
+about N x ``context_seconds`` of audio on each side.
+
+The model's own projections and weights are reused, so no retraining or export is
+needed. The model is changed in place, which affects every engine sharing it;
+``disable_local_attention`` restores full attention.
+
+``bench`` runs one forward pass per window length, full and local, each in a fresh
+process, and reports the peak activation memory. The "MB per +s" column is the growth
+of that peak from the previous window: with full attention it keeps rising as
+windows get longer, with local attention it stays flat.
+
+Usage: python local_attention.py bench [--windows 5 10 20 30 60] [--context-seconds 2]
+"""
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from memory_usage import peak_rss, process_memory, reset_peak_rss
+
+MODEL_SAMPLING_RATE = 16000
+DEFAULT_BLOCK_SECONDS = 1.0
+DEFAULT_CONTEXT_SECONDS = 2.0
+RSS_SAMPLE_SECONDS = 0.002  # Polling interval where the kernel's peak RSS cannot be reset
+ATTN_IMPLEMENTATION_SINCE = (4, 36)  # Older transformers (e.g. the pinned 4.30) always run eager attention
+
+
+class LocalAttention(torch.nn.Module):
+    """Drop-in for a Wav2Vec2 encoder layer's ``attention`` that only attends within a band."""
+
+    def __init__(self, attention: torch.nn.Module, block_frames: int, context_frames: int, output_len: int) -> None:
+        super().__init__()
+        self.attention = attention  # The original module, for its projections and to restore it
+        self.block_frames = block_frames
+        self.context_frames = context_frames
+        self.output_len = output_len  # The layer unpacks 2 or 3 values, depending on the transformers version
+
+    def forward(self, hidden_states: torch.Tensor, attention_mask: Optional[torch.Tensor] = None, **kwargs):
+        attention = self.attention
+        batch, length, _ = hidden_states.shape
+        block, context = self.block_frames, self.context_frames
+        heads = attention.num_heads
+
+        def project(linear: torch.nn.Linear) -> torch.Tensor:
+            return linear(hidden_states).view(batch, length, heads, -1).transpose(1, 2)
+
+        query, key, value = project(attention.q_proj), project(attention.k_proj), project(attention.v_proj)
+
+        # Pad to whole blocks, then view keys/values as one overlapping span per block
+        blocks = -(-length // block)
+        padded = blocks * block
+        query = F.pad(query, (0, 0, 0, padded - length)).view(batch, heads, blocks, block, -1)
+        span = block + 2 * context
+        key = F.pad(key, (0, 0, context, padded - length + context)).unfold(2, span, block).transpose(-1, -2)
+        value = F.pad(value, (0, 0, context, padded - length + context)).unfold(2, span, block).transpose(-1, -2)
+
+        # Padding frames (before the start, after the end, and padded batch entries) are not attended to
+        key_valid = torch.ones(batch, length, dtype=torch.bool, device=hidden_states.device)
+        if attention_mask is not None:
+            row = attention_mask[:, 0, 0, :] if attention_mask.dim() == 4 else attention_mask
+            key_valid = row if row.dtype == torch.bool else row == 0
+        key_valid = F.pad(key_valid, (context, padded - length + context)).unfold(1, span, block)
+        mask = key_valid[:, None, :, None, :]  # batch, heads, blocks, queries, keys
+
+        # Plain matmul/softmax rather than scaled_dot_product_attention, which torch 1.13 lacks
+        scores = torch.matmul(query * attention.scaling, key.transpose(-1, -2))
+        scores = scores.masked_fill(~mask, torch.finfo(scores.dtype).min)
+        output = torch.matmul(scores.softmax(dim=-1), value)
+        output = output.reshape(batch, heads, padded, -1)[:, :, :length].transpose(1, 2).reshape(batch, length, -1)
+        output = attention.out_proj(output)
+        return (output, None, None)[:self.output_len]
+
+
+def _attention_output_len(attention: torch.nn.Module, hidden_size: int) -> int:
+    with torch.no_grad():
+        return len(attention(torch.zeros(1, 2, hidden_size)))
+
+
+def enable_local_attention(model, block_seconds: float = DEFAULT_BLOCK_SECONDS,
+                           context_seconds: float = DEFAULT_CONTEXT_SECONDS,
+                           sampling_rate: int = MODEL_SAMPLING_RATE) -> None:
+    """Switches every encoder layer of a Wav2Vec2ForCTC to block-local attention."""
+    frames_per_second = sampling_rate / model.config.inputs_to_logits_ratio
+    block_frames = max(1, round(block_seconds * frames_per_second))
+    context_frames = max(0, round(context_seconds * frames_per_second))
+    for layer in model.wav2vec2.encoder.layers:
+        attention = layer.attention.attention if isinstance(layer.attention, LocalAttention) else layer.attention
+        output_len = _attention_output_len(attention, model.config.hidden_size)
+        layer.attention = LocalAttention(attention, block_frames, context_frames, output_len)
+
+
+def disable_local_attention(model) -> None:
+    for layer in model.wav2vec2.encoder.layers:
+        if isinstance(layer.attention, LocalAttention):
+            layer.attention = layer.attention.attention
+
+
+# --- Benchmark ---
+
+def supports_attn_implementation() -> bool:
+    import transformers
+    version = tuple(int(part) for part in transformers.__version__.split(".")[:2] if part.isdigit())
+    return version >= ATTN_IMPLEMENTATION_SINCE
+
+
+class _RssSampler:
+    """Polls RSS on a thread and keeps the highest value, for platforms without a resettable peak."""
+
+    def __init__(self) -> None:
+        self.peak = process_memory()["rss"]
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="RssSampler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._done.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, process_memory()["rss"])
+
+    def stop(self) -> int:
+        self._done.set()
+        self._thread.join()
+        return max(self.peak, process_memory()["rss"])
+
+
+def _bench_case(model_dir: str, window_seconds: float, context_seconds: Optional[float],
+                attn_implementation: str, results) -> None:
+    from transformers import Wav2Vec2ForCTC
+
+    options = {"attn_implementation": attn_implementation} if supports_attn_implementation() else {}
+    model = Wav2Vec2ForCTC.from_pretrained(model_dir, local_files_only=True, **options)
+    model.eval()
+    if context_seconds is not None:
+        enable_local_attention(model, context_seconds=context_seconds)
+    audio = torch.from_numpy(np.random.default_rng(0).standard_normal((1, int(window_seconds * MODEL_SAMPLING_RATE)),
+                                                                       dtype=np.float32) * 0.1)
+    with torch.no_grad():
+        model(audio[:, :MODEL_SAMPLING_RATE])  # Warm up on one second
+        # Outside Linux the kernel's peak would still be the one from loading, so sample instead
+        sampler = None if reset_peak_rss() else _RssSampler()
+        baseline = process_memory()["rss"]
+        started = time.perf_counter()
+        logits = model(audio).logits
+        elapsed = time.perf_counter() - started
+        peak = sampler.stop() if sampler else peak_rss()
+    results.put({"seconds": elapsed, "peak_bytes": max(peak - baseline, 0),
+                 "ids": logits.argmax(dim=-1)[0].tolist()})
+
+
+def run_benchmark(model_dir: str, windows, context_seconds: float, attn_implementation: str = "eager") -> list:
+    """Times one forward pass per window length, each in a fresh process so peak memory is its own."""
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for window in windows:
+        full_ids = None
+        for mode, span in (("full", None), ("local", context_seconds)):
+            results = context.Queue()
+            process = context.Process(target=_bench_case, args=(model_dir, window, span, attn_implementation, results))
+            process.start()
+            result = results.get()
+            process.join()
+            if mode == "full":
+                full_ids = result["ids"]
+            same = sum(a == b for a, b in zip(result["ids"], full_ids)) / max(len(full_ids), 1)
+            rows.append({"window": window, "mode": mode, "seconds": result["seconds"],
+                         "peak_bytes": result["peak_bytes"], "agreement": same})
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Block-local attention for long Wav2Vec2 windows.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--windows", type=float, nargs="+", default=[5, 10, 20, 30, 60], metavar="SECONDS")
+    parser.add_argument("--context-seconds", type=float, default=DEFAULT_CONTEXT_SECONDS)
+    parser.add_argument("--attn-implementation", default="eager",
+                        help="Full-attention kernel to compare against (transformers 4.36+; older "
+                             "versions, like the pinned 4.30, only have eager)")
+    args = parser.parse_args()
+    if args.attn_implementation != "eager" and not supports_attn_implementation():
+        parser.error("--attn-implementation needs transformers 4.36 or later; this version only runs eager")
+
+    print(f"{'window s':>9} {'mode':>6} {'time s':>8} {'ms per s':>9} {'peak MB':>9} {'MB per +s':>10} {'same ids':>9}")
+    rows = run_benchmark(args.model_dir, sorted(args.windows), args.context_seconds, args.attn_implementation)
+    previous = {}
+    for row in rows:
+        peak_mb = row['peak_bytes'] / 1024 / 1024
+        growth = ""
+        if row["mode"] in previous:
+            prev_window, prev_mb = previous[row["mode"]]
+            growth = f"{(peak_mb - prev_mb) / (row['window'] - prev_window):.1f}" if row["window"] > prev_window else ""
+        previous[row["mode"]] = (row["window"], peak_mb)
+        print(f"{row['window']:>9g} {row['mode']:>6} {row['seconds']:>8.2f} "
+              f"{row['seconds'] * 1000 / row['window']:>9.1f} {peak_mb:>9.1f} "
+              f"{growth:>10} {row['agreement']:>9.0%}")
+    print("(peak MB: activation memory above the warmed-up process; MB per +s: its growth per second of window "
+          "since the previous row; same ids: CTC frames matching full attention)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Non-blocking, rate-limited logging for the dictation apps.
+
+``configure_logging`` routes every record through a ``QueueHandler`` to a
+``QueueListener``. The listener's thread formats the records and writes them to the
+real handlers (stdout by default). A thread that logs (the Tk loop, the engine
+worker) only creates a record and puts it on an in-memory queue. It never formats
+or waits on the console. Records are queued unformatted: ``%``-style arguments are
+only merged on the listener thread, so hot paths should log with
+``logger.debug("... %s", value)``, not f-strings. The arguments must not be changed
+after the call.
+
+A token bucket per message template (logger, level and unformatted message) drops
+repeats beyond ``burst`` records plus ``rate`` per second. The next record of that
+template that gets through says how many were suppressed. The check happens before
+the record is queued.
+
+``overhead()`` reports the records logged and suppressed, and the time spent in
+logging calls on the calling threads. Pass it an earlier ``overhead()`` as ``since``
+to get the figures for one dictation session. ``python logging_setup.py --bench`` compares
+the cost of a call through the queue with a direct ``StreamHandler``.
+"""
+import argparse
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_BURST = 10         # Records of one template that always get through...
+DEFAULT_RATE = 1.0         # ...then this many per second
+
+_queue_handler: Optional["LazyQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per message template; notes the number suppressed on the next record let through."""
+
+    def __init__(self, burst: int = DEFAULT_BURST, rate: float = DEFAULT_RATE) -> None:
+        super().__init__()
+        self.burst = burst
+        self.rate = rate
+        self.suppressed = 0
+        self._buckets: Dict[Tuple[str, int, str], List[float]] = {}  # key -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed and not isinstance(record.args, dict):
+            message = str(record.msg) if record.args else str(record.msg).replace("%", "%%")
+            record.msg = message + " (%d similar messages suppressed)"
+            record.args = tuple(record.args or ()) + (suppressed,)
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without formatting them, and times its own work on the calling thread."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.records = 0
+        self.caller_seconds = 0.0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record  # Same process: the listener formats it, with its exception info intact
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        started = time.perf_counter()
+        handled = super().handle(record)  # A bool before Python 3.12, the record (or False) since
+        self.caller_seconds += time.perf_counter() - started
+        if handled:
+            self.records += 1
+        return handled
+
+
+def configure_logging(level: int = logging.INFO, format: str = DEFAULT_FORMAT,
+                      handlers: Optional[List[logging.Handler]] = None,
+                      burst: int = DEFAULT_BURST, rate: float = DEFAULT_RATE) -> logging.handlers.QueueListener:
+    """
+    Like ``logging.basicConfig``, but the root logger only queues records; a listener
+    thread writes them to ``handlers`` (default: stdout). Stopped at exit, which
+    flushes what is still queued.
+    """
+    global _queue_handler, _listener
+    handlers = handlers or [logging.StreamHandler(sys.stdout)]
+    formatter = logging.Formatter(format)
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatter)
+    log_queue: queue.Queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(burst, rate))
+    root = logging.getLogger()
+    stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    _queue_handler = queue_handler
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop_logging() -> None:
+    """Writes out the records still queued and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def overhead(since: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Records queued and suppressed so far (or since the ``since`` snapshot), and the
+    mean time a logging call cost its caller.
+    """
+    if _queue_handler is None:
+        return {"records": 0, "suppressed": 0, "caller_ms": 0.0, "per_record_us": 0.0}
+    since = since or {}
+    records = _queue_handler.records - since.get("records", 0)
+    suppressed = sum(f.suppressed for f in _queue_handler.filters if isinstance(f, RateLimitFilter))
+    suppressed -= since.get("suppressed", 0)
+    caller_ms = _queue_handler.caller_seconds * 1000 - since.get("caller_ms", 0.0)
+    calls = records + suppressed
+    return {"records": records, "suppressed": suppressed, "caller_ms": caller_ms,
+            "per_record_us": caller_ms * 1000 / calls if calls else 0.0}
+
+
+def format_overhead(stats: Dict[str, float]) -> str:
+    return (f"Logging: {stats['records']} records, {stats['suppressed']} suppressed, "
+            f"{stats['caller_ms']:.1f} ms on the logging threads ({stats['per_record_us']:.1f} us per call)")
+
+
+def _time_calls(logger: logging.Logger, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        logger.info("Status updated: %s (%d)", "Processing...", i)
+    return (time.perf_counter() - started) * 1e6 / calls
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the per-call cost of logging on the calling thread.")
+    parser.add_argument("--bench", action="store_true", required=True)
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench")
+    # A file flushed per record, like stdout redirected to a log; a console is slower still.
+    # Per-call wall time includes the listener thread when it shares the caller's core.
+    rows = []
+    with tempfile.TemporaryFile("w") as sink:
+        logging.basicConfig(level=logging.INFO, format=DEFAULT_FORMAT, stream=sink, force=True)
+        rows.append(("direct StreamHandler", _time_calls(logger, args.calls), None))
+        for name, burst, rate in (("queued", args.calls, 0.0), ("queued, rate-limited", DEFAULT_BURST, DEFAULT_RATE)):
+            configure_logging(handlers=[logging.StreamHandler(sink)], burst=burst, rate=rate)
+            rows.append((name, _time_calls(logger, args.calls), overhead()))
+            stop_logging()
+    print(f"{'':<22} {'wall us/call':>13} {'in handler':>11} {'suppressed':>11}")
+    for name, wall_us, stats in rows:
+        in_handler = f"{stats['per_record_us']:.2f}" if stats else "-"
+        suppressed = stats["suppressed"] if stats else "-"
+        print(f"{name:<22} {wall_us:>13.2f} {in_handler:>11} {suppressed:>11}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Parallel transcription of one long recording.
+
+``transcribe`` on a multi-hour file runs one forward pass at a time, and a single
+pass only uses the intra-op threads of one model call. This splits the recording at
+pauses with one vectorized energy scan (``segmentation.split_at_silences``). The
+segments are then spread over a process pool. Each worker loads the model once,
+with ``cores / workers`` torch threads, and transcribes whole segments, so no word is
+cut at a fixed window boundary. Results come back in recording order, and word
+timestamps are offset by each segment's start.
+
+With ``--shared-weights`` the workers memory-map one copy of the weights (see
+shared_weights.py) instead of loading one each. ``--scaling`` runs the recording
+with 1, 2, 4, ... workers and prints the wall time of each.
+
+Usage: python long_recording.py recording.wav [--workers 4] [--srt out.srt] [--scaling]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from dictation_engine import MODEL_SAMPLING_RATE
+from segmentation import MAX_UTTERANCE_SECONDS, split_at_silences
+from timestamps import Word, open_word_writer
+
+logger = logging.getLogger(__name__)
+
+_engine = None  # The worker process's DictationEngine
+
+
+def _init_worker(model_dir: str, shared_weights_dir: Optional[str], threads: int, max_segment_seconds: float) -> None:
+    global _engine
+    import torch
+    from dictation_engine import DictationEngine
+
+    torch.set_num_threads(threads)
+    _engine = DictationEngine(model_dir, shared_weights_dir=shared_weights_dir)
+    _engine.load_model()
+    _engine.chunk_samples = int((max_segment_seconds + 1) * MODEL_SAMPLING_RATE)  # A segment is one model call
+
+
+def _transcribe_segment(job: Tuple[np.ndarray, float]) -> Tuple[str, List[Word]]:
+    audio, start_seconds = job
+    return _engine.transcribe_words(audio, start_seconds)
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def transcribe_parallel(audio: np.ndarray, model_dir: str, workers: int,
+                        shared_weights_dir: Optional[str] = None,
+                        max_segment_seconds: float = MAX_UTTERANCE_SECONDS) -> Iterator[Tuple[float, str, List[Word]]]:
+    """Yields ``(start_seconds, text, words)`` per segment, in recording order, as they complete."""
+    segments = split_at_silences(audio, MODEL_SAMPLING_RATE, max_segment_seconds=max_segment_seconds)
+    logger.info(f"{len(segments)} segments for {len(audio) / MODEL_SAMPLING_RATE:.0f}s of audio, {workers} workers.")
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    jobs = ((audio[start:end], start / MODEL_SAMPLING_RATE) for start, end in segments)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(model_dir, shared_weights_dir, threads, max_segment_seconds)) as pool:
+        # map keeps submission order; a few segments per task cut the pickling round trips
+        for (start, _), (text, words) in zip(segments, pool.map(_transcribe_segment, jobs, chunksize=2)):
+            yield start / MODEL_SAMPLING_RATE, text, words
+
+
+def main() -> int:
+    import soundfile as sf
+
+    parser = argparse.ArgumentParser(description="Transcribe one long recording in parallel, split at silences.")
+    parser.add_argument("audio", help="16 kHz mono recording")
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--shared-weights", metavar="DIR", default=None,
+                        help="Memory-map one copy of the weights for all workers (see shared_weights.py)")
+    parser.add_argument("--max-segment-seconds", type=float, default=MAX_UTTERANCE_SECONDS)
+    parser.add_argument("--srt")
+    parser.add_argument("--vtt")
+    parser.add_argument("--json")
+    parser.add_argument("--scaling", action="store_true", help="Time 1, 2, 4, ... up to --workers workers")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    audio, rate = sf.read(args.audio, dtype="float32")
+    if rate != MODEL_SAMPLING_RATE:
+        print(f"Expected {MODEL_SAMPLING_RATE} Hz audio, got {rate} Hz", file=sys.stderr)
+        return 1
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    duration = len(audio) / MODEL_SAMPLING_RATE
+
+    if args.scaling:
+        counts = sorted({min(2 ** i, args.workers) for i in range(args.workers.bit_length() + 1)})
+        print(f"{'workers':>8} {'wall s':>8} {'RTF':>7} {'speedup':>8}")
+        single = None
+        for workers in counts:
+            started = time.perf_counter()
+            for _ in transcribe_parallel(audio, args.model_dir, workers, args.shared_weights,
+                                         args.max_segment_seconds):
+                pass
+            elapsed = time.perf_counter() - started  # Includes starting the pool and loading the model
+            single = single or elapsed
+            print(f"{workers:>8} {elapsed:>8.1f} {elapsed / duration:>7.3f} {single / elapsed:>7.2f}x")
+        return 0
+
+    writers = [open_word_writer(name) for name in (args.srt, args.vtt, args.json) if name]
+    started = time.perf_counter()
+    try:
+        for start_seconds, text, words in transcribe_parallel(audio, args.model_dir, args.workers,
+                                                              args.shared_weights, args.max_segment_seconds):
+            if text:
+                print(f"[{start_seconds:8.2f}] {text}", flush=True)
+            for writer in writers:
+                writer.add(words)
+    finally:
+        for writer in writers:
+            writer.close()
+    elapsed = time.perf_counter() - started
+    print(f"{duration:.0f}s of audio in {elapsed:.1f}s with {args.workers} workers "
+          f"(RTF {elapsed / duration:.3f})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
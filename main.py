@@ -1,76 +1,30 @@
 import sys
-import os
-import json
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QTextEdit, QPushButton, 
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QTextEdit, QPushButton, QComboBox,
                             QVBoxLayout, QWidget, QLabel, QFileDialog, QMessageBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QObject, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette
-import sounddevice as sd
-import numpy as np
-from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
-import torch
-import webrtcvad
-import queue
-import tempfile
-import soundfile as sf
-
-class AudioProcessor(QThread):
+from dictation_engine import DictationEngine, TranscriptResult
+from model_registry import ModelRegistry, model_name
+
+class EngineSignals(QObject):
+    """Carries engine results from its worker thread to the Qt main thread."""
     transcription_update = pyqtSignal(str)
-    
-    def __init__(self, processor, model):
-        super().__init__()
-        self.processor = processor
-        self.model = model
-        self.audio_queue = queue.Queue()
-        self.is_recording = False
-        self.vad = webrtcvad.Vad()
-        self.vad.set_mode(3)
-        
-    def run(self):
-        def audio_callback(indata, frames, time, status):
-            if status:
-                print(status)
-            self.audio_queue.put(indata.copy())
-
-        stream = sd.InputStream(
-            channels=1,
-            samplerate=16000,
-            callback=audio_callback
-        )
-        
-        with stream:
-            while self.is_recording:
-                try:
-                    audio_data = self.audio_queue.get()
-                    self.process_audio(audio_data)
-                except KeyboardInterrupt:
-                    break
-
-    def process_audio(self, audio_data):
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
-            
-        chunk_size = 16000
-        for i in range(0, len(audio_data), chunk_size):
-            chunk = audio_data[i:i+chunk_size]
-            if len(chunk) > 0:
-                transcription = self.transcribe_chunk(chunk)
-                self.transcription_update.emit(transcription)
-
-    def transcribe_chunk(self, audio_chunk):
-        input_values = self.processor(audio_chunk, sampling_rate=16000, return_tensors="pt").input_values
-        logits = self.model(input_values).logits
-        predicted_ids = torch.argmax(logits, dim=-1)
-        return self.processor.decode(predicted_ids[0])
+    model_loaded = pyqtSignal(object, str)  # (future, model_dir) from the registry's loader thread
 
 class DhivehiDictationApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Dhivehi Dictation System")
         self.setGeometry(100, 100, 800, 600)
+        self.registry = ModelRegistry()
+        self.pinned_model_dir = None  # Pinned in the registry while the engine uses it
         self.setup_ui()
         self.setup_dark_theme()
-        self.audio_processor = None
+        self.engine = DictationEngine()
+        self.signals = EngineSignals()
+        self.signals.transcription_update.connect(self.update_text)
+        self.signals.model_loaded.connect(self.on_model_loaded)
+        self.engine.add_listener(self.on_transcript)
 
     def setup_ui(self):
         central_widget = QWidget()
@@ -85,6 +39,14 @@ class DhivehiDictationApp(QMainWindow):
         # Control buttons
         button_layout = QVBoxLayout()
         
+        # Models found in ./model and ./models; selecting one loads it in the background
+        self.available_models = self.registry.scan()
+        self.model_combo = QComboBox()
+        self.model_combo.addItem("Select a model...")
+        self.model_combo.addItems(list(self.available_models))
+        self.model_combo.activated[str].connect(self.on_model_selected)
+        button_layout.addWidget(self.model_combo)
+
         self.load_model_btn = QPushButton("Load Model")
         self.load_model_btn.clicked.connect(self.load_model)
         button_layout.addWidget(self.load_model_btn)
@@ -117,51 +79,71 @@ class DhivehiDictationApp(QMainWindow):
         self.setPalette(palette)
 
     def load_model(self):
-        model_dir, _ = QFileDialog.getExistingDirectory(
+        model_dir = QFileDialog.getExistingDirectory(
             self, "Select Model Directory", "model", QFileDialog.ShowDirsOnly
         )
         if model_dir:
+            self.switch_to_model(model_dir)
+
+    def on_model_selected(self, name):
+        if name in self.available_models:
+            self.switch_to_model(self.available_models[name])
+
+    def switch_to_model(self, model_dir):
+        # Loads off the UI thread; while dictating, the engine switches between utterances
+        self.statusBar().showMessage(f"Loading model {model_name(model_dir)}...")
+        future = self.registry.preload(model_dir)
+        future.add_done_callback(lambda f: self.signals.model_loaded.emit(f, model_dir))
+
+    def on_model_loaded(self, future, model_dir):
+        try:
+            future.result()  # Raises if the load failed
+            processor, model = self.registry.acquire(model_dir)  # Resident after the preload
             try:
-                # Check if required model files exist
-                required_files = ['config.json', 'pytorch_model.bin', 'tokenizer.json']
-                missing_files = [f for f in required_files if not os.path.exists(os.path.join(model_dir, f))]
-                
-                if missing_files:
-                    QMessageBox.critical(self, "Error", f"Missing required model files: {', '.join(missing_files)}")
-                    return
-
-                self.processor = Wav2Vec2Processor.from_pretrained(model_dir)
-                self.model = Wav2Vec2ForCTC.from_pretrained(model_dir)
-                QMessageBox.information(self, "Success", "Model loaded successfully!")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error loading model: {str(e)}")
+                self.engine.switch_model(processor, model, model_dir)
+            except Exception:
+                self.registry.release(model_dir)
+                raise
+            if self.pinned_model_dir:
+                self.registry.release(self.pinned_model_dir)
+            self.pinned_model_dir = model_dir
+            self.statusBar().showMessage(f"Model: {model_name(model_dir)}")
+        except FileNotFoundError as e:
+            self.statusBar().clearMessage()
+            QMessageBox.critical(self, "Error", str(e))
+        except Exception as e:
+            self.statusBar().clearMessage()
+            QMessageBox.critical(self, "Error", f"Error loading model: {str(e)}")
 
     def start_dictation(self):
-        if not hasattr(self, 'processor') or not hasattr(self, 'model'):
+        if not self.engine.is_loaded:
             QMessageBox.warning(self, "Warning", "Please load a model first!")
             return
             
-        if self.audio_processor and self.audio_processor.isRunning():
+        if self.engine.is_running:
             return
             
-        self.audio_processor = AudioProcessor(self.processor, self.model)
-        self.audio_processor.transcription_update.connect(self.update_text)
-        self.audio_processor.is_recording = True
-        self.audio_processor.start()
+        try:
+            self.engine.start()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not start audio input: {str(e)}")
 
     def stop_dictation(self):
-        if self.audio_processor:
-            self.audio_processor.is_recording = False
-            self.audio_processor.wait()
-            self.audio_processor = None
+        self.engine.stop()
+
+    def on_transcript(self, result: TranscriptResult):
+        # Called on the engine's worker thread; the signal queues it to the UI thread
+        if result.session != self.engine.session:
+            return  # Delivered while the session was being stopped
+        if result.is_final and result.text:
+            self.signals.transcription_update.emit(result.text)
 
     def update_text(self, text):
         self.text_area.append(text)
 
     def closeEvent(self, event):
-        if self.audio_processor and self.audio_processor.isRunning():
-            self.audio_processor.is_recording = False
-            self.audio_processor.wait()
+        self.engine.stop()
+        self.registry.close()
         event.accept()
 
 if __name__ == '__main__':
@@ -0,0 +1,76 @@
+"""
+Process memory measurements used to confirm that model weights are shared.
+
+RSS counts shared pages (such as memory-mapped weights) once in every process that
+touches them, so summing RSS over workers overstates the real footprint. PSS splits
+each shared page between the processes mapping it, and USS counts only private
+pages. On Linux all three come from /proc; elsewhere psutil is used if installed.
+"""
+import os
+import sys
+from typing import Dict, Iterable, Optional
+
+try:
+    import psutil
+except ImportError:  # Optional: only needed outside Linux
+    psutil = None
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """Returns {"rss", "pss", "uss"} in bytes for ``pid`` (default: this process)."""
+    pid = pid or os.getpid()
+    smaps_rollup = f"/proc/{pid}/smaps_rollup"
+    if sys.platform.startswith("linux") and os.path.exists(smaps_rollup):
+        fields = {}
+        with open(smaps_rollup) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+        return {
+            "rss": fields.get("Rss", 0),
+            "pss": fields.get("Pss", 0),
+            "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        }
+    if psutil is not None:
+        info = psutil.Process(pid).memory_full_info()
+        return {"rss": info.rss, "pss": getattr(info, "pss", info.uss), "uss": info.uss}
+    raise RuntimeError("Per-process memory needs Linux /proc or the psutil package.")
+
+
+def peak_rss(pid: Optional[int] = None) -> int:
+    """Highest RSS ``pid`` (default: this process) has reached so far, in bytes."""
+    pid = pid or os.getpid()
+    status = f"/proc/{pid}/status"
+    if sys.platform.startswith("linux") and os.path.exists(status):
+        with open(status) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    if psutil is not None:
+        info = psutil.Process(pid).memory_info()
+        return getattr(info, "peak_wset", info.rss)  # Only Windows reports a peak
+    raise RuntimeError("Peak memory needs Linux /proc or the psutil package.")
+
+
+def reset_peak_rss() -> bool:
+    """Restarts this process's ``peak_rss`` from its current RSS; only possible on Linux."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def total_memory(pids: Iterable[int]) -> Dict[str, int]:
+    """Sums ``process_memory`` over several processes."""
+    totals = {"rss": 0, "pss": 0, "uss": 0}
+    for pid in pids:
+        for key, value in process_memory(pid).items():
+            totals[key] += value
+    return totals
+
+
+def format_mb(num_bytes: int) -> str:
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
@@ -0,0 +1,167 @@
+"""
+Registry of local models with background preloading and an in-memory LRU.
+
+``scan`` finds every complete model directory: the default ``./model`` and each
+subdirectory of ``./models``. ``get`` returns a model's processor and model, loading it
+if needed. ``preload`` loads a model on a background thread, so switching to it later
+is instant. At most ``max_models`` models stay resident, within
+``memory_budget_bytes`` of weights. The least recently used model is dropped first.
+The model passed to ``get`` is never dropped to make room for itself. ``acquire``
+also pins the model until the matching ``release``, so a model that a running
+session uses is never evicted, even when that leaves the registry over its limits.
+An engine still using an unpinned, evicted model keeps it alive until it switches away.
+
+Front-ends acquire the new model, switch with ``DictationEngine.switch_model`` (which
+takes effect between utterances without stopping capture), then release the old one.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from dictation_engine import (DEFAULT_MODEL_DIR, MODEL_WEIGHT_FILES, REQUIRED_MODEL_FILES,
+                              load_model_files)
+
+DEFAULT_MODELS_DIR = "./models"
+DEFAULT_MAX_MODELS = 2
+
+logger = logging.getLogger(__name__)
+
+
+def is_model_dir(path: str) -> bool:
+    return (os.path.isdir(path)
+            and all(os.path.exists(os.path.join(path, f)) for f in REQUIRED_MODEL_FILES)
+            and any(os.path.exists(os.path.join(path, f)) for f in MODEL_WEIGHT_FILES))
+
+
+def model_bytes(model) -> int:
+    """Size of a model's parameters and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def model_name(model_dir: str) -> str:
+    return os.path.basename(os.path.normpath(model_dir))
+
+
+class ModelRegistry:
+    def __init__(self, models_dir: str = DEFAULT_MODELS_DIR, default_model_dir: str = DEFAULT_MODEL_DIR,
+                 max_models: int = DEFAULT_MAX_MODELS, memory_budget_bytes: Optional[int] = None) -> None:
+        self.models_dir = models_dir
+        self.default_model_dir = default_model_dir
+        self.max_models = max_models
+        self.memory_budget_bytes = memory_budget_bytes
+        self._resident: "OrderedDict[str, Tuple[object, object, int]]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        self._pins: Dict[str, int] = {}  # key -> number of acquire() calls not yet released
+        self._lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ModelRegistry")
+
+    def scan(self) -> Dict[str, str]:
+        """Returns {name: directory} for every complete local model."""
+        models = {}
+        if is_model_dir(self.default_model_dir):
+            models[model_name(self.default_model_dir)] = self.default_model_dir
+        if os.path.isdir(self.models_dir):
+            for name in sorted(os.listdir(self.models_dir)):
+                path = os.path.join(self.models_dir, name)
+                if is_model_dir(path):
+                    models[name] = path
+        return models
+
+    def _key(self, model_dir: str) -> str:
+        return os.path.abspath(model_dir) if os.path.isdir(model_dir) else model_dir
+
+    def add(self, model_dir: str, processor, model) -> None:
+        """Registers a model that was loaded elsewhere (e.g. by ``DictationEngine.load_model``)."""
+        with self._lock:
+            self._resident[self._key(model_dir)] = (processor, model, model_bytes(model))
+            self._resident.move_to_end(self._key(model_dir))
+            self._evict(keep=self._key(model_dir))
+
+    def get(self, model_dir: str):
+        """Returns ``(processor, model)``, loading the model if it is not resident."""
+        key = self._key(model_dir)
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                processor, model, _ = self._resident[key]
+                return processor, model
+            future = self._loading.get(key)
+            if future is None:
+                future = self._loader.submit(self._load, model_dir)
+                self._loading[key] = future
+        return future.result()
+
+    def acquire(self, model_dir: str):
+        """Like ``get``, but the model cannot be evicted until ``release(model_dir)``."""
+        key = self._key(model_dir)
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1  # Before loading, so the load cannot evict it
+        try:
+            return self.get(model_dir)
+        except BaseException:
+            self.release(model_dir)
+            raise
+
+    def release(self, model_dir: str) -> None:
+        """Unpins a model from ``acquire``; it becomes evictable once no pins are left."""
+        key = self._key(model_dir)
+        with self._lock:
+            pins = self._pins.get(key, 0) - 1
+            if pins > 0:
+                self._pins[key] = pins
+                return
+            self._pins.pop(key, None)
+            self._evict(keep=None)
+
+    def preload(self, model_dir: str) -> Future:
+        """Loads ``model_dir`` in the background; the future's result is ``(processor, model)``."""
+        key = self._key(model_dir)
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                future: Future = Future()
+                future.set_result(self._resident[key][:2])
+                return future
+            if key not in self._loading:
+                self._loading[key] = self._loader.submit(self._load, model_dir)
+            return self._loading[key]
+
+    def _load(self, model_dir: str):
+        key = self._key(model_dir)
+        try:
+            processor, model = load_model_files(model_dir)
+            size = model_bytes(model)
+            with self._lock:
+                self._resident[key] = (processor, model, size)
+                self._evict(keep=key)
+            logger.info(f"Model '{model_name(model_dir)}' resident ({size / 1024 / 1024:.0f} MB of weights).")
+            return processor, model
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def _evict(self, keep: Optional[str]) -> None:
+        """Drops least recently used, unpinned models until within max_models and the memory budget."""
+        def over_limit() -> bool:
+            total = sum(size for _, _, size in self._resident.values())
+            return (len(self._resident) > self.max_models
+                    or (self.memory_budget_bytes is not None and total > self.memory_budget_bytes))
+
+        while over_limit():
+            victim = next((key for key in self._resident if key != keep and key not in self._pins), None)
+            if victim is None:
+                break
+            del self._resident[victim]
+            logger.info(f"Model '{model_name(victim)}' evicted from the registry.")
+
+    def resident(self) -> List[str]:
+        """Resident model directories, least recently used first."""
+        with self._lock:
+            return list(self._resident)
+
+    def close(self) -> None:
+        self._loader.shutdown(wait=False)
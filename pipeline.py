@@ -0,0 +1,154 @@
+"""
+Staged processing pipeline with bounded queues and a worker pool per stage.
+
+Items pass through the stages in order. Each stage has its own workers and a small
+bounded input queue, so while one chunk is in the model's forward pass the next
+one's features are being prepared and the previous one is being decoded.
+``submit`` blocks when the first queue is full, which pushes back on the producer
+instead of buffering without limit.
+
+Workers finish items out of order when a stage has more than one. The sink puts
+results back into submission order before calling ``on_result``.
+
+``stats()`` gives each stage's utilization (busy time / wall time / workers) and
+queue depth. The stage with the highest utilization is the bottleneck.
+``pending_weight()`` is the total ``weight`` of items submitted but not yet delivered
+(e.g. their audio samples).
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from queue import Queue
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 2
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = DEFAULT_QUEUE_SIZE
+
+
+class _StageRunner:
+    def __init__(self, stage: Stage) -> None:
+        self.stage = stage
+        self.queue: Queue = Queue(maxsize=stage.queue_size)
+        self.threads: List[threading.Thread] = []
+        self.busy_seconds = 0.0
+        self.items = 0
+        self.lock = threading.Lock()
+
+
+class Pipeline:
+    """
+    ``on_result(seq, result)`` is called in submission order from a pipeline thread.
+    An item whose stage raises is logged and delivered with ``result=None``, so later
+    items are not held back.
+    """
+
+    def __init__(self, stages: List[Stage], on_result: Callable[[int, Any], None]) -> None:
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+        self.on_result = on_result
+        self._runners = [_StageRunner(stage) for stage in stages]
+        self._next_seq = 0
+        self._next_to_deliver = 0
+        self._reorder: Dict[int, Any] = {}
+        self._weights: Dict[int, float] = {}
+        self._sink_lock = threading.Lock()
+        self._all_delivered = threading.Condition(self._sink_lock)
+        self._started_at = time.perf_counter()
+        for index, runner in enumerate(self._runners):
+            for worker in range(runner.stage.workers):
+                thread = threading.Thread(target=self._worker_loop, args=(index,),
+                                          name=f"Pipeline-{runner.stage.name}-{worker}", daemon=True)
+                thread.start()
+                runner.threads.append(thread)
+
+    def submit(self, item: Any, weight: float = 1) -> int:
+        """Queues ``item`` for the first stage, blocking while it is full; returns its sequence number."""
+        with self._sink_lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._weights[seq] = weight
+        self._runners[0].queue.put((seq, item))
+        return seq
+
+    def _worker_loop(self, index: int) -> None:
+        runner = self._runners[index]
+        next_queue = self._runners[index + 1].queue if index + 1 < len(self._runners) else None
+        while True:
+            entry = runner.queue.get()
+            if entry is _STOP:
+                return
+            seq, item = entry
+            start = time.perf_counter()
+            if item is not None:
+                try:
+                    item = runner.stage.func(item)
+                except Exception as e:
+                    logger.error(f"Pipeline stage '{runner.stage.name}' failed: {e}", exc_info=True)
+                    item = None
+            with runner.lock:
+                runner.busy_seconds += time.perf_counter() - start
+                runner.items += 1
+            if next_queue is not None:
+                next_queue.put((seq, item))
+            else:
+                self._deliver(seq, item)
+
+    def _deliver(self, seq: int, result: Any) -> None:
+        with self._sink_lock:
+            self._reorder[seq] = result
+            while self._next_to_deliver in self._reorder:
+                ready = self._reorder.pop(self._next_to_deliver)
+                self._weights.pop(self._next_to_deliver, None)
+                try:
+                    self.on_result(self._next_to_deliver, ready)
+                except Exception as e:
+                    logger.error(f"Error in pipeline result callback: {e}", exc_info=True)
+                self._next_to_deliver += 1
+            self._all_delivered.notify_all()
+
+    def pending_weight(self) -> float:
+        with self._sink_lock:
+            return sum(self._weights.values())
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every submitted item has been delivered; returns False on timeout."""
+        with self._sink_lock:
+            return self._all_delivered.wait_for(lambda: self._next_to_deliver == self._next_seq, timeout)
+
+    def close(self) -> None:
+        """Stops the workers once the items already queued have gone through."""
+        for runner in self._runners:
+            for _ in runner.threads:
+                runner.queue.put(_STOP)
+            for thread in runner.threads:
+                thread.join()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        elapsed = max(time.perf_counter() - self._started_at, 1e-9)
+        stats = {}
+        for runner in self._runners:
+            with runner.lock:
+                busy, items = runner.busy_seconds, runner.items
+            stats[runner.stage.name] = {
+                "utilization": busy / (elapsed * runner.stage.workers),
+                "busy_seconds": busy / runner.stage.workers,
+                "items": items,
+                "queue_depth": runner.queue.qsize(),
+            }
+        return stats
+
+
+def format_stats(stats: Dict[str, Dict[str, float]]) -> str:
+    return ", ".join(f"{name}={values['utilization']:.0%} ({values['items']} items)"
+                     for name, values in stats.items())
@@ -0,0 +1,189 @@
+"""
+Profiling mode: cProfile and torch.profiler traces for a bounded part of a session.
+
+``SessionProfiler.start()`` begins recording and ``stop()`` ends it; with
+``auto_stop`` it stops by itself after ``max_seconds``. Each profiled session is
+written to its own ``logs/profile/session-YYYYmmdd-HHMMSS`` directory:
+
+- ``python.prof``: cProfile stats of the calling thread and of every thread started
+  while profiling (engine worker, pipeline stages). Open it with snakeviz, or
+  flameprof for a flame graph.
+- ``python_top.txt``: the 50 most expensive Python functions by cumulative time.
+- ``torch_trace.json``: operator timeline with shapes and memory; open it in
+  chrome://tracing or https://ui.perfetto.dev.
+- ``torch_stacks.txt``: folded stacks weighted by self CPU time, for flamegraph.pl
+  or speedscope.
+- ``torch_ops.txt``: operators by self CPU time and memory.
+
+Before Python 3.12, cProfile records one thread per profiler. Threads started while
+profiling each get their own profiler, and their stats are merged when the session
+is written. A thread that is still running when ``stop`` is called from another
+thread keeps its profiler until it exits, but only the stats up to ``stop`` are
+written.
+"""
+import argparse
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import List, Optional
+
+DEFAULT_PROFILE_DIR = "logs/profile"
+DEFAULT_PROFILE_SECONDS = 30.0
+PER_THREAD_CPROFILE = sys.version_info < (3, 12)  # From 3.12 one cProfile covers all threads
+
+logger = logging.getLogger(__name__)
+
+
+class SessionProfiler:
+    def __init__(self, out_dir: str = DEFAULT_PROFILE_DIR, max_seconds: float = DEFAULT_PROFILE_SECONDS) -> None:
+        self.out_dir = out_dir
+        self.max_seconds = max_seconds
+        self._profiles: List[cProfile.Profile] = []
+        self._owner_profile: Optional[cProfile.Profile] = None
+        self._torch_profiler = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._active = False
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def start(self, auto_stop: bool = True) -> None:
+        """Starts recording; with ``auto_stop`` it ends after ``max_seconds``."""
+        with self._lock:
+            if self._active:
+                return
+            self._active = True
+            self._profiles = []
+            self._started_at = time.strftime("%Y%m%d-%H%M%S")
+            self._owner_thread = threading.get_ident()
+            self._owner_profile = cProfile.Profile()
+            self._profiles.append(self._owner_profile)
+        if PER_THREAD_CPROFILE:
+            threading.setprofile(self._start_thread_profile)
+        self._owner_profile.enable()
+        self._torch_profiler = _start_torch_profiler()
+        if auto_stop:
+            self._timer = threading.Timer(self.max_seconds, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        logger.info(f"Profiling for up to {self.max_seconds:.0f}s...")
+
+    def _start_thread_profile(self, frame, event, arg) -> None:
+        # Runs as the first profile event of each new thread; cProfile then replaces this hook
+        sys.setprofile(None)
+        with self._lock:
+            if not self._active:
+                return
+            profile = cProfile.Profile()
+            self._profiles.append(profile)
+        profile.enable()
+
+    def stop(self) -> Optional[str]:
+        """Stops recording and writes the session's files; returns their directory."""
+        with self._lock:
+            if not self._active:
+                self._disable_owner_profile()  # The timer stopped the session; finish on the owner thread
+                return None
+            self._active = False
+            profiles = list(self._profiles)
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if PER_THREAD_CPROFILE:
+            threading.setprofile(None)
+        self._disable_owner_profile()
+
+        session_dir = os.path.join(self.out_dir, f"session-{self._started_at}")
+        os.makedirs(session_dir, exist_ok=True)
+        self._write_python_stats(profiles, session_dir)
+        if self._torch_profiler is not None:
+            _write_torch_traces(self._torch_profiler, session_dir)
+            self._torch_profiler = None
+        logger.info(f"Profile written to '{session_dir}'.")
+        return session_dir
+
+    def _disable_owner_profile(self) -> None:
+        if self._owner_profile and (threading.get_ident() == self._owner_thread or not PER_THREAD_CPROFILE):
+            self._owner_profile.disable()
+            self._owner_profile = None
+
+    @staticmethod
+    def _write_python_stats(profiles: List[cProfile.Profile], session_dir: str) -> None:
+        stats = None
+        for profile in profiles:
+            profile.snapshot_stats()  # Safe from another thread, unlike disable()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        if stats is None:
+            return
+        stats.dump_stats(os.path.join(session_dir, "python.prof"))
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats("cumulative").print_stats(50)
+        with open(os.path.join(session_dir, "python_top.txt"), "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+
+def _start_torch_profiler():
+    try:
+        from torch.profiler import ProfilerActivity, profile
+    except ImportError:
+        return None
+    options = dict(activities=[ProfilerActivity.CPU], record_shapes=True, profile_memory=True, with_stack=True)
+    try:
+        # Stacks need verbose mode, and ops run on the engine's threads, not the caller's
+        from torch._C._profiler import _ExperimentalConfig
+        profiler = profile(experimental_config=_ExperimentalConfig(verbose=True, profile_all_threads=True),
+                           **options)
+    except (ImportError, TypeError):
+        logger.info("This torch version records operators of the profiling thread only.")
+        profiler = profile(**options)
+    profiler.start()
+    return profiler
+
+
+def _write_torch_traces(profiler, session_dir: str) -> None:
+    try:
+        profiler.stop()
+        profiler.export_chrome_trace(os.path.join(session_dir, "torch_trace.json"))
+        profiler.export_stacks(os.path.join(session_dir, "torch_stacks.txt"), "self_cpu_time_total")
+        with open(os.path.join(session_dir, "torch_ops.txt"), "w", encoding="utf-8") as f:
+            f.write(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=50))
+    except Exception as e:
+        logger.error(f"Could not write torch profiler traces: {e}", exc_info=True)
+
+
+class profile_run:
+    """Context manager for headless scripts: profiles the block, or its first ``max_seconds``."""
+
+    def __init__(self, enabled: bool, max_seconds: float = DEFAULT_PROFILE_SECONDS,
+                 out_dir: str = DEFAULT_PROFILE_DIR) -> None:
+        self.profiler = SessionProfiler(out_dir, max_seconds) if enabled else None
+
+    def __enter__(self) -> Optional[SessionProfiler]:
+        if self.profiler:
+            self.profiler.start()
+        return self.profiler
+
+    def __exit__(self, *exc_info) -> None:
+        if self.profiler:
+            self.profiler.stop()
+
+
+def add_profile_argument(parser: argparse.ArgumentParser, what: str = "the first SECONDS") -> None:
+    """Adds ``--profile [SECONDS]``; ``args.profile`` is None unless it is given."""
+    parser.add_argument("--profile", type=float, nargs="?", const=DEFAULT_PROFILE_SECONDS, default=None,
+                        metavar="SECONDS",
+                        help=f"Record cProfile and torch.profiler traces of {what} "
+                             f"(default {DEFAULT_PROFILE_SECONDS:.0f}) under {DEFAULT_PROFILE_DIR}")
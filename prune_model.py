@@ -0,0 +1,248 @@
+"""
+Offline structured pruning of the Wav2Vec2 model into a smaller local checkpoint.
+
+1. Importance: for every utterance of a labeled Dhivehi set (see evaluation.py) the
+   CTC loss is backpropagated. The first-order Taylor estimate of the loss change
+   from removing a group of weights is |sum(grad * weight)| over the group. It is
+   accumulated for each transformer layer (its attention output and FFN output
+   projections), each FFN channel (its column of the FFN output projection) and
+   each attention head (its columns of the attention output projection).
+2. Pruning: whole layers and FFN channels are removed greedily, always taking the
+   option with the least importance per unit of compute saved. This continues until
+   the estimated compute reaches the target speedup. The convolutional feature
+   encoder is not pruned; its measured share of the time is taken into account.
+3. The pruned model and the processor are saved to ``--out``. ``from_pretrained``,
+   and so ``./models/<name>`` in the apps, loads the directory as it is. The
+   directory also gets ``pruning_report.json``.
+
+Heads are measured and reported but not removed. ``Wav2Vec2Config`` has one
+``num_attention_heads`` for every layer, and ``hidden_size`` must stay a multiple of
+it, so a checkpoint with fewer heads in some layers would not load. The FFN width is
+likewise one ``intermediate_size``: each layer keeps its own most important channels,
+but every layer keeps the same number. Pruned models usually recover most of the lost
+accuracy with a short fine-tune on the same data; this tool does not fine-tune.
+
+Usage: python prune_model.py --data labeled_dir_or.tsv --target-speedup 1.5 --out ./models/pruned
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+import torch
+
+from dictation_engine import MODEL_PROCESS_CHUNK_SIZE_SAMPLES, MODEL_SAMPLING_RATE, load_model_files
+from evaluation import character_error_rate, load_labeled_set, word_error_rate
+
+MIN_FFN_FRACTION = 1 / 8   # Never narrow the FFN below this share of its width
+FFN_STEPS = 16             # The FFN shrinks in steps of 1/16 of its width
+
+logger = logging.getLogger(__name__)
+
+
+def _input_values(processor, audio: np.ndarray) -> torch.Tensor:
+    return processor(audio, return_tensors="pt", sampling_rate=MODEL_SAMPLING_RATE).input_values
+
+
+def measure_importance(processor, model, items) -> Dict[str, np.ndarray]:
+    """Accumulated Taylor importance of each layer, FFN channel and head, from the CTC loss."""
+    layers = model.wav2vec2.encoder.layers
+    config = model.config
+    head_dim = config.hidden_size // config.num_attention_heads
+    scores = {
+        "layers": np.zeros(len(layers)),
+        "channels": np.zeros((len(layers), config.intermediate_size)),
+        "heads": np.zeros((len(layers), config.num_attention_heads)),
+    }
+    zero_infinity = config.ctc_zero_infinity
+    config.ctc_zero_infinity = True  # A label longer than its audio would otherwise give an infinite loss
+    model.freeze_feature_encoder()
+    try:
+        for name, audio, reference in items:
+            labels = torch.tensor([processor.tokenizer(reference).input_ids])
+            model.zero_grad()
+            model(_input_values(processor, audio), labels=labels).loss.backward()
+            with torch.no_grad():
+                for index, layer in enumerate(layers):
+                    attention_out = layer.attention.out_proj
+                    ffn_out = layer.feed_forward.output_dense
+                    attention_taylor = attention_out.weight.grad * attention_out.weight   # hidden x hidden
+                    ffn_taylor = ffn_out.weight.grad * ffn_out.weight                     # hidden x intermediate
+                    layer_taylor = (attention_taylor.sum() + ffn_taylor.sum()
+                                    + (attention_out.bias.grad * attention_out.bias).sum()
+                                    + (ffn_out.bias.grad * ffn_out.bias).sum())
+                    scores["layers"][index] += abs(layer_taylor.item())
+                    scores["channels"][index] += ffn_taylor.sum(dim=0).abs().numpy()
+                    scores["heads"][index] += attention_taylor.sum(dim=0).view(-1, head_dim).sum(dim=1).abs().numpy()
+            logger.info(f"Importance measured on '{name}'.")
+    finally:
+        config.ctc_zero_infinity = zero_infinity
+        model.zero_grad(set_to_none=True)
+        for parameter in model.parameters():
+            parameter.requires_grad_(False)
+    return scores
+
+
+def _layer_cost(config, intermediate_size: int, frames: int) -> int:
+    """Multiply-adds per frame of one layer: Q/K/V/O projections, attention over ``frames``, FFN."""
+    hidden = config.hidden_size
+    return 4 * hidden * hidden + 2 * frames * hidden + 2 * hidden * intermediate_size
+
+
+def plan_pruning(config, scores: Dict[str, np.ndarray], transformer_ratio: float, frames: int) -> dict:
+    """Chooses layers and an FFN width whose estimated cost is ``transformer_ratio`` of the original."""
+    width = config.intermediate_size
+    step = max(8, width // FFN_STEPS // 8 * 8)
+    min_width = max(step, int(width * MIN_FFN_FRACTION))
+    channel_order = np.argsort(scores["channels"], axis=1)  # Least important first
+    ordered_scores = np.take_along_axis(scores["channels"], channel_order, axis=1)
+    layers = list(range(config.num_hidden_layers))
+    target = transformer_ratio * config.num_hidden_layers * _layer_cost(config, width, frames)
+    steps = []
+    while len(layers) * _layer_cost(config, width, frames) > target:
+        options = []
+        if len(layers) > 1:
+            weakest = min(layers, key=lambda index: scores["layers"][index])
+            options.append((scores["layers"][weakest] / _layer_cost(config, width, frames), "layer", weakest))
+        if width - step >= min_width:
+            removed = config.intermediate_size - width
+            loss = sum(ordered_scores[index, removed:removed + step].sum() for index in layers)
+            options.append((loss / (len(layers) * 2 * config.hidden_size * step), "ffn", step))
+        if not options:
+            raise ValueError("The target speedup needs more pruning than one layer and the narrowest FFN allow.")
+        _, kind, value = min(options, key=lambda option: option[0])
+        if kind == "layer":
+            layers.remove(value)
+            steps.append(f"drop layer {value}")
+        else:
+            width -= value
+            steps.append(f"FFN width {width}")
+    removed = config.intermediate_size - width
+    return {
+        "layers": layers,
+        "intermediate_size": width,
+        "channels": {index: sorted(channel_order[index, removed:].tolist()) for index in layers},
+        "steps": steps,
+    }
+
+
+def apply_pruning(model, plan: dict) -> None:
+    """Removes the layers and FFN channels not in ``plan`` and updates the config to match."""
+    encoder = model.wav2vec2.encoder
+    kept = []
+    for index in plan["layers"]:
+        layer = encoder.layers[index]
+        channels = torch.tensor(plan["channels"][index])
+        ffn = layer.feed_forward
+        intermediate = torch.nn.Linear(ffn.intermediate_dense.in_features, len(channels))
+        intermediate.weight.data = ffn.intermediate_dense.weight.data[channels].clone()
+        intermediate.bias.data = ffn.intermediate_dense.bias.data[channels].clone()
+        output = torch.nn.Linear(len(channels), ffn.output_dense.out_features)
+        output.weight.data = ffn.output_dense.weight.data[:, channels].clone()
+        output.bias.data = ffn.output_dense.bias.data.clone()
+        ffn.intermediate_dense, ffn.output_dense = intermediate, output
+        kept.append(layer)
+    encoder.layers = torch.nn.ModuleList(kept)
+    model.config.num_hidden_layers = len(kept)
+    model.config.intermediate_size = plan["intermediate_size"]
+
+
+def feature_encoder_share(processor, model, seconds: float) -> float:
+    """Fraction of a forward pass spent in the (unprunable) convolutional feature encoder."""
+    input_values = _input_values(processor, np.zeros(int(seconds * MODEL_SAMPLING_RATE), dtype=np.float32))
+    with torch.no_grad():
+        model(input_values)  # Warm up
+        started = time.perf_counter()
+        for _ in range(3):
+            model.wav2vec2.feature_extractor(input_values)
+        encoder_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(3):
+            model(input_values)
+        total_seconds = time.perf_counter() - started
+    return min(encoder_seconds / total_seconds, 0.99)
+
+
+def evaluate(processor, model, items, repeats: int = 3) -> dict:
+    """Transcribes the set; returns CER, WER and the fastest of ``repeats`` total forward times."""
+    inputs = [_input_values(processor, audio) for _, audio, _ in items]
+    best = float("inf")
+    with torch.no_grad():
+        model(inputs[0])  # Warm up
+        for _ in range(repeats):
+            started = time.perf_counter()
+            logits = [model(input_values).logits for input_values in inputs]
+            best = min(best, time.perf_counter() - started)
+    hypotheses = [processor.decode(torch.argmax(l, dim=-1)[0]).strip() for l in logits]
+    references = [reference for _, _, reference in items]
+    return {"cer": character_error_rate(references, hypotheses), "wer": word_error_rate(references, hypotheses),
+            "seconds": best}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prune layers and FFN channels of the Wav2Vec2 model.")
+    parser.add_argument("--data", required=True, help="Labeled set: directory of .wav + .txt pairs, or a TSV")
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--out", required=True, help="Directory for the pruned model")
+    parser.add_argument("--target-speedup", type=float, default=1.5)
+    parser.add_argument("--window-seconds", type=float, default=MODEL_PROCESS_CHUNK_SIZE_SAMPLES / MODEL_SAMPLING_RATE,
+                        help="Inference window the speedup is planned for (attention cost depends on it)")
+    parser.add_argument("--max-utterances", type=int, default=0, help="Use at most N recordings (0 = all)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    items = load_labeled_set(args.data, args.max_utterances)
+    processor, model = load_model_files(args.model_dir)
+    baseline = evaluate(processor, model, items)
+    logger.info(f"Baseline: CER {baseline['cer']:.2%}, {baseline['seconds']:.2f}s for {len(items)} recordings.")
+
+    encoder_share = feature_encoder_share(processor, model, args.window_seconds)
+    transformer_ratio = (1 / args.target_speedup - encoder_share) / (1 - encoder_share)
+    if transformer_ratio <= 0:
+        print(f"A {args.target_speedup}x speedup is out of reach: the feature encoder alone takes "
+              f"{encoder_share:.0%} of the time.", file=sys.stderr)
+        return 1
+
+    scores = measure_importance(processor, model, items)
+    frames = int(args.window_seconds * MODEL_SAMPLING_RATE / model.config.inputs_to_logits_ratio)
+    original = {"layers": model.config.num_hidden_layers, "intermediate_size": model.config.intermediate_size}
+    plan = plan_pruning(model.config, scores, transformer_ratio, frames)
+    apply_pruning(model, plan)
+    pruned = evaluate(processor, model, items)
+
+    os.makedirs(args.out, exist_ok=True)
+    model.save_pretrained(args.out)
+    processor.save_pretrained(args.out)
+    processor.feature_extractor.save_pretrained(args.out)  # Newer transformers fold it into processor_config.json
+    report = {
+        "source": os.path.abspath(args.model_dir),
+        "recordings": len(items),
+        "original": original,
+        "pruned": {"layers": len(plan["layers"]), "intermediate_size": plan["intermediate_size"]},
+        "kept_layers": plan["layers"],
+        "steps": plan["steps"],
+        "feature_encoder_share": round(encoder_share, 3),
+        "baseline": baseline,
+        "result": pruned,
+        "speedup": baseline["seconds"] / pruned["seconds"],
+        "layer_importance": scores["layers"].tolist(),
+        "head_importance": scores["heads"].tolist(),
+    }
+    with open(os.path.join(args.out, "pruning_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+
+    print(f"Layers {original['layers']} -> {len(plan['layers'])}, "
+          f"FFN width {original['intermediate_size']} -> {plan['intermediate_size']}")
+    print(f"Speedup {report['speedup']:.2f}x (target {args.target_speedup}x), "
+          f"CER {baseline['cer']:.2%} -> {pruned['cer']:.2%} ({pruned['cer'] - baseline['cer']:+.2%}), "
+          f"WER {baseline['wer']:.2%} -> {pruned['wer']:.2%}")
+    print(f"Pruned model written to '{args.out}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Energy-based utterance segmentation of streamed audio blocks.
+
+``UtteranceSegmenter.push`` takes the blocks delivered by the audio callback and
+returns the audio that is ready for decoding:
+
+- ``("draft", audio, start)`` each time ``draft_step_samples`` of new audio has arrived;
+- ``("final", audio, start)`` with the whole utterance once it closes, either after
+  ``end_silence_seconds`` of trailing silence or at ``max_utterance_seconds``.
+
+``start`` is the index of the audio's first sample among all samples pushed, so
+dropped silence does not shift later timestamps.
+
+Utterances that never rise above the silence threshold are dropped.
+
+``FixedWindowSegmenter`` has the same interface and emits fixed-size final windows,
+for the standard single-pass mode. It decodes every window unless given a
+``silence_threshold``, since an RMS gate also drops quiet speech.
+
+``split_at_silences`` cuts a whole recording at pauses in one vectorized pass, for
+offline transcription of long files.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+Event = Tuple[str, np.ndarray, int]  # (kind, audio, start sample)
+
+SILENCE_RMS_THRESHOLD = 0.01     # Blocks quieter than this count as silence
+END_SILENCE_SECONDS = 0.6        # Trailing silence that closes an utterance
+MAX_UTTERANCE_SECONDS = 15.0     # Force-close long utterances to bound final-pass latency
+
+
+def block_rms(block: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(np.square(block, dtype=np.float64)))) if len(block) else 0.0
+
+
+class UtteranceSegmenter:
+    def __init__(self, sampling_rate: int, draft_step_samples: int,
+                 silence_threshold: float = SILENCE_RMS_THRESHOLD,
+                 end_silence_seconds: float = END_SILENCE_SECONDS,
+                 max_utterance_seconds: float = MAX_UTTERANCE_SECONDS) -> None:
+        self.draft_step_samples = draft_step_samples
+        self.silence_threshold = silence_threshold
+        self.end_silence_samples = int(end_silence_seconds * sampling_rate)
+        self.max_utterance_samples = int(max_utterance_seconds * sampling_rate)
+        self.position = 0  # Samples pushed so far
+        self._reset()
+
+    def _reset(self) -> None:
+        self._utterance: List[np.ndarray] = []
+        self._utterance_samples = 0
+        self._utterance_start = 0
+        self._pending: List[np.ndarray] = []
+        self._pending_samples = 0
+        self._pending_start = 0
+        self._trailing_silence = 0
+        self._voiced = False
+
+    def push(self, block: np.ndarray) -> List[Event]:
+        block = np.squeeze(block)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        block_start = self.position
+        self.position += len(block)
+        if block_rms(block) < self.silence_threshold:
+            self._trailing_silence += len(block)
+        else:
+            self._trailing_silence = 0
+            self._voiced = True
+        if not self._voiced:
+            return []  # Leading silence is not part of any utterance
+
+        if not self._utterance:
+            self._utterance_start = block_start
+        if not self._pending:
+            self._pending_start = block_start
+        self._utterance.append(block)
+        self._utterance_samples += len(block)
+        self._pending.append(block)
+        self._pending_samples += len(block)
+
+        events: List[Event] = []
+        if self._pending_samples >= self.draft_step_samples:
+            events.append(("draft", np.concatenate(self._pending), self._pending_start))
+            self._pending, self._pending_samples = [], 0
+        if (self._trailing_silence >= self.end_silence_samples
+                or self._utterance_samples >= self.max_utterance_samples):
+            events.extend(self.flush())
+        return events
+
+    @property
+    def between_utterances(self) -> bool:
+        return not self._utterance
+
+    def flush(self) -> List[Event]:
+        """Closes the current utterance, if it contains any speech."""
+        events: List[Event] = []
+        if self._voiced and self._utterance:
+            events.append(("final", np.concatenate(self._utterance), self._utterance_start))
+        self._reset()
+        return events
+
+
+class FixedWindowSegmenter:
+    """
+    Collects audio blocks into fixed-size windows, each decoded as final text.
+    With a ``silence_threshold`` (e.g. ``SILENCE_RMS_THRESHOLD``), windows quieter than
+    it throughout are dropped instead of being sent to the model; off by default.
+    """
+
+    def __init__(self, window_samples: int, min_samples: int = 0,
+                 silence_threshold: Optional[float] = None) -> None:
+        self.window_samples = window_samples
+        self.min_samples = min_samples
+        self.silence_threshold = silence_threshold
+        self._blocks: List[np.ndarray] = []
+        self._samples = 0
+        self.position = 0  # Samples pushed so far
+
+    def push(self, block: np.ndarray) -> List[Event]:
+        block = np.squeeze(block)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        self._blocks.append(block)
+        self._samples += len(block)
+        self.position += len(block)
+        events: List[Event] = []
+        if self._samples >= self.window_samples:
+            audio = np.concatenate(self._blocks)
+            audio_start = self.position - len(audio)
+            self._blocks, self._samples = [], 0
+            for start in range(0, len(audio) - self.window_samples + 1, self.window_samples):
+                events.extend(self._emit(audio[start:start + self.window_samples], audio_start + start))
+            remainder = len(audio) % self.window_samples
+            if remainder:
+                self._blocks, self._samples = [audio[-remainder:]], remainder
+        return events
+
+    @property
+    def between_utterances(self) -> bool:
+        return True  # Every window is decoded on its own
+
+    def flush(self) -> List[Event]:
+        """Emits the partial window left at the end of a session."""
+        audio = np.concatenate(self._blocks) if self._blocks else np.zeros(0, dtype=np.float32)
+        self._blocks, self._samples = [], 0
+        return self._emit(audio, self.position - len(audio)) if len(audio) >= self.min_samples else []
+
+    def _emit(self, window: np.ndarray, start: int) -> List[Event]:
+        if len(window) == 0:
+            return []
+        if self.silence_threshold is not None and block_rms(window) < self.silence_threshold:
+            return []
+        return [("final", window, start)]
+
+
+def split_at_silences(audio: np.ndarray, sampling_rate: int, min_silence_seconds: float = 0.3,
+                      max_segment_seconds: float = MAX_UTTERANCE_SECONDS, frame_seconds: float = 0.03,
+                      silence_threshold: float = SILENCE_RMS_THRESHOLD) -> List[Tuple[int, int]]:
+    """
+    Returns ``(start, end)`` sample ranges that cover the speech in ``audio``, cut in
+    the middle of pauses of at least ``min_silence_seconds``. A segment longer than
+    ``max_segment_seconds`` is cut at its quietest frame in the second half of that
+    length. Ranges that are silence throughout are left out.
+    """
+    frame = max(1, int(frame_seconds * sampling_rate))
+    frames = len(audio) // frame
+    if frames == 0:
+        return [(0, len(audio))] if block_rms(audio) >= silence_threshold else []
+    framed = audio[:frames * frame].reshape(frames, frame).astype(np.float64)
+    rms = np.sqrt(np.mean(np.square(framed), axis=1))
+    silent = rms < silence_threshold
+
+    # Cut points: the middle frame of every long enough run of silent frames
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], silent.astype(np.int8), [0]))))
+    min_run = max(1, int(min_silence_seconds / frame_seconds))
+    cuts = [0] + [(run_start + run_end) // 2 for run_start, run_end in zip(edges[::2], edges[1::2])
+                  if run_end - run_start >= min_run] + [frames]
+
+    max_frames = max(2, int(max_segment_seconds / frame_seconds))
+    segments = []
+    for start, end in zip(cuts, cuts[1:]):
+        while end - start > max_frames:
+            half = start + max_frames // 2
+            cut = half + int(np.argmin(rms[half:start + max_frames]))
+            segments.append((start, cut))
+            start = cut
+        segments.append((start, end))
+
+    kept = [(start, end) for start, end in segments if not silent[start:end].all()]
+    ranges = [(int(start) * frame, int(end) * frame) for start, end in kept]
+    if kept and kept[-1][1] == frames and frames * frame < len(audio):
+        ranges[-1] = (ranges[-1][0], len(audio))  # The partial last frame belongs to the last segment
+    return ranges
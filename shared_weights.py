@@ -0,0 +1,237 @@
+"""
+Share one copy of the Wav2Vec2 weights across inference processes.
+
+``export_shared_weights`` writes every tensor of the model in ``./model`` as a raw
+``.npy`` file plus a manifest. ``load_shared_model`` builds the model from its config
+and points each parameter at a read-only memory map of those files. The OS page
+cache then holds a single copy of the weights that every process maps, so each
+extra worker only costs its activation memory. Put the shared directory under
+``/dev/shm`` to keep the weights in shared memory rather than on disk.
+
+Processes starting together serialize the check-and-export with a lock file next to
+the shared directory, so one never removes an export another is about to read.
+
+Usage:
+    python shared_weights.py export [--model-dir ./model] [--shared-dir ./model_shared]
+    python shared_weights.py bench --workers 4 [--private]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from transformers import Wav2Vec2Config, Wav2Vec2ForCTC
+
+from memory_usage import format_mb, process_memory, total_memory
+
+DEFAULT_MODEL_DIR = "./model"
+DEFAULT_SHARED_DIR = "./model_shared"
+MANIFEST_NAME = "manifest.json"
+SOURCE_FILES = ["config.json", "pytorch_model.bin", "model.safetensors"]
+EXPORT_LOCK_POLL_SECONDS = 0.2
+EXPORT_LOCK_STALE_SECONDS = 600  # A lock this old was left by a process that died while exporting
+
+logger = logging.getLogger(__name__)
+
+
+def _source_signature(model_dir: str) -> dict:
+    """Size and mtime of the source model files, to detect a stale export."""
+    signature = {}
+    for name in SOURCE_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature[name] = [stat.st_size, int(stat.st_mtime)]
+    return signature
+
+
+def _read_manifest(shared_dir: str):
+    path = os.path.join(shared_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextmanager
+def _export_lock(shared_dir: str):
+    """Cross-process lock (an exclusively created file) around checking and exporting ``shared_dir``."""
+    lock_path = os.path.abspath(shared_dir) + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > EXPORT_LOCK_STALE_SECONDS:
+                    logger.warning(f"Removing stale shared weights lock '{lock_path}'.")
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue  # Released meanwhile
+            time.sleep(EXPORT_LOCK_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def export_shared_weights(model_dir: str = DEFAULT_MODEL_DIR, shared_dir: str = DEFAULT_SHARED_DIR) -> None:
+    """Writes the model's tensors as mappable ``.npy`` files, holding the export lock."""
+    with _export_lock(shared_dir):
+        _export(model_dir, shared_dir)
+
+
+def _export(model_dir: str, shared_dir: str) -> None:
+    model = Wav2Vec2ForCTC.from_pretrained(model_dir, local_files_only=True)
+    parent = os.path.dirname(os.path.abspath(shared_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=".shared-weights-", dir=parent)
+    try:
+        tensors = {}
+        for index, (name, tensor) in enumerate(model.state_dict().items()):
+            filename = f"{index:04d}.npy"
+            np.save(os.path.join(staging_dir, filename), tensor.detach().cpu().contiguous().numpy())
+            tensors[name] = filename
+        manifest = {"source": _source_signature(model_dir), "tensors": tensors}
+        with open(os.path.join(staging_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+
+        if os.path.isdir(shared_dir):
+            shutil.rmtree(shared_dir, ignore_errors=True)
+        try:
+            os.rename(staging_dir, shared_dir)
+        except OSError:
+            # Another process published the export first; use theirs.
+            if _read_manifest(shared_dir) is None:
+                raise
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    logger.info(f"Exported {len(tensors)} shared weight tensors from '{model_dir}' to '{shared_dir}'.")
+
+
+def _set_tensor(model: torch.nn.Module, name: str, tensor: torch.Tensor) -> None:
+    module_path, _, leaf = name.rpartition(".")
+    module = model.get_submodule(module_path) if module_path else model
+    if leaf in module._parameters:
+        module._parameters[leaf] = torch.nn.Parameter(tensor, requires_grad=False)
+    elif leaf in module._buffers:
+        module._buffers[leaf] = tensor
+    else:
+        raise KeyError(f"Shared weights contain unknown tensor '{name}'.")
+
+
+def load_shared_model(model_dir: str = DEFAULT_MODEL_DIR, shared_dir: str = DEFAULT_SHARED_DIR) -> Wav2Vec2ForCTC:
+    """
+    Returns a Wav2Vec2ForCTC whose weights are read-only memory maps of ``shared_dir``.
+    The export is created (or refreshed) on first use.
+    """
+    manifest = _read_manifest(shared_dir)
+    if manifest is None or manifest.get("source") != _source_signature(model_dir):
+        with _export_lock(shared_dir):
+            manifest = _read_manifest(shared_dir)  # Another process may have exported while we waited
+            if manifest is None or manifest.get("source") != _source_signature(model_dir):
+                logger.info(f"Shared weights in '{shared_dir}' missing or stale, exporting from '{model_dir}'...")
+                _export(model_dir, shared_dir)
+                manifest = _read_manifest(shared_dir)
+    if manifest is None:
+        logger.warning(f"No readable shared weights in '{shared_dir}'; loading a private copy.")
+        model = Wav2Vec2ForCTC.from_pretrained(model_dir, local_files_only=True)
+        model.eval()
+        return model
+
+    config = Wav2Vec2Config.from_pretrained(model_dir, local_files_only=True)
+    model = Wav2Vec2ForCTC(config)  # Randomly initialised tensors are freed as they are replaced below
+    with warnings.catch_warnings():
+        # torch warns that the mapped arrays are not writable; inference never writes to them.
+        warnings.simplefilter("ignore", UserWarning)
+        for name, filename in manifest["tensors"].items():
+            array = np.load(os.path.join(shared_dir, filename), mmap_mode="r")
+            _set_tensor(model, name, torch.from_numpy(array))
+    model.eval()
+    return model
+
+
+# --- Memory benchmark ---
+
+def _bench_worker(model_dir: str, shared_dir: str, private: bool, ready, release) -> None:
+    if private:
+        model = Wav2Vec2ForCTC.from_pretrained(model_dir, local_files_only=True)
+        model.eval()
+    else:
+        model = load_shared_model(model_dir, shared_dir)
+    with torch.no_grad():
+        model(torch.randn(1, 16000)).logits  # One second of audio touches every weight page
+    ready.set()
+    release.wait()
+
+
+def run_memory_benchmark(workers: int, model_dir: str, shared_dir: str, private: bool) -> dict:
+    """Starts ``workers`` inference processes and reports their combined memory."""
+    if not private and _read_manifest(shared_dir) is None:
+        export_shared_weights(model_dir, shared_dir)
+    context = multiprocessing.get_context("spawn")
+    release = context.Event()
+    processes, ready_events = [], []
+    for _ in range(workers):
+        ready = context.Event()
+        process = context.Process(target=_bench_worker, args=(model_dir, shared_dir, private, ready, release))
+        process.start()
+        processes.append(process)
+        ready_events.append(ready)
+    try:
+        for ready in ready_events:
+            ready.wait()
+        per_worker = [process_memory(p.pid) for p in processes]
+        totals = total_memory(p.pid for p in processes)
+    finally:
+        release.set()
+        for process in processes:
+            process.join()
+    return {"per_worker": per_worker, "total": totals}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Share model weights across inference processes.")
+    parser.add_argument("command", choices=["export", "bench"])
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--shared-dir", default=DEFAULT_SHARED_DIR)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--private", action="store_true", help="bench: load a private copy per worker instead")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "export":
+        export_shared_weights(args.model_dir, args.shared_dir)
+        return 0
+
+    report = run_memory_benchmark(args.workers, args.model_dir, args.shared_dir, args.private)
+    mode = "private copies" if args.private else "shared weights"
+    print(f"{args.workers} workers, {mode}:")
+    for index, memory in enumerate(report["per_worker"]):
+        print(f"  worker {index}: RSS {format_mb(memory['rss'])}, PSS {format_mb(memory['pss'])}, "
+              f"USS {format_mb(memory['uss'])}")
+    total = report["total"]
+    print(f"  total:    RSS {format_mb(total['rss'])}, PSS {format_mb(total['pss'])}, "
+          f"USS {format_mb(total['uss'])}")
+    print("  (PSS total is the real combined footprint; RSS counts shared weight pages once per worker.)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Long-run soak test of the dictation engine, without a microphone.
+
+A recording is looped into a headless ``DictationEngine`` at capture speed (or
+``--speed`` times faster) for ``--minutes``. Blocks go through ``feed``, or, with
+``--through-callback``, through the same ``_audio_callback`` that PortAudio calls.
+Every ``--sample-seconds`` the harness records:
+
+- RSS of the process (see memory_usage.py);
+- Python heap in use, from tracemalloc;
+- queue depth: audio blocks and pipeline batches waiting;
+- p50/max mic-to-text latency of the results in the interval.
+
+Samples are appended to ``logs/soak-<time>.jsonl``. At the end a least-squares
+slope is fitted to each series, ignoring the first ``--warmup-minutes`` while
+caches and allocator pools fill up. The run fails (exit code 1) if RSS, the Python
+heap or latency grows faster than its per-hour threshold, or the queue depth ever
+exceeds ``--max-queue-depth``. The allocation sites that grew most since warmup are
+printed to help find a leak.
+
+Usage: python soak.py recording.wav [--minutes 240] [--speed 4] [--through-callback]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+
+from dictation_engine import DictationEngine, TranscriptResult, MODEL_SAMPLING_RATE
+from latency import LatencyStats
+from memory_usage import format_mb, process_memory
+
+DEFAULT_BLOCK_SAMPLES = 1600  # 100 ms, a typical capture callback
+
+
+def trend_per_hour(times: List[float], values: List[float]) -> float:
+    """Least-squares slope of ``values`` over ``times`` (seconds), per hour."""
+    if len(times) < 3 or times[-1] == times[0]:
+        return 0.0
+    return float(np.polyfit(np.asarray(times), np.asarray(values, dtype=np.float64), 1)[0]) * 3600
+
+
+class SoakRun:
+    def __init__(self, engine: DictationEngine, audio: np.ndarray, block_samples: int = DEFAULT_BLOCK_SAMPLES,
+                 speed: float = 1.0, through_callback: bool = False) -> None:
+        self.engine = engine
+        self.audio = audio.astype(np.float32)
+        self.block_samples = block_samples
+        self.speed = speed
+        self.through_callback = through_callback
+        self.samples: List[Dict[str, float]] = []
+        self._interval_latency = LatencyStats("Mic-to-text latency")
+        self._stop = threading.Event()
+        engine.add_listener(self._on_result)
+
+    def _on_result(self, result: TranscriptResult) -> None:
+        if result.is_final and result.captured_at is not None and result.decoded_at is not None:
+            self._interval_latency.record((result.decoded_at - result.captured_at) * 1000)
+
+    def _feed_loop(self) -> None:
+        """Loops the recording into the engine, paced at ``speed`` times capture speed."""
+        block_seconds = self.block_samples / MODEL_SAMPLING_RATE / self.speed
+        next_at = time.perf_counter()
+        position = 0
+        while not self._stop.is_set():
+            block = np.take(self.audio, np.arange(position, position + self.block_samples), mode="wrap")
+            position = (position + self.block_samples) % len(self.audio)
+            if self.through_callback:
+                # Same path as PortAudio: (frames, channels) input and a time_info without ADC time
+                time_info = SimpleNamespace(currentTime=time.perf_counter(), inputBufferAdcTime=0.0)
+                self.engine._audio_callback(block[:, None], len(block), time_info, None)
+            else:
+                self.engine.feed(block)
+            next_at += block_seconds
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+
+    def _sample(self, elapsed: float) -> Dict[str, float]:
+        latency = self._interval_latency.summary()
+        self._interval_latency.reset()
+        sample = {
+            "elapsed_seconds": round(elapsed, 1),
+            "rss_bytes": process_memory()["rss"],
+            "heap_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0,
+            "queue_depth": self.engine.queue_depth(),
+            "results": latency["count"],
+            "latency_p50_ms": round(latency["p50_ms"], 1) if latency["count"] else None,
+            "latency_max_ms": round(latency["max_ms"], 1) if latency["count"] else None,
+        }
+        self.samples.append(sample)
+        return sample
+
+    def run(self, seconds: float, sample_seconds: float, log_path: str, warmup_seconds: float = 0.0):
+        """Runs the soak; returns the tracemalloc snapshot taken after warmup (None without tracing)."""
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        feeder = threading.Thread(target=self._feed_loop, name="SoakFeeder", daemon=True)
+        warmup_snapshot = None
+        self.engine.start(capture=False)
+        feeder.start()
+        started = time.perf_counter()
+        try:
+            with open(log_path, "a", encoding="utf-8") as log:
+                while True:
+                    elapsed = time.perf_counter() - started
+                    if elapsed >= seconds:
+                        break
+                    time.sleep(min(sample_seconds, seconds - elapsed))
+                    elapsed = time.perf_counter() - started
+                    sample = self._sample(elapsed)
+                    log.write(json.dumps(sample) + "\n")
+                    log.flush()
+                    print(f"{elapsed / 60:7.1f} min  RSS {format_mb(sample['rss_bytes'])}  "
+                          f"heap {format_mb(sample['heap_bytes'])}  queue {sample['queue_depth']}  "
+                          f"p50 {sample['latency_p50_ms']} ms", flush=True)
+                    if warmup_snapshot is None and elapsed >= warmup_seconds and tracemalloc.is_tracing():
+                        warmup_snapshot = tracemalloc.take_snapshot()
+        finally:
+            self._stop.set()
+            feeder.join()
+            self.engine.stop(timeout=30)
+        return warmup_snapshot
+
+    def trends(self, warmup_seconds: float) -> Dict[str, float]:
+        """Per-hour slopes after warmup: MB for memory, ms for latency."""
+        steady = [s for s in self.samples if s["elapsed_seconds"] >= warmup_seconds]
+        times = [s["elapsed_seconds"] for s in steady]
+        with_latency = [s for s in steady if s["latency_p50_ms"] is not None]
+        return {
+            "rss_mb_per_hour": trend_per_hour(times, [s["rss_bytes"] / 1024 / 1024 for s in steady]),
+            "heap_mb_per_hour": trend_per_hour(times, [s["heap_bytes"] / 1024 / 1024 for s in steady]),
+            "latency_ms_per_hour": trend_per_hour([s["elapsed_seconds"] for s in with_latency],
+                                                  [s["latency_p50_ms"] for s in with_latency]),
+            "max_queue_depth": max((s["queue_depth"] for s in steady), default=0),
+        }
+
+
+def check_trends(trends: Dict[str, float], max_rss: float, max_heap: float, max_latency: float,
+                 max_queue_depth: int) -> List[str]:
+    failures = []
+    if trends["rss_mb_per_hour"] > max_rss:
+        failures.append(f"RSS grows {trends['rss_mb_per_hour']:.1f} MB/h (limit {max_rss} MB/h)")
+    if trends["heap_mb_per_hour"] > max_heap:
+        failures.append(f"Python heap grows {trends['heap_mb_per_hour']:.1f} MB/h (limit {max_heap} MB/h)")
+    if trends["latency_ms_per_hour"] > max_latency:
+        failures.append(f"Latency grows {trends['latency_ms_per_hour']:.0f} ms/h (limit {max_latency} ms/h)")
+    if trends["max_queue_depth"] > max_queue_depth:
+        failures.append(f"Queue depth reached {trends['max_queue_depth']} (limit {max_queue_depth})")
+    return failures
+
+
+def main() -> int:
+    import soundfile as sf
+
+    parser = argparse.ArgumentParser(description="Soak-test the dictation engine with a looped recording.")
+    parser.add_argument("audio", help="16 kHz mono recording to loop")
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--speed", type=float, default=1.0, help="Feed audio this many times faster than real time")
+    parser.add_argument("--block-samples", type=int, default=DEFAULT_BLOCK_SAMPLES)
+    parser.add_argument("--through-callback", action="store_true",
+                        help="Push blocks through the audio callback instead of feed()")
+    parser.add_argument("--draft-exit-layer", type=int, default=None)
+    parser.add_argument("--sample-seconds", type=float, default=30.0)
+    parser.add_argument("--warmup-minutes", type=float, default=5.0)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip heap tracing (it slows Python code)")
+    parser.add_argument("--max-rss-mb-per-hour", type=float, default=50.0)
+    parser.add_argument("--max-heap-mb-per-hour", type=float, default=20.0)
+    parser.add_argument("--max-latency-ms-per-hour", type=float, default=200.0)
+    parser.add_argument("--max-queue-depth", type=int, default=50)
+    parser.add_argument("--log", default=f"logs/soak-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+    args = parser.parse_args()
+
+    audio, rate = sf.read(args.audio, dtype="float32")
+    if rate != MODEL_SAMPLING_RATE:
+        print(f"Expected {MODEL_SAMPLING_RATE} Hz audio, got {rate} Hz", file=sys.stderr)
+        return 1
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    engine = DictationEngine(args.model_dir, draft_exit_layer=args.draft_exit_layer)
+    engine.load_model()
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+    soak = SoakRun(engine, audio, args.block_samples, args.speed, args.through_callback)
+    warmup_seconds = args.warmup_minutes * 60
+    warmup_snapshot = soak.run(args.minutes * 60, args.sample_seconds, args.log, warmup_seconds)
+
+    trends = soak.trends(warmup_seconds)
+    print(f"Trends after warmup: RSS {trends['rss_mb_per_hour']:+.1f} MB/h, "
+          f"heap {trends['heap_mb_per_hour']:+.1f} MB/h, latency {trends['latency_ms_per_hour']:+.0f} ms/h, "
+          f"max queue depth {trends['max_queue_depth']}")
+    if warmup_snapshot is not None:
+        print("Largest heap growth since warmup:")
+        for stat in tracemalloc.take_snapshot().compare_to(warmup_snapshot, "lineno")[:10]:
+            print(f"  {stat}")
+    failures = check_trends(trends, args.max_rss_mb_per_hour, args.max_heap_mb_per_hour,
+                            args.max_latency_ms_per_hour, args.max_queue_depth)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    print(f"Samples written to {args.log}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Behaviour tests for the gate of accuracy_parity.py. Run with: python -m unittest test_accuracy_parity"""
+import unittest
+
+from accuracy_parity import BASELINE, format_table, gate
+
+
+def results(**modes):
+    return {name: {"cer": cer, "wer": wer, "rtf": rtf} for name, (cer, wer, rtf) in modes.items()}
+
+
+class GateTest(unittest.TestCase):
+    def test_deltas_and_speedup_are_against_the_baseline(self):
+        run = results(**{BASELINE: (0.10, 0.30, 0.4), "int8": (0.105, 0.31, 0.2)})
+        gate(run, max_cer_increase=0.01, max_wer_increase=0.02)
+        self.assertAlmostEqual(run["int8"]["cer_delta"], 0.005)
+        self.assertAlmostEqual(run["int8"]["wer_delta"], 0.01)
+        self.assertAlmostEqual(run["int8"]["speedup"], 2.0)
+        self.assertTrue(run["int8"]["passed"])
+        self.assertTrue(run[BASELINE]["passed"])
+
+    def test_a_regression_past_either_tolerance_fails(self):
+        run = results(**{BASELINE: (0.10, 0.30, 0.4), "cer": (0.12, 0.30, 0.2), "wer": (0.10, 0.33, 0.2)})
+        gate(run, max_cer_increase=0.01, max_wer_increase=0.02)
+        self.assertFalse(run["cer"]["passed"])
+        self.assertFalse(run["wer"]["passed"])
+
+    def test_improvements_always_pass(self):
+        run = results(**{BASELINE: (0.10, 0.30, 0.4), "better": (0.05, 0.20, 0.8)})
+        gate(run, max_cer_increase=0.0, max_wer_increase=0.0)
+        self.assertTrue(run["better"]["passed"])
+        self.assertAlmostEqual(run["better"]["speedup"], 0.5)
+
+    def test_table_marks_failures(self):
+        run = results(**{BASELINE: (0.10, 0.30, 0.4), "int8": (0.20, 0.30, 0.2)})
+        gate(run, max_cer_increase=0.01, max_wer_increase=0.02)
+        rows = format_table(run).splitlines()
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(rows[2].startswith(f"| {BASELINE} |") and rows[2].endswith("| pass |"))
+        self.assertIn("+10.00%", rows[3])
+        self.assertTrue(rows[3].endswith("| FAIL |"))
+
+
+if __name__ == "__main__":
+    unittest.main()
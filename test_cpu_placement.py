@@ -0,0 +1,47 @@
+"""Behaviour tests for cpu_placement.py. Run with: python -m unittest test_cpu_placement"""
+import os
+import unittest
+from unittest import mock
+
+from cpu_placement import MIN_AUTO_CPUS, CpuPlacement
+
+
+class CpuPlacementTest(unittest.TestCase):
+    def test_parse_reads_ranges_and_lists(self):
+        placement = CpuPlacement.parse("capture=7:ui=6:inference=0-3,5")
+        self.assertEqual(placement, CpuPlacement(capture=(7,), ui=(6,), inference=(0, 1, 2, 3, 5)))
+
+    def test_parse_off_disables_placement(self):
+        self.assertIsNone(CpuPlacement.parse("off"))
+
+    def test_parse_rejects_bad_specs(self):
+        bad_specs = ["capture=7:ui=6", "capture=7:ui=6:inference=", "audio=1:ui=2:inference=3",
+                     "capture=x:ui=1:inference=2"]
+        for spec in bad_specs:
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                CpuPlacement.parse(spec)
+
+    def test_auto_reserves_the_last_cores(self):
+        placement = CpuPlacement.auto([0, 1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(placement, CpuPlacement(capture=(7,), ui=(6,), inference=(0, 1, 2, 3, 4, 5)))
+
+    def test_auto_needs_enough_cores(self):
+        self.assertIsNone(CpuPlacement.auto(list(range(MIN_AUTO_CPUS - 1))))
+        self.assertIsNotNone(CpuPlacement.auto(list(range(MIN_AUTO_CPUS))))
+
+    def test_describe_lists_every_role(self):
+        placement = CpuPlacement(capture=(3,), ui=(2,), inference=(0, 1))
+        self.assertEqual(placement.describe(), "capture [3], ui [2], inference [0, 1]")
+
+    @unittest.skipUnless(hasattr(os, "sched_getaffinity"), "threads inherit affinity only on Linux")
+    def test_new_threads_get_the_role_and_the_caller_gets_its_cpus_back(self):
+        placement = CpuPlacement(capture=(3,), ui=(2,), inference=(0, 1))
+        with mock.patch("cpu_placement.os.sched_getaffinity", return_value={0, 1, 2, 3}), \
+                mock.patch("cpu_placement.pin_current_thread", return_value=True) as pin:
+            with placement.inherited_by_new_threads("capture"):
+                self.assertEqual(pin.call_args_list, [mock.call((3,))])
+            self.assertEqual(pin.call_args_list[-1], mock.call((0, 1, 2, 3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
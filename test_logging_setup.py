@@ -0,0 +1,98 @@
+"""Behaviour tests for logging_setup.py. Run with: python -m unittest test_logging_setup"""
+import io
+import logging
+import unittest
+from unittest import mock
+
+from logging_setup import RateLimitFilter, configure_logging, format_overhead, overhead, stop_logging
+
+
+def record(msg, *args, name="test", level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class RateLimitFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch("logging_setup.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_rate(self):
+        limiter = RateLimitFilter(burst=3, rate=2.0)
+        passed = [limiter.filter(record("Status: %s", i)) for i in range(5)]
+        self.assertEqual(passed, [True, True, True, False, False])
+        self.now += 0.5  # One token back at 2 per second
+        self.assertTrue(limiter.filter(record("Status: %s", 5)))
+        self.assertFalse(limiter.filter(record("Status: %s", 6)))
+        self.assertEqual(limiter.suppressed, 3)
+
+    def test_templates_are_limited_separately(self):
+        limiter = RateLimitFilter(burst=1, rate=0.0)
+        self.assertTrue(limiter.filter(record("first %s", 1)))
+        self.assertTrue(limiter.filter(record("second %s", 1)))
+        self.assertTrue(limiter.filter(record("first %s", 1, level=logging.WARNING)))
+        self.assertTrue(limiter.filter(record("first %s", 1, name="other")))
+        self.assertFalse(limiter.filter(record("first %s", 2)))
+
+    def test_next_record_reports_the_suppressed_count(self):
+        limiter = RateLimitFilter(burst=1, rate=1.0)
+        limiter.filter(record("Lag %d ms", 1))
+        limiter.filter(record("Lag %d ms", 2))
+        limiter.filter(record("Lag %d ms", 3))
+        self.now += 1.0
+        let_through = record("Lag %d ms", 4)
+        self.assertTrue(limiter.filter(let_through))
+        self.assertEqual(let_through.getMessage(), "Lag 4 ms (2 similar messages suppressed)")
+
+    def test_literal_percent_signs_survive_the_note(self):
+        limiter = RateLimitFilter(burst=1, rate=1.0)
+        limiter.filter(record("100% busy"))
+        limiter.filter(record("100% busy"))
+        self.now += 1.0
+        let_through = record("100% busy")
+        limiter.filter(let_through)
+        self.assertEqual(let_through.getMessage(), "100% busy (1 similar messages suppressed)")
+
+
+class QueuedLoggingTest(unittest.TestCase):
+    def tearDown(self):
+        stop_logging()
+        logging.getLogger().handlers.clear()
+
+    def test_handler_counts_records_when_handle_returns_the_record(self):
+        # Python 3.12+ returns the (possibly modified) record from Handler.handle, not a bool
+        handle = logging.Handler.handle
+
+        def handle_returning_record(handler, log_record):
+            return handle(handler, log_record) and log_record
+
+        stream = io.StringIO()
+        with mock.patch.object(logging.Handler, "handle", handle_returning_record):
+            configure_logging(handlers=[logging.StreamHandler(stream)], format="%(message)s", burst=1, rate=0.0)
+            logger = logging.getLogger("queued")
+            logger.info("kept %d", 1)
+            logger.info("kept %d", 2)  # Rate-limited
+            stats = overhead()
+        stop_logging()
+        self.assertEqual((stats["records"], stats["suppressed"]), (1, 1))
+        self.assertEqual(stream.getvalue().splitlines(), ["kept 1"])
+
+    def test_records_reach_the_handler_and_overhead_can_be_diffed(self):
+        stream = io.StringIO()
+        configure_logging(handlers=[logging.StreamHandler(stream)], format="%(message)s", burst=2, rate=0.0)
+        logger = logging.getLogger("queued")
+        for i in range(5):
+            logger.info("value %d", i)
+        before = overhead()
+        logger.info("later")
+        stop_logging()  # Writes out what is still queued
+        self.assertEqual(stream.getvalue().splitlines(), ["value 0", "value 1", "later"])
+        self.assertEqual((before["records"], before["suppressed"]), (2, 3))
+        since = overhead(since=before)
+        self.assertEqual((since["records"], since["suppressed"]), (1, 0))
+        self.assertIn("1 records, 0 suppressed", format_overhead(since))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+Behaviour tests for pipeline.py and for cancelling a dictation session in
+dictation_engine.py. The engine tests build a tiny randomly initialised Wav2Vec2
+model in a temporary directory, so they need torch and transformers but no model
+download or audio device. Run with: python -m unittest test_pipeline
+"""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from pipeline import Pipeline, Stage
+
+STOP_TIMEOUT = 0.5
+SLOW_FORWARD_SECONDS = 0.3
+
+
+class PipelineTest(unittest.TestCase):
+    def test_results_are_delivered_in_submission_order(self):
+        delivered = []
+
+        def slow_for_even(item):
+            time.sleep(0.02 if item % 2 == 0 else 0.0)  # Odd items overtake even ones in the pool
+            return item * 10
+
+        pipeline = Pipeline([Stage("first", slow_for_even, workers=3), Stage("second", lambda x: x + 1, workers=2)],
+                            on_result=lambda seq, result: delivered.append((seq, result)))
+        for item in range(20):
+            pipeline.submit(item)
+        self.assertTrue(pipeline.join(timeout=5))
+        pipeline.close()
+        self.assertEqual(delivered, [(i, i * 10 + 1) for i in range(20)])
+
+    def test_a_failing_item_is_delivered_as_none_without_holding_back_others(self):
+        delivered = []
+
+        def fail_on_two(item):
+            if item == 2:
+                raise ValueError("bad item")
+            return item
+
+        pipeline = Pipeline([Stage("only", fail_on_two)], on_result=lambda seq, result: delivered.append(result))
+        for item in range(4):
+            pipeline.submit(item)
+        self.assertTrue(pipeline.join(timeout=5))
+        pipeline.close()
+        self.assertEqual(delivered, [0, 1, None, 3])
+
+    def test_pending_weight_counts_undelivered_items(self):
+        release = threading.Event()
+        pipeline = Pipeline([Stage("blocked", lambda item: release.wait(5) and item)], on_result=lambda *_: None)
+        pipeline.submit("a", weight=1600)
+        pipeline.submit("b", weight=800)
+        self.assertEqual(pipeline.pending_weight(), 2400)
+        release.set()
+        self.assertTrue(pipeline.join(timeout=5))
+        self.assertEqual(pipeline.pending_weight(), 0)
+        pipeline.close()
+
+    def test_stats_count_items_per_stage(self):
+        pipeline = Pipeline([Stage("a", lambda x: x), Stage("b", lambda x: x)], on_result=lambda *_: None)
+        for item in range(5):
+            pipeline.submit(item)
+        pipeline.join(timeout=5)
+        pipeline.close()
+        self.assertEqual({name: values["items"] for name, values in pipeline.stats().items()}, {"a": 5, "b": 5})
+
+
+def build_tiny_model(model_dir: str) -> None:
+    """A 2-layer Wav2Vec2ForCTC whose CTC head always prefers the letter "a"."""
+    import torch
+    from transformers import (Wav2Vec2Config, Wav2Vec2CTCTokenizer, Wav2Vec2FeatureExtractor, Wav2Vec2ForCTC,
+                              Wav2Vec2Processor)
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3, "|": 4, "a": 5}
+    vocab_path = os.path.join(model_dir, "vocab.json")
+    with open(vocab_path, "w") as f:
+        json.dump(vocab, f)
+    tokenizer = Wav2Vec2CTCTokenizer(vocab_path, word_delimiter_token="|")
+    extractor = Wav2Vec2FeatureExtractor(feature_size=1, sampling_rate=16000, padding_value=0.0, do_normalize=True)
+    Wav2Vec2Processor(feature_extractor=extractor, tokenizer=tokenizer).save_pretrained(model_dir)
+    extractor.save_pretrained(model_dir)  # preprocessor_config.json, which newer processors no longer write
+    config = Wav2Vec2Config(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                            intermediate_size=64, conv_dim=(32,) * 7, num_conv_pos_embeddings=16)
+    torch.manual_seed(0)
+    model = Wav2Vec2ForCTC(config)
+    with torch.no_grad():
+        model.lm_head.bias.zero_()
+        model.lm_head.bias[vocab["a"]] = 100.0
+    model.save_pretrained(model_dir)
+
+
+class EngineCancellationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model_dir = tempfile.mkdtemp()
+        build_tiny_model(cls.model_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.model_dir, ignore_errors=True)
+
+    def setUp(self):
+        from dictation_engine import DictationEngine
+        self.engine = DictationEngine(self.model_dir)
+        self.engine.load_model()
+        self.speech = (0.3 * np.sin(np.arange(16000) * 0.05)).astype(np.float32)
+
+    def test_cancelled_token_stops_transcribe(self):
+        from dictation_engine import CancellationToken, TranscriptionCancelled
+        self.assertEqual(self.engine.transcribe(self.speech), "a")
+        token = CancellationToken()
+        token.cancel()
+        with self.assertRaises(TranscriptionCancelled):
+            self.engine.transcribe(self.speech, token)
+
+    def test_results_arrive_in_order_of_capture(self):
+        received = []
+        self.engine.add_listener(received.append)
+        self.engine.start(capture=False)
+        for _ in range(5):
+            self.engine.feed(self.speech)
+        self.engine.stop(timeout=10)
+        self.assertEqual([result.text for result in received], ["a"] * 5)
+        captured = [result.captured_at for result in received]
+        self.assertEqual(captured, sorted(captured))
+        self.assertTrue(all(result.session == received[0].session for result in received))
+
+    def test_model_switch_submits_queued_windows_before_the_swap(self):
+        old_model, new_model = self.engine.model, copy.deepcopy(self.engine.model)
+        submitted_under = []
+
+        class RecordingPipeline:
+            def submit(pipeline, item, weight=0):
+                submitted_under.append(self.engine.model)
+
+            def join(pipeline, timeout=None):
+                return True
+
+        self.engine._pipeline = RecordingPipeline()
+        self.engine._batch = [(SimpleNamespace(samples=len(self.speech)), self.speech)]
+        self.engine._pending_model = (self.engine.processor, new_model, self.model_dir)
+        self.engine._apply_pending_model()
+        self.engine._pipeline = None
+        self.assertEqual(submitted_under, [old_model])
+        self.assertEqual(self.engine._batch, [])
+        self.assertIs(self.engine.model, new_model)
+
+    def test_stop_returns_within_its_timeout_and_drops_late_results(self):
+        forward = self.engine._forward
+
+        def slow_forward(input_values):
+            time.sleep(SLOW_FORWARD_SECONDS)
+            return forward(input_values)
+
+        self.engine._forward = slow_forward
+        delivered_at = []
+        self.engine.add_listener(lambda result: delivered_at.append(time.perf_counter()))
+        self.engine.start(capture=False)
+        for _ in range(10):  # About 3 s of decoding at the slowed rate
+            self.engine.feed(self.speech)
+        started = time.perf_counter()
+        self.engine.stop(timeout=STOP_TIMEOUT)
+        stopped = time.perf_counter()
+        self.assertLess(stopped - started, STOP_TIMEOUT + 0.2)
+
+        time.sleep(SLOW_FORWARD_SECONDS * 3)  # Long enough for the cancelled worker to wind down
+        self.assertTrue(all(at <= stopped for at in delivered_at))
+        self.assertLess(len(delivered_at), 10)
+
+        self.engine._forward = forward
+        self.engine.start(capture=False)  # The next session starts once the old worker has exited
+        self.engine.stop(timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Behaviour tests for segmentation.py. Run with: python -m unittest test_segmentation"""
+import unittest
+
+import numpy as np
+
+from segmentation import SILENCE_RMS_THRESHOLD, FixedWindowSegmenter, UtteranceSegmenter, split_at_silences
+
+RATE = 16000
+BLOCK = 1600  # 0.1 s
+
+
+def speech(seconds: float) -> np.ndarray:
+    return (0.3 * np.sin(np.arange(int(seconds * RATE)) * 0.05)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def push_all(segmenter, audio: np.ndarray) -> list:
+    events = []
+    for start in range(0, len(audio), BLOCK):
+        events.extend(segmenter.push(audio[start:start + BLOCK]))
+    return events
+
+
+class UtteranceSegmenterTest(unittest.TestCase):
+    def test_drafts_then_final_at_trailing_silence(self):
+        segmenter = UtteranceSegmenter(RATE, draft_step_samples=RATE // 2, end_silence_seconds=0.6)
+        events = push_all(segmenter, np.concatenate([silence(0.5), speech(1.0), silence(1.0)]))
+        kinds = [kind for kind, _, _ in events]
+        self.assertEqual(kinds.count("final"), 1)
+        self.assertGreaterEqual(kinds.count("draft"), 2)
+        _, audio, start = events[kinds.index("final")]
+        self.assertEqual(start, int(0.5 * RATE))  # Leading silence dropped, position kept
+        self.assertEqual(len(audio), int(1.6 * RATE))  # Speech plus the silence that closed it
+        self.assertTrue(segmenter.between_utterances)
+
+    def test_long_utterance_is_force_closed(self):
+        segmenter = UtteranceSegmenter(RATE, draft_step_samples=RATE, max_utterance_seconds=2.0)
+        finals = [e for e in push_all(segmenter, speech(5.0)) if e[0] == "final"]
+        self.assertEqual([len(audio) for _, audio, _ in finals], [2 * RATE, 2 * RATE])
+        self.assertEqual([start for _, _, start in finals], [0, 2 * RATE])
+
+    def test_silence_only_produces_nothing(self):
+        segmenter = UtteranceSegmenter(RATE, draft_step_samples=RATE // 2)
+        self.assertEqual(push_all(segmenter, silence(3.0)) + segmenter.flush(), [])
+
+
+class FixedWindowSegmenterTest(unittest.TestCase):
+    def test_every_window_is_decoded_by_default(self):
+        segmenter = FixedWindowSegmenter(RATE, min_samples=RATE // 4)
+        audio = np.concatenate([speech(1.0), 0.002 * speech(1.0), speech(1.3)])  # Quiet speech in the middle
+        events = push_all(segmenter, audio) + segmenter.flush()
+        self.assertEqual([(start, len(window)) for _, window, start in events],
+                         [(0, RATE), (RATE, RATE), (2 * RATE, RATE), (3 * RATE, int(0.3 * RATE))])
+
+    def test_opt_in_silence_gate_skips_quiet_windows_and_keeps_positions(self):
+        segmenter = FixedWindowSegmenter(RATE, min_samples=RATE // 4, silence_threshold=SILENCE_RMS_THRESHOLD)
+        audio = np.concatenate([speech(1.0), silence(1.0), speech(1.3)])
+        events = push_all(segmenter, audio) + segmenter.flush()
+        self.assertEqual([(start, len(window)) for _, window, start in events],
+                         [(0, RATE), (2 * RATE, RATE), (3 * RATE, int(0.3 * RATE))])
+
+    def test_short_remainder_below_min_samples_is_dropped(self):
+        segmenter = FixedWindowSegmenter(RATE, min_samples=RATE // 2)
+        push_all(segmenter, speech(1.2))
+        self.assertEqual(segmenter.flush(), [])
+
+
+class SplitAtSilencesTest(unittest.TestCase):
+    def test_cuts_in_the_middle_of_pauses(self):
+        audio = np.concatenate([speech(1.0), silence(1.0), speech(1.0)])
+        ranges = split_at_silences(audio, RATE)
+        self.assertEqual(len(ranges), 2)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[0][1], ranges[1][0])
+        self.assertAlmostEqual(ranges[0][1] / RATE, 1.5, delta=0.05)
+        self.assertEqual(ranges[1][1], len(audio))
+
+    def test_trailing_silence_is_not_added_to_the_last_range(self):
+        audio = np.concatenate([speech(1.0), silence(2.0), np.zeros(100, dtype=np.float32)])
+        ranges = split_at_silences(audio, RATE)
+        self.assertEqual(len(ranges), 1)
+        self.assertLess(ranges[0][1], int(2.5 * RATE))
+
+    def test_long_segments_are_cut(self):
+        ranges = split_at_silences(speech(40.0), RATE, max_segment_seconds=15.0)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], 40 * RATE)
+        self.assertTrue(all(end - start <= 15 * RATE for start, end in ranges))
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(ranges, ranges[1:])))
+
+    def test_silence_gives_no_ranges(self):
+        self.assertEqual(split_at_silences(silence(3.0), RATE), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
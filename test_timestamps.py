@@ -0,0 +1,79 @@
+"""Behaviour tests for timestamps.py. Run with: python -m unittest test_timestamps"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from timestamps import CUE_MAX_WORDS, Word, _timestamp, open_word_writer, words_from_ids
+
+
+class WordsFromIdsTest(unittest.TestCase):
+    def setUp(self):
+        from transformers import Wav2Vec2CTCTokenizer
+        self.directory = tempfile.mkdtemp()
+        vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3, "|": 4, "a": 5, "b": 6}
+        vocab_path = os.path.join(self.directory, "vocab.json")
+        with open(vocab_path, "w") as f:
+            json.dump(vocab, f)
+        self.tokenizer = Wav2Vec2CTCTokenizer(vocab_path, word_delimiter_token="|")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_word_times_come_from_frames_plus_offset(self):
+        # Frames: a a <pad> b | | b a <pad>  ->  "ab" at frames 0-4, "ba" at frames 6-8
+        ids = [5, 5, 0, 6, 4, 4, 6, 5, 0]
+        text, words = words_from_ids(self.tokenizer, ids, offset_seconds=10.0, seconds_per_frame=0.02)
+        self.assertEqual(text, "ab ba")
+        self.assertEqual([w.text for w in words], ["ab", "ba"])
+        self.assertEqual((words[0].start, words[0].end), (10.0, 10.08))
+        self.assertEqual((words[1].start, words[1].end), (10.12, 10.16))
+
+
+class WordWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write(self, name, words):
+        path = os.path.join(self.directory, name)
+        writer = open_word_writer(path)
+        writer.add(words)
+        writer.close()
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_timestamp_formats(self):
+        self.assertEqual(_timestamp(3723.4567, ","), "01:02:03,457")
+        self.assertEqual(_timestamp(0.0, "."), "00:00:00.000")
+
+    def test_srt_cues_split_at_pauses(self):
+        words = [Word("one", 0.0, 0.4), Word("two", 0.5, 0.9), Word("three", 3.0, 3.5)]
+        self.assertEqual(self._write("out.srt", words),
+                         "1\n00:00:00,000 --> 00:00:00,900\none two\n\n"
+                         "2\n00:00:03,000 --> 00:00:03,500\nthree\n\n")
+
+    def test_vtt_cues_hold_at_most_cue_max_words(self):
+        words = [Word(f"w{i}", i * 0.1, i * 0.1 + 0.05) for i in range(CUE_MAX_WORDS + 1)]
+        vtt = self._write("out.vtt", words)
+        self.assertTrue(vtt.startswith("WEBVTT\n\n"))
+        cues = [block for block in vtt.split("\n\n")[1:] if block]
+        self.assertEqual(len(cues), 2)
+        self.assertEqual(cues[1].split("\n")[1], f"w{CUE_MAX_WORDS}")
+
+    def test_json_is_a_valid_word_array(self):
+        words = [Word("ދިވެހި", 0.0, 0.5), Word("ބަސް", 0.6, 1.0)]
+        self.assertEqual(json.loads(self._write("out.json", words)),
+                         [{"text": "ދިވެހި", "start": 0.0, "end": 0.5}, {"text": "ބަސް", "start": 0.6, "end": 1.0}])
+
+    def test_unknown_extension_is_rejected(self):
+        with self.assertRaises(ValueError):
+            open_word_writer(os.path.join(self.directory, "out.txt"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "out.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
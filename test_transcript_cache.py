@@ -0,0 +1,79 @@
+"""Behaviour tests for transcript_cache.py. Run with: python -m unittest test_transcript_cache"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from transcript_cache import TranscriptCache, parse_option
+
+
+class TranscriptCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = TranscriptCache(os.path.join(self.directory, "cache"))
+        self.audio = np.linspace(-0.5, 0.5, 16000, dtype=np.float32)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_key_depends_on_audio_and_model(self):
+        key = TranscriptCache.key(self.audio, "model-a")
+        self.assertEqual(key, TranscriptCache.key(self.audio.copy(), "model-a"))
+        self.assertNotEqual(key, TranscriptCache.key(self.audio, "model-b"))
+        self.assertNotEqual(key, TranscriptCache.key(self.audio[:-1], "model-a"))
+
+    def test_model_key_changes_with_the_weights(self):
+        model_dir = os.path.join(self.directory, "model")
+        os.makedirs(model_dir)
+        with open(os.path.join(model_dir, "config.json"), "w") as f:
+            f.write("{}")
+        with open(os.path.join(model_dir, "model.safetensors"), "wb") as f:
+            f.write(b"weights-1")
+        first = self.cache.model_key(model_dir)
+        self.assertEqual(first, self.cache.model_key(model_dir))
+        with open(os.path.join(model_dir, "model.safetensors"), "wb") as f:
+            f.write(b"weights-22")
+        self.assertNotEqual(first, self.cache.model_key(model_dir))
+
+    def test_text_is_cached_per_decoder_setting(self):
+        key = TranscriptCache.key(self.audio, "model")
+        self.assertIsNone(self.cache.get_text(key, "default"))
+        self.cache.put_text(key, "default", "ދިވެހި")
+        self.cache.put_text(key, "skip_special_tokens=True", "other")
+        self.assertEqual(self.cache.get_text(key, "default"), "ދިވެހި")
+        self.assertEqual(self.cache.get_text(key, "skip_special_tokens=True"), "other")
+
+    def test_logits_round_trip_as_float16(self):
+        key = TranscriptCache.key(self.audio, "model")
+        self.assertIsNone(self.cache.get_logits(key))
+        logits = np.random.default_rng(0).standard_normal((1, 49, 32)).astype(np.float32)
+        self.cache.put_logits(key, logits)
+        cached = self.cache.get_logits(key)
+        self.assertEqual(cached.dtype, np.float32)
+        np.testing.assert_allclose(cached, logits, atol=1e-2)
+        self.assertEqual(self.cache.stats()["logits_hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_eviction_drops_least_recently_used_first(self):
+        keys = [TranscriptCache.key(self.audio + i, "model") for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.put_logits(key, np.full((1, 200, 32), i, dtype=np.float32))
+            os.utime(self.cache._path(key, ".npz"), (time.time() - 100 + i, time.time() - 100 + i))
+        self.cache.get_logits(keys[0])  # Refreshes the oldest entry
+        entry_bytes = max(size for _, size, _ in self.cache._entries())
+        self.cache.max_bytes = int(entry_bytes * 2.5)
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertIsNone(self.cache.get_logits(keys[1]))
+        self.assertIsNotNone(self.cache.get_logits(keys[0]))
+        self.assertIsNotNone(self.cache.get_logits(keys[2]))
+
+    def test_parse_option_converts_values(self):
+        self.assertEqual(parse_option("skip_special_tokens=true"), ("skip_special_tokens", True))
+        self.assertEqual(parse_option("beam_width=4"), ("beam_width", 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
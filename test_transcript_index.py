@@ -0,0 +1,66 @@
+"""Behaviour tests for transcript_index.py. Run with: python -m unittest test_transcript_index"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from transcript_index import TranscriptIndex, tokenize
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_thaana_words_keep_their_vowel_signs(self):
+        self.assertEqual(tokenize("ދިވެހި ބަސް"), ["ދިވެހި", "ބަސް"])
+
+    def test_arabic_punctuation_and_zero_width_characters_separate_or_vanish(self):
+        self.assertEqual(tokenize("ދިވެހި،ބަސް؟ Hello\u200bWorld"), ["ދިވެހި", "ބަސް", "helloworld"])
+
+
+class TranscriptIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = TranscriptIndex(os.path.join(self.directory, "index", "transcripts.sqlite3"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write(self, name: str, text: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_phrase_search_needs_consecutive_terms(self):
+        self._write("a.txt", "first line\nދިވެހި ބަސް ލިޔުން")
+        self._write("b.txt", "ބަސް ދިވެހި")
+        self.assertEqual(self.index.add_paths([self.directory]), 2)
+        hits = self.index.search("ދިވެހި ބަސް")
+        self.assertEqual([(os.path.basename(hit.path), hit.paragraph) for hit in hits], [("a.txt", 2)])
+        self.assertEqual(len(self.index.search("ބަސް")), 2)
+        self.assertEqual(self.index.search("missing"), [])
+
+    def test_documents_with_more_matches_rank_first(self):
+        self._write("once.txt", "word")
+        self._write("twice.txt", "word\nword")
+        self.index.add_paths([self.directory])
+        self.assertEqual(os.path.basename(self.index.search("word")[0].path), "twice.txt")
+
+    def test_unchanged_files_are_not_reindexed(self):
+        path = self._write("a.txt", "hello")
+        self.assertTrue(self.index.add_file(path))
+        self.assertFalse(self.index.add_file(path))
+
+    def test_refresh_picks_up_edits_and_deletions(self):
+        kept = self._write("kept.txt", "old text")
+        gone = self._write("gone.txt", "old text")
+        self.index.add_paths([kept, gone])
+        self._write("kept.txt", "new words here")
+        os.remove(gone)
+        self.assertEqual(self.index.refresh(), (1, 1))
+        self.assertEqual(self.index.search("old"), [])
+        self.assertEqual(len(self.index.search("new words")), 1)
+        self.assertEqual(self.index.stats()["documents"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Behaviour tests for transcript_journal.py. Run with: python -m unittest test_transcript_journal"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from transcript_journal import TranscriptJournal, read_segments, write_txt
+
+
+class TranscriptJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "journal", "transcript.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_segments_are_read_back_in_order(self):
+        journal = TranscriptJournal(self.path)
+        for text in ["ދިވެހި", "ބަސް", "three"]:
+            journal.append(text)
+        journal.close()
+        self.assertEqual(list(read_segments(self.path)), ["ދިވެހި", "ބަސް", "three"])
+
+    def test_torn_last_line_is_skipped_and_terminated(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write('{"ts": 1, "text": "kept"}\n{"ts": 2, "te')
+        journal = TranscriptJournal(self.path)
+        self.assertTrue(journal.has_unsaved)  # Left over from a session that did not end cleanly
+        journal.append("after")
+        journal.close()
+        self.assertEqual(list(read_segments(self.path)), ["kept", "after"])
+
+    def test_discard_through_keeps_segments_after_the_mark(self):
+        journal = TranscriptJournal(self.path)
+        journal.append("a")
+        journal.append("b")
+        saved = journal.mark()
+        journal.append("c")
+        journal.discard_through(saved)
+        self.assertTrue(journal.has_unsaved)
+        self.assertTrue(journal.sync())
+        self.assertEqual(list(read_segments(self.path)), ["c"])
+        journal.close()
+
+    def test_marks_stay_valid_after_an_earlier_discard(self):
+        journal = TranscriptJournal(self.path)
+        journal.append("a")
+        first = journal.mark()
+        journal.append("b")
+        second = journal.mark()
+        journal.append("unsaved")
+        journal.discard_through(first)
+        journal.discard_through(second)
+        self.assertTrue(journal.sync())
+        self.assertEqual(list(read_segments(self.path)), ["unsaved"])
+        journal.discard_through(first)  # Out of order: nothing left before it
+        journal.reset()
+        journal.append("after reset")
+        self.assertTrue(journal.sync())
+        self.assertEqual(list(read_segments(self.path)), ["after reset"])
+        journal.close()
+
+    def test_reset_empties_the_journal(self):
+        journal = TranscriptJournal(self.path)
+        journal.append("a")
+        journal.reset()
+        self.assertFalse(journal.has_unsaved)
+        journal.close()
+        self.assertEqual(list(read_segments(self.path)), [])
+        reopened = TranscriptJournal(self.path)
+        self.assertFalse(reopened.has_unsaved)
+        reopened.close()
+
+    def test_write_txt_joins_segments(self):
+        target = os.path.join(self.directory, "out.txt")
+        write_txt(iter(["one", "two"]), target)
+        with open(target, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "one two")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Word timestamps from CTC frames, and streaming SRT/VTT/JSON writers.
+
+Each logits frame covers ``model.config.inputs_to_logits_ratio`` input samples
+(320 samples = 20 ms at 16 kHz). ``words_from_ids`` takes the frame span of every
+word from the tokenizer's word offsets and adds the segment's global start time.
+Timing therefore comes with the normal transcription, without a separate alignment
+pass.
+
+The writers take words as they are transcribed. The subtitle writers group words
+into cues and write each cue as soon as it is complete.
+
+Usage: python timestamps.py recording.wav [--srt out.srt] [--vtt out.vtt] [--json out.json]
+       [--window-seconds 30 --attention-context-seconds 2] [--profile]
+"""
+import argparse
+import json
+import sys
+from dataclasses import asdict, dataclass
+from typing import List
+
+CUE_MAX_WORDS = 8          # Words per subtitle cue
+CUE_MAX_SECONDS = 5.0      # Longest cue
+CUE_MAX_GAP_SECONDS = 1.0  # A longer pause between words starts a new cue
+WORD_FILE_EXTENSIONS = (".srt", ".vtt", ".json")
+
+
+@dataclass
+class Word:
+    text: str
+    start: float  # Seconds from the start of the audio stream
+    end: float
+
+
+def frame_seconds(model, sampling_rate: int) -> float:
+    return model.config.inputs_to_logits_ratio / sampling_rate
+
+
+def words_from_ids(processor, predicted_ids, offset_seconds: float, seconds_per_frame: float,
+                   **decode_options):
+    """Decodes CTC ids into ``(text, words)``; word times are offset by ``offset_seconds``."""
+    output = processor.decode(predicted_ids, output_word_offsets=True, **decode_options)
+    words = [Word(item["word"],
+                  round(offset_seconds + int(item["start_offset"]) * seconds_per_frame, 3),
+                  round(offset_seconds + int(item["end_offset"]) * seconds_per_frame, 3))
+             for item in output.word_offsets]
+    return output.text.strip(), words
+
+
+def _timestamp(seconds: float, decimal_mark: str) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal_mark}{millis:03d}"
+
+
+class SubtitleWriter:
+    """Writes SRT or WebVTT cues as words arrive; ``close`` writes the last cue."""
+
+    def __init__(self, filename: str, subtitle_format: str = "srt") -> None:
+        if subtitle_format not in ("srt", "vtt"):
+            raise ValueError(f"Unknown subtitle format '{subtitle_format}'.")
+        self.subtitle_format = subtitle_format
+        self._file = open(filename, "w", encoding="utf-8")
+        self._cue: List[Word] = []
+        self._cues_written = 0
+        if subtitle_format == "vtt":
+            self._file.write("WEBVTT\n\n")
+
+    def add(self, words: List[Word]) -> None:
+        for word in words:
+            if self._cue and (len(self._cue) >= CUE_MAX_WORDS
+                              or word.end - self._cue[0].start > CUE_MAX_SECONDS
+                              or word.start - self._cue[-1].end > CUE_MAX_GAP_SECONDS):
+                self._write_cue()
+            self._cue.append(word)
+        self._file.flush()
+
+    def _write_cue(self) -> None:
+        self._cues_written += 1
+        decimal_mark = "," if self.subtitle_format == "srt" else "."
+        if self.subtitle_format == "srt":
+            self._file.write(f"{self._cues_written}\n")
+        self._file.write(f"{_timestamp(self._cue[0].start, decimal_mark)} --> "
+                         f"{_timestamp(self._cue[-1].end, decimal_mark)}\n")
+        self._file.write(" ".join(word.text for word in self._cue) + "\n\n")
+        self._cue = []
+
+    def close(self) -> None:
+        if self._cue:
+            self._write_cue()
+        self._file.close()
+
+
+class JsonWordWriter:
+    """Writes a JSON array of ``{"text", "start", "end"}`` words, one per line, as they arrive."""
+
+    def __init__(self, filename: str) -> None:
+        self._file = open(filename, "w", encoding="utf-8")
+        self._file.write("[")
+        self._count = 0
+
+    def add(self, words: List[Word]) -> None:
+        for word in words:
+            self._file.write(("," if self._count else "") + "\n" + json.dumps(asdict(word), ensure_ascii=False))
+            self._count += 1
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.write("\n]\n")
+        self._file.close()
+
+
+def open_word_writer(filename: str):
+    """Picks the writer from the file extension: .srt, .vtt or .json."""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if "." + extension not in WORD_FILE_EXTENSIONS:
+        raise ValueError(f"Unknown word timestamp format '{filename}'; use .srt, .vtt or .json.")
+    if extension == "json":
+        return JsonWordWriter(filename)
+    return SubtitleWriter(filename, extension)
+
+
+def main() -> int:
+    import soundfile as sf
+    from dictation_engine import DictationEngine, MODEL_SAMPLING_RATE, MODEL_PROCESS_CHUNK_SIZE_SAMPLES
+    from profiling import DEFAULT_PROFILE_SECONDS, add_profile_argument, profile_run
+
+    parser = argparse.ArgumentParser(description="Transcribe a recording with word timestamps.")
+    parser.add_argument("audio", help="16 kHz mono recording")
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--srt")
+    parser.add_argument("--vtt")
+    parser.add_argument("--json")
+    parser.add_argument("--window-seconds", type=float, default=MODEL_PROCESS_CHUNK_SIZE_SAMPLES / MODEL_SAMPLING_RATE,
+                        help="Audio per model call; long windows (20-30 s) want --attention-context-seconds")
+    parser.add_argument("--attention-context-seconds", type=float, default=None,
+                        help="Use block-local attention with this much context (see local_attention.py)")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    audio, rate = sf.read(args.audio, dtype="float32")
+    if rate != MODEL_SAMPLING_RATE:
+        print(f"Expected {MODEL_SAMPLING_RATE} Hz audio, got {rate} Hz", file=sys.stderr)
+        return 1
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    writers = [open_word_writer(name) for name in (args.srt, args.vtt, args.json) if name]
+    engine = DictationEngine(args.model_dir, attention_context_seconds=args.attention_context_seconds)
+    engine.chunk_samples = window_samples = int(args.window_seconds * MODEL_SAMPLING_RATE)
+    engine.load_model()
+    try:
+        with profile_run(args.profile is not None, args.profile or DEFAULT_PROFILE_SECONDS):
+            # Chunk by chunk, so the writers receive words as the recording is transcribed
+            for start in range(0, len(audio), window_samples):
+                chunk = audio[start:start + window_samples]
+                text, words = engine.transcribe_words(chunk, start / MODEL_SAMPLING_RATE)
+                if text:
+                    print(text)
+                for writer in writers:
+                    writer.add(words)
+    finally:
+        for writer in writers:
+            writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
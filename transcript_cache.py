@@ -0,0 +1,291 @@
+"""
+Content-addressed on-disk cache of CTC logits and transcripts.
+
+Entries are keyed by a hash of the model and the audio segment. Each entry stores
+the segment's logits (float16, compressed ``.npz``) plus the text decoded from them,
+once per decoder setting. Re-running a recording with the same model and decoder
+settings reads the text back. After a decoder-only change it re-decodes the cached
+logits without running the acoustic model.
+
+The cache is bounded by ``max_bytes``. Entries are evicted least recently used
+first, using each entry's mtime, which is refreshed on every hit.
+
+Usage:
+    python transcript_cache.py recording.wav [more.wav ...] [--cache-dir ./transcript_cache]
+                               [--max-mb 512] [--decode-option skip_special_tokens=true]
+    python transcript_cache.py --clear
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = "./transcript_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+EVICT_TO_FRACTION = 0.9          # Evict down to this share of max_bytes, so eviction is not run on every store
+FINGERPRINTS_NAME = "model_fingerprints.json"
+MODEL_FILES = ["config.json", "pytorch_model.bin", "model.safetensors"]
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.text_hits = 0
+        self.logits_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    # --- Keys ---
+
+    def model_key(self, model_dir: str, model=None) -> str:
+        """
+        Hash of a local model's config and weight files, memoized per (path, size, mtime)
+        so the weights are only read once. For a hub id, hashes the id and loaded config.
+        """
+        digest = hashlib.sha256()
+        if not os.path.isdir(model_dir):
+            digest.update(model_dir.encode("utf-8"))
+            if model is not None:
+                digest.update(model.config.to_json_string().encode("utf-8"))
+            return digest.hexdigest()
+
+        fingerprints_path = os.path.join(self.cache_dir, FINGERPRINTS_NAME)
+        try:
+            with open(fingerprints_path, encoding="utf-8") as f:
+                fingerprints = json.load(f)
+        except (OSError, ValueError):
+            fingerprints = {}
+        changed = False
+        for name in MODEL_FILES:
+            path = os.path.abspath(os.path.join(model_dir, name))
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            signature = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+            if signature not in fingerprints:
+                file_digest = hashlib.sha256()
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        file_digest.update(block)
+                fingerprints[signature] = file_digest.hexdigest()
+                changed = True
+            digest.update(f"{name}:{fingerprints[signature]}".encode("utf-8"))
+        if changed:
+            self._write_atomic(fingerprints_path, json.dumps(fingerprints, indent=1).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(audio: np.ndarray, model_key: str, sampling_rate: int = 16000) -> str:
+        digest = hashlib.sha256(f"{model_key}:{sampling_rate}:".encode("utf-8"))
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    # --- Entries ---
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def _touch(self, key: str) -> None:
+        try:
+            os.utime(self._path(key, ".npz"))
+        except OSError:
+            pass
+
+    def get_text(self, key: str, decoder_key: str) -> Optional[str]:
+        """Cached text for these decoder settings, or None."""
+        try:
+            with open(self._path(key, ".json"), encoding="utf-8") as f:
+                text = json.load(f).get(decoder_key)
+        except (OSError, ValueError):
+            text = None
+        if text is not None:
+            self._touch(key)
+            with self._lock:
+                self.text_hits += 1
+        return text
+
+    def get_logits(self, key: str) -> Optional[np.ndarray]:
+        """Cached logits (float32, shape ``(1, frames, vocab)``), or None; counts a miss."""
+        try:
+            with np.load(self._path(key, ".npz")) as data:
+                logits = data["logits"].astype(np.float32)
+        except (OSError, KeyError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        self._touch(key)
+        with self._lock:
+            self.logits_hits += 1
+        return logits
+
+    def put_logits(self, key: str, logits: np.ndarray) -> None:
+        path = self._path(key, ".npz")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, logits=np.asarray(logits, dtype=np.float16))
+        self._replace(tmp_path, path)
+
+    def put_text(self, key: str, decoder_key: str, text: str) -> None:
+        path = self._path(key, ".json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                texts = json.load(f)
+        except (OSError, ValueError):
+            texts = {}
+        texts[decoder_key] = text
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_atomic(path, json.dumps(texts, ensure_ascii=False).encode("utf-8"), count=True)
+
+    def _write_atomic(self, path: str, data: bytes, count: bool = False) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if count:
+            self._replace(tmp_path, path)
+        else:
+            os.replace(tmp_path, path)
+
+    def _replace(self, tmp_path: str, path: str) -> None:
+        """Moves a finished file into place, tracking the cache size and evicting if needed."""
+        added = os.path.getsize(tmp_path) - (os.path.getsize(path) if os.path.exists(path) else 0)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes += added
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _entries(self):
+        """Yields (key, bytes, last_used) for every entry."""
+        for prefix in os.listdir(self.cache_dir):
+            directory = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            sizes: Dict[str, int] = {}
+            last_used: Dict[str, float] = {}
+            for name in os.listdir(directory):
+                key, ext = os.path.splitext(name)
+                if ext not in (".npz", ".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                sizes[key] = sizes.get(key, 0) + stat.st_size
+                if ext == ".npz":
+                    last_used[key] = stat.st_mtime
+            for key, size in sizes.items():
+                yield key, size, last_used.get(key, 0.0)
+
+    def evict(self) -> int:
+        """Removes least recently used entries until the cache is under budget; returns how many."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        removed = 0
+        for key, size, _ in entries:
+            if total <= target:
+                break
+            for suffix in (".npz", ".json"):
+                try:
+                    os.remove(self._path(key, suffix))
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._total_bytes = total
+        if removed:
+            logger.info(f"Transcript cache evicted {removed} entries, {total / 1024 / 1024:.1f} MB left.")
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            requests = self.text_hits + self.logits_hits + self.misses
+            return {
+                "requests": requests,
+                "text_hits": self.text_hits,
+                "logits_hits": self.logits_hits,
+                "misses": self.misses,
+                "hit_rate": (self.text_hits + self.logits_hits) / requests if requests else 0.0,
+                "size_mb": self._total_bytes / 1024 / 1024,
+            }
+
+
+def format_stats(stats: Dict[str, float]) -> str:
+    return (f"{stats['requests']} segments: {stats['text_hits']} text hits, {stats['logits_hits']} re-decoded "
+            f"from cached logits, {stats['misses']} misses (hit rate {stats['hit_rate']:.0%}), "
+            f"cache {stats['size_mb']:.1f} MB")
+
+
+def parse_option(option: str):
+    """Splits a ``NAME=VALUE`` decoder option; VALUE is read as JSON where it parses, else kept as text."""
+    name, _, value = option.partition("=")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def main() -> int:
+    from profiling import DEFAULT_PROFILE_SECONDS, add_profile_argument, profile_run
+
+    parser = argparse.ArgumentParser(description="Transcribe recordings through the logits/transcript cache.")
+    parser.add_argument("audio", nargs="*", help="16 kHz mono recordings")
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024)
+    parser.add_argument("--decode-option", action="append", default=[], metavar="NAME=VALUE",
+                        help="Keyword argument for processor.decode, e.g. skip_special_tokens=false")
+    parser.add_argument("--clear", action="store_true", help="Empty the cache first")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    cache = TranscriptCache(args.cache_dir, int(args.max_mb * 1024 * 1024))
+    if args.clear:
+        cache.clear()
+    if not args.audio:
+        return 0
+
+    import soundfile as sf
+    from dictation_engine import DictationEngine, MODEL_SAMPLING_RATE
+
+    engine = DictationEngine(args.model_dir, cache=cache)
+    engine.decode_options = dict(parse_option(option) for option in args.decode_option)
+    engine.load_model()
+    started = time.perf_counter()
+    with profile_run(args.profile is not None, args.profile or DEFAULT_PROFILE_SECONDS):
+        for path in args.audio:
+            audio, rate = sf.read(path, dtype="float32")
+            if rate != MODEL_SAMPLING_RATE:
+                print(f"{path}: expected {MODEL_SAMPLING_RATE} Hz audio, got {rate} Hz", file=sys.stderr)
+                return 1
+            print(f"{path}: {engine.transcribe(audio)}")
+    print(f"{format_stats(cache.stats())} in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Full-text search over saved transcripts (.txt and .docx).
+
+An inverted index is kept in SQLite (``index/transcripts.sqlite3``). Each document is
+stored with its mtime and size, its paragraphs (for showing hits), and one postings
+row per distinct term. A postings row holds the term's token positions as a packed
+array. Saving from the editor re-indexes only that file. ``refresh`` re-reads only
+files whose mtime or size changed and drops deleted ones. A phrase query reads the
+postings of its terms, rarest first, and keeps documents where the terms appear at
+consecutive positions. That is a few primary-key lookups, so queries take
+milliseconds however many transcripts there are.
+
+Dhivehi text needs its own tokenizer. Thaana vowel signs (fili, U+07A6-U+07B0) are
+combining marks, and ``\\w`` does not match them, so a plain word regex would cut
+every Thaana word apart at each vowel. Text is NFC-normalized, zero-width
+characters are removed, Latin is case-folded, and words are runs of letters, digits
+and combining marks. Arabic punctuation (، ؛ ؟) separates words like any other
+punctuation.
+
+Usage:
+    python transcript_index.py add transcripts/ more.docx [...]
+    python transcript_index.py search "ދިވެހި ބަސް" [--limit 20]
+    python transcript_index.py refresh
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_INDEX_PATH = os.path.join("index", "transcripts.sqlite3")
+EXTENSIONS = (".txt", ".docx")
+SNIPPET_CHARS = 120
+
+# Letters/digits plus combining marks (Thaana fili and sukun, Latin accents)
+_TOKEN_RE = re.compile(r"[\w\u0300-\u036F\u0610-\u061A\u064B-\u065F\u07A6-\u07B0]+")
+_ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    paragraphs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_doc ON postings (doc_id);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text).translate(_ZERO_WIDTH).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def read_paragraphs(path: str) -> List[str]:
+    if path.lower().endswith(".docx"):
+        from docx import Document
+        return [paragraph.text for paragraph in Document(path).paragraphs]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read().split("\n")
+
+
+class SearchHit(NamedTuple):
+    path: str
+    saved_at: float     # The file's mtime when it was indexed
+    paragraph: int      # 1-based
+    snippet: str
+
+
+class TranscriptIndex:
+    """Thread-safe; the GUI indexes on export threads and searches on the Tk thread."""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # --- Indexing ---
+
+    def add_file(self, path: str, paragraphs: Optional[List[str]] = None) -> bool:
+        """
+        Indexes ``path`` unless it is unchanged since it was last indexed. ``paragraphs``
+        can be passed when the caller just wrote them, to skip reading the file back.
+        Returns whether the file was (re)indexed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._db.execute("SELECT mtime, size FROM documents WHERE path = ?", (path,)).fetchone()
+        if row and row == (stat.st_mtime, stat.st_size):
+            return False
+        if paragraphs is None:
+            paragraphs = read_paragraphs(path)
+        positions: Dict[str, array] = {}
+        for position, term in enumerate(tokenize("\n".join(paragraphs))):
+            positions.setdefault(term, array("I")).append(position)
+        with self._lock, self._db:
+            self._delete(path)
+            doc_id = self._db.execute(
+                "INSERT INTO documents (path, mtime, size, paragraphs) VALUES (?, ?, ?, ?)",
+                (path, stat.st_mtime, stat.st_size, "\n".join(paragraphs))).lastrowid
+            self._db.executemany("INSERT INTO postings (term, doc_id, positions) VALUES (?, ?, ?)",
+                                 ((term, doc_id, p.tobytes()) for term, p in positions.items()))
+        return True
+
+    def add_paths(self, paths: Iterable[str]) -> int:
+        """Indexes files and the .txt/.docx files under directories; returns how many changed."""
+        changed = 0
+        for path in paths:
+            if os.path.isdir(path):
+                files = [os.path.join(folder, name) for folder, _, names in os.walk(path)
+                         for name in names if name.lower().endswith(EXTENSIONS) and not name.startswith("~$")]
+            else:
+                files = [path]
+            for file in files:
+                try:
+                    changed += self.add_file(file)
+                except Exception as e:
+                    logger.warning(f"Could not index '{file}': {e}")
+        return changed
+
+    def refresh(self) -> Tuple[int, int]:
+        """Re-indexes changed documents and drops deleted ones; returns (updated, removed)."""
+        with self._lock:
+            known = self._db.execute("SELECT path FROM documents").fetchall()
+        updated = removed = 0
+        for (path,) in known:
+            if not os.path.exists(path):
+                with self._lock, self._db:
+                    self._delete(path)
+                removed += 1
+                continue
+            try:
+                updated += self.add_file(path)
+            except Exception as e:
+                logger.warning(f"Could not re-index '{path}': {e}")
+        return updated, removed
+
+    def _delete(self, path: str) -> None:
+        row = self._db.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM postings WHERE doc_id = ?", row)
+            self._db.execute("DELETE FROM documents WHERE id = ?", row)
+
+    # --- Queries ---
+
+    def search(self, query: str, limit: int = 50) -> List[SearchHit]:
+        """Documents containing ``query`` as a phrase, most matches first, one hit per matching paragraph."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            postings = {}
+            for term in set(terms):
+                rows = self._db.execute("SELECT doc_id, positions FROM postings WHERE term = ?", (term,)).fetchall()
+                if not rows:
+                    return []
+                postings[term] = dict(rows)
+            # Intersect from the rarest term so the candidate set shrinks fastest
+            candidates = None
+            for term in sorted(postings, key=lambda t: len(postings[t])):
+                docs = postings[term].keys()
+                candidates = set(docs) if candidates is None else candidates & docs
+            matches = []
+            for doc_id in candidates:
+                starts = _phrase_starts([_positions(postings[term][doc_id]) for term in terms])
+                if starts:
+                    matches.append((doc_id, starts))
+            documents = {}
+            for doc_id, _ in matches:
+                documents[doc_id] = self._db.execute(
+                    "SELECT path, mtime, paragraphs FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        matches.sort(key=lambda match: (-len(match[1]), -documents[match[0]][1]))
+        hits = []
+        for doc_id, starts in matches:
+            path, mtime, text = documents[doc_id]
+            for paragraph_index, paragraph in _paragraphs_at(text.split("\n"), starts):
+                hits.append(SearchHit(path, mtime, paragraph_index + 1, _snippet(paragraph, terms)))
+                if len(hits) >= limit:
+                    return hits
+        return hits
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            documents, = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()
+            terms, = self._db.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()
+        return {"documents": documents, "terms": terms}
+
+
+def _positions(blob: bytes) -> array:
+    positions = array("I")
+    positions.frombytes(blob)
+    return positions
+
+
+def _phrase_starts(positions: List[array]) -> List[int]:
+    """Token positions where term i of the phrase sits at start + i for every i."""
+    later = [set(p) for p in positions[1:]]
+    return [start for start in positions[0]
+            if all(start + offset in following for offset, following in enumerate(later, 1))]
+
+
+def _paragraphs_at(paragraphs: List[str], starts: List[int]) -> Iterable[Tuple[int, str]]:
+    """The paragraphs containing the given token positions, each once, in order."""
+    wanted = iter(sorted(starts))
+    target = next(wanted)
+    seen = 0
+    for index, paragraph in enumerate(paragraphs):
+        seen += len(tokenize(paragraph))
+        if target < seen:
+            yield index, paragraph
+            for target in wanted:
+                if target >= seen:
+                    break
+            else:
+                return
+
+
+def _snippet(paragraph: str, terms: List[str]) -> str:
+    paragraph = " ".join(paragraph.split())
+    if len(paragraph) <= SNIPPET_CHARS:
+        return paragraph
+    at = max(0, normalize(paragraph).find(terms[0]) - SNIPPET_CHARS // 3)
+    return ("..." if at else "") + paragraph[at:at + SNIPPET_CHARS] + "..."
+
+
+def format_hit(hit: SearchHit) -> str:
+    saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit.saved_at))
+    return f"{hit.path} [{saved}] ¶{hit.paragraph}: {hit.snippet}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Index and search saved transcripts.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Index .txt/.docx files and directories")
+    add.add_argument("paths", nargs="+")
+    search = commands.add_parser("search", help="Find a word or phrase")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    commands.add_parser("refresh", help="Re-index changed files and drop deleted ones")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    index = TranscriptIndex(args.index)
+    try:
+        started = time.perf_counter()
+        if args.command == "add":
+            changed = index.add_paths(args.paths)
+            print(f"Indexed {changed} changed files in {time.perf_counter() - started:.2f}s ({index.stats()}).")
+        elif args.command == "refresh":
+            updated, removed = index.refresh()
+            print(f"{updated} re-indexed, {removed} removed in {time.perf_counter() - started:.2f}s.")
+        else:
+            hits = index.search(args.query, args.limit)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            for hit in hits:
+                print(format_hit(hit))
+            print(f"{len(hits)} hits in {elapsed_ms:.1f} ms.", file=sys.stderr)
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Crash-safe, append-only journal of dictated transcript segments.
+
+Every committed segment is handed to ``TranscriptJournal.append``, which only queues
+it. A background writer appends one JSON line per segment and calls ``fsync`` at most
+once per ``JOURNAL_FSYNC_INTERVAL_SECONDS``, so a crash loses at most about a second
+of dictation. A torn final line left by a crash is skipped when the journal is read.
+
+Once the text has been saved elsewhere, the journal is emptied up to a ``mark`` taken
+when the text was snapshotted (``discard_through``). Segments dictated while the save
+was running stay journaled. The app also resets it on a clean exit, so a journal with
+content at startup means the previous session did not end cleanly.
+
+The export helpers stream segments from the journal to ``.txt``/``.docx`` and are
+meant to run off the UI thread (see ``export_in_background``).
+
+Usage: python transcript_journal.py JOURNAL OUTPUT(.txt|.docx)
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from queue import Queue, Empty
+from typing import Callable, Iterable, Iterator
+
+JOURNAL_PATH = os.path.join("journal", "transcript.jsonl")
+JOURNAL_FSYNC_INTERVAL_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+_RESET = object()
+_CLOSE = object()
+_DISCARD = object()
+
+
+class JournalMark:
+    """A position in the journal, filled in by the writer; see ``TranscriptJournal.mark``."""
+
+    def __init__(self, appended: int) -> None:
+        self.appended = appended  # Segments appended before the mark
+        self.offset = 0  # Bytes ever written before the mark, including ones since discarded
+
+
+class TranscriptJournal:
+    """Append-only segment journal with a background writer and batched fsync."""
+
+    def __init__(self, path: str = JOURNAL_PATH,
+                 fsync_interval: float = JOURNAL_FSYNC_INTERVAL_SECONDS) -> None:
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._queue: Queue = Queue()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not _ends_with_newline(path):
+            self._file.write("\n")  # Terminate a line torn by a crash so new records stay readable
+        self._counts_lock = threading.Lock()
+        self._appended = 1 if self._file.tell() else 0  # Left over from a session that did not end cleanly
+        self._discarded = 0
+        self._trimmed_bytes = 0  # Dropped from the front of the file since it was opened; writer thread only
+        self._writer = threading.Thread(target=self._writer_loop, name="TranscriptJournalWriter", daemon=True)
+        self._writer.start()
+
+    def append(self, text: str) -> None:
+        """Queues a committed segment. Never blocks on disk I/O."""
+        with self._counts_lock:
+            self._appended += 1
+            self._queue.put({"ts": time.time(), "text": text})
+
+    @property
+    def has_unsaved(self) -> bool:
+        """Whether segments were appended since the last reset or saved mark."""
+        with self._counts_lock:
+            return self._appended > self._discarded
+
+    def mark(self) -> JournalMark:
+        """Marks everything appended so far, to pass to ``discard_through`` once it has been saved."""
+        with self._counts_lock:
+            mark = JournalMark(self._appended)
+            self._queue.put(mark)
+        return mark
+
+    def discard_through(self, mark: JournalMark) -> None:
+        """Drops the segments before ``mark``; later ones stay journaled."""
+        with self._counts_lock:
+            self._discarded = max(self._discarded, mark.appended)
+        self._queue.put((_DISCARD, mark))
+
+    def sync(self, timeout: float = 2.0) -> bool:
+        """Blocks until everything appended so far is on disk. Call off the UI thread."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def reset(self) -> None:
+        """Discards the journal contents, e.g. when the user starts a new document."""
+        with self._counts_lock:
+            self._discarded = self._appended
+        self._queue.put(_RESET)
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Writes and syncs everything still queued, then stops the writer."""
+        self._queue.put(_CLOSE)
+        self._writer.join(timeout=timeout)
+        if self._writer.is_alive():
+            logger.warning(f"Transcript journal writer did not finish within {timeout}s.")
+
+    def _writer_loop(self) -> None:
+        unsynced = False
+        next_sync = time.monotonic() + self.fsync_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_sync - time.monotonic()))
+            except Empty:
+                item = None
+
+            if item is _CLOSE:
+                self._sync()
+                self._file.close()
+                return
+            if isinstance(item, JournalMark):
+                self._file.flush()
+                item.offset = self._trimmed_bytes + self._file.tell()
+            elif isinstance(item, tuple) and item[0] is _DISCARD:
+                self._discard_before(item[1].offset)
+                unsynced = False
+            elif isinstance(item, threading.Event):
+                self._sync()
+                unsynced = False
+                item.set()
+            elif item is _RESET:
+                self._file.flush()
+                self._trimmed_bytes += self._file.tell()
+                self._file.seek(0)
+                self._file.truncate()
+                self._sync()
+                unsynced = False
+            elif item is not None:
+                try:
+                    self._file.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    unsynced = True
+                except OSError as e:
+                    logger.error(f"Error writing transcript journal: {e}", exc_info=True)
+
+            if time.monotonic() >= next_sync:
+                if unsynced:
+                    self._sync()
+                    unsynced = False
+                next_sync = time.monotonic() + self.fsync_interval
+
+    def _discard_before(self, offset: int) -> None:
+        """
+        Drops the file's bytes before the logical ``offset``. The kept tail is written to a
+        temporary file that replaces the journal, so a crash mid-trim loses nothing.
+        """
+        cut = offset - self._trimmed_bytes
+        if cut <= 0:
+            return  # Already dropped by a later mark or a reset
+        temporary = self.path + ".tmp"
+        try:
+            self._file.flush()
+            with open(self.path, "rb") as f, open(temporary, "wb") as out:
+                f.seek(cut)
+                out.write(f.read())
+                out.flush()
+                os.fsync(out.fileno())
+            self._file.close()
+            os.replace(temporary, self.path)
+            self._trimmed_bytes += cut
+        except OSError as e:
+            logger.error(f"Error trimming transcript journal: {e}", exc_info=True)
+        finally:
+            if self._file.closed:
+                self._file = open(self.path, "a", encoding="utf-8")
+
+    def _sync(self) -> None:
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error(f"Error syncing transcript journal: {e}", exc_info=True)
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def read_segments(path: str = JOURNAL_PATH) -> Iterator[str]:
+    """Yields journaled segments in order, skipping a torn last line left by a crash."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            try:
+                yield json.loads(line)["text"]
+            except (ValueError, KeyError):
+                logger.warning(f"Skipping unreadable journal line {line_number} in {path}.")
+
+
+def write_txt(segments: Iterable[str], filename: str, separator: str = " ") -> None:
+    with open(filename, "w", encoding="utf-8") as f:
+        first = True
+        for segment in segments:
+            if not first:
+                f.write(separator)
+            f.write(segment)
+            first = False
+
+
+def write_docx(paragraphs: Iterable[str], filename: str) -> None:
+    from docx import Document
+    doc = Document()
+    for paragraph in paragraphs:
+        doc.add_paragraph(paragraph)
+    doc.save(filename)
+
+
+def export_journal(journal_path: str, filename: str) -> None:
+    """Streams the journal into ``filename``; ``.docx`` gets one paragraph per segment."""
+    if filename.endswith(".docx"):
+        write_docx(read_segments(journal_path), filename)
+    else:
+        write_txt(read_segments(journal_path), filename)
+
+
+def export_in_background(export: Callable[[], None],
+                         on_done: Callable[[], None],
+                         on_error: Callable[[Exception], None]) -> threading.Thread:
+    """
+    Runs ``export`` on a worker thread. ``on_done``/``on_error`` are called from that
+    thread, so GUI callers should marshal them back (e.g. with ``root.after``).
+    """
+    def run() -> None:
+        try:
+            export()
+        except Exception as e:
+            logger.error(f"Error exporting document: {e}", exc_info=True)
+            on_error(e)
+        else:
+            on_done()
+
+    thread = threading.Thread(target=run, name="DocumentExport", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1], file=sys.stderr)
+        sys.exit(2)
+    export_journal(sys.argv[1], sys.argv[2])
+    print(f"Exported {sys.argv[1]} to {sys.argv[2]}")
@@ -0,0 +1,110 @@
+"""
+Event-loop lag monitor for the Tk window.
+
+A heartbeat is scheduled with ``root.after`` every ``interval_ms``. When it fires, its
+lag is how much later than due it ran: the time the event loop spent on other work
+(inserting text, redrawing, a callback holding the GIL) before it got back to the
+queue. The user sees this lag as a frozen window.
+
+Each lag is recorded under the current activity (e.g. idle, listening, processing),
+so jank during inference can be told apart from jank at rest. Every
+``report_seconds`` the monitor appends the interval's p50/p99/max per activity to the
+metrics log (``logs/ui_metrics.jsonl``). It also passes the interval's overall
+summary to ``on_report``, which the app shows in the status bar in debug mode.
+``session`` keeps the whole run's distribution. Tk timers are only as precise as the
+platform's (about 15 ms on Windows), which sets the floor of the measurements.
+"""
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from latency import LatencyStats
+
+DEFAULT_METRICS_LOG = "logs/ui_metrics.jsonl"
+DEFAULT_TICK_MS = 50
+DEFAULT_REPORT_SECONDS = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    def __init__(self, root, activity: Callable[[], str] = lambda: "idle", interval_ms: int = DEFAULT_TICK_MS,
+                 report_seconds: float = DEFAULT_REPORT_SECONDS, log_path: Optional[str] = DEFAULT_METRICS_LOG,
+                 on_report: Optional[Callable[[Dict[str, float]], None]] = None) -> None:
+        self.root = root
+        self.activity = activity
+        self.interval_ms = interval_ms
+        self.report_seconds = report_seconds
+        self.log_path = log_path
+        self.on_report = on_report
+        self.session = LatencyStats("UI event-loop lag")
+        self._interval = LatencyStats("UI event-loop lag")
+        self._by_activity: Dict[str, LatencyStats] = {}
+        self._after_id = None
+        self._due = 0.0
+        self._report_at = 0.0
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    def start(self) -> None:
+        if self._after_id is not None:
+            return
+        now = time.perf_counter()
+        self._report_at = now + self.report_seconds
+        self._schedule(now)
+
+    def stop(self) -> None:
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass  # The window is already gone
+            self._after_id = None
+        if self._interval.summary()["count"]:
+            self._report()
+
+    def _schedule(self, now: float) -> None:
+        self._due = now + self.interval_ms / 1000
+        self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def _tick(self) -> None:
+        now = time.perf_counter()
+        lag_ms = max(0.0, (now - self._due) * 1000)
+        activity = self.activity()
+        if activity not in self._by_activity:
+            self._by_activity[activity] = LatencyStats(f"UI lag ({activity})")
+        self._by_activity[activity].record(lag_ms)
+        self._interval.record(lag_ms)
+        self.session.record(lag_ms)
+        if now >= self._report_at:
+            self._report()
+            self._report_at = now + self.report_seconds
+        self._schedule(time.perf_counter())
+
+    def _report(self) -> None:
+        overall = self._interval.summary()
+        by_activity = {activity: stats.summary() for activity, stats in self._by_activity.items()}
+        self._interval.reset()
+        self._by_activity = {}
+        if self.log_path:
+            entry = {"time": round(time.time(), 3), "metric": "ui_event_loop_lag", **_rounded(overall),
+                     "by_activity": {activity: _rounded(summary) for activity, summary in by_activity.items()}}
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write UI metrics log '{self.log_path}': {e}")
+        if self.on_report:
+            self.on_report(overall)
+
+
+def _rounded(summary: Dict[str, float]) -> Dict[str, float]:
+    return {key: round(value, 1) for key, value in summary.items()}
+
+
+def format_lag(summary: Dict[str, float]) -> str:
+    if not summary.get("count"):
+        return "UI lag: -"
+    return f"UI lag p50 {summary['p50_ms']:.0f} / p99 {summary['p99_ms']:.0f} / max {summary['max_ms']:.0f} ms"